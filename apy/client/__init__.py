@@ -1,3 +1,3 @@
 from .fields import BaseField, BooleanField, IntegerField, LongField, FloatField, StringField, ArrayField, ObjectField, DateTimeField, NestedField, RelationField
-from .models import BaseClientModelMetaClass, BaseClientModel, BaseClientRelation, QueryField, MODELS
+from .models import BaseClientModelMetaClass, BaseClientModel, BaseClientRelation, QueryField, FieldPlan, MODELS
 from .methods import ClientMethodMetaClass, ClientMethod
@@ -52,6 +52,14 @@ class BaseField(object):
     def to_json(self, request, value):  # pylint: disable=W0613
         return value
 
+    def to_json_many(self, request, values):
+        return [self.to_json(request, v) for v in values]
+
+    @property
+    def has_identity_json(self):
+        # whether to_json returns values unchanged, so encoding can skip the call
+        return type(self).to_json is BaseField.to_json
+
     # from json
     def to_python(self, value):
         if value is None:
@@ -92,6 +100,9 @@ class LongField(BaseField):
         if not value: return None
         return str(value)
 
+    def to_json_many(self, request, values):
+        return [str(v) if v else None for v in values]
+
 
 class FloatField(BaseField):
     json_type = 'number'
@@ -134,6 +145,9 @@ class DateTimeField(IntegerField):
         if not value: return None
         return str(utils.datetime_to_ms(value))
 
+    def to_json_many(self, request, values):
+        return [None if ms is None else str(ms) for ms in utils.datetimes_to_ms(values)]
+
     def to_python(self, value):
         if not value: return None
         return utils.ms_to_datetime(int(value))
@@ -174,10 +188,19 @@ class NestedField(BaseField):
         if value is None:
             return None
         if isinstance(value, list):
-            return [v.to_json(request) for v in value]
+            from .models import to_json_many
+            return to_json_many(request, value)
         else:
             return value.to_json(request)
 
+    def to_json_many(self, request, values):
+        # single nested objects of all rows are encoded together
+        from .models import to_json_many
+        singles = [v for v in values if v is not None and not isinstance(v, list)]
+        encoded = iter(to_json_many(request, singles))
+        return [None if v is None else self.to_json(request, v) if isinstance(v, list) else next(encoded)
+                for v in values]
+
 
 class RelationField(NestedField):
     def __init__(self, model_or_name, relation_filter_field, **kwargs):
@@ -1,6 +1,12 @@
 import collections
 
 from django import forms
+from django.core import signing
+
+try:
+    from django.forms.utils import ErrorDict, ErrorList
+except ImportError:  # django < 1.7
+    from django.forms.util import ErrorDict, ErrorList
 
 from apy import utils
 
@@ -68,11 +74,40 @@ class FieldsField(StringField):
         kwargs['required'] = False
         super(FieldsField, self).__init__(**kwargs)
         self.model = model
-        self.help_text = 'Fields returned, can be: %s' % (', '.join(f.key for f in self.model.get_selectable_fields()))
+        self._help_text = None
+
+    @property
+    def help_text(self):
+        # formatted when first shown, most forms are only ever used to clean data
+        if self._help_text is None:
+            self._help_text = 'Fields returned, can be: %s' % (', '.join(f.key for f in self.model.get_selectable_fields()))
+        return self._help_text
+
+    @help_text.setter
+    def help_text(self, value):
+        pass  # always the list of selectable fields
 
     def clean(self, value):
         value = super(FieldsField, self).clean(value)
-        return self.model.parse_query_fields(value) if value else None
+        if not value:
+            return None
+        from .models import QueryFieldsError
+        try:
+            return self.model.parse_query_fields(value)
+        except QueryFieldsError as e:
+            raise forms.ValidationError(str(e))
+
+
+class CursorField(StringField):
+    # opaque cursor made by utils.make_cursor, cleaned to the sort keys it holds
+    def clean(self, value):
+        value = super(CursorField, self).clean(value)
+        if not value:
+            return None
+        try:
+            return utils.parse_cursor(value)
+        except signing.BadSignature:
+            raise forms.ValidationError('Invalid cursor.')
 
 
 # forms
@@ -98,17 +133,93 @@ class MethodForm(forms.BaseForm, metaclass=MethodFormMetaclass):
 class ModifyForm(MethodForm):
 
     def clean(self):
-        self.cleaned_data = super(ModifyForm, self).clean()
-        for name, field in self.fields.items():
-            if name in self.cleaned_data and getattr(field, 'combined_field', None):
-                self.cleaned_data.setdefault(field.combined_field, {})
-                self.cleaned_data[field.combined_field][name] = self.cleaned_data.pop(name)
-        # make sure we don't overwrite fields that are not given in this request
-        for k, v in list(self.cleaned_data.items()):
-            if v is None and k not in self.data: del self.cleaned_data[k]
+        self.cleaned_data = clean_modify_data(self.fields, self.data, super(ModifyForm, self).clean())
         return self.cleaned_data
 
 
+def clean_modify_data(fields, data, cleaned_data):
+    for name, field in fields.items():
+        if name in cleaned_data and getattr(field, 'combined_field', None):
+            cleaned_data.setdefault(field.combined_field, {})
+            cleaned_data[field.combined_field][name] = cleaned_data.pop(name)
+    # make sure we don't overwrite fields that are not given in this request
+    for k, v in list(cleaned_data.items()):
+        if v is None and k not in data: del cleaned_data[k]
+    return cleaned_data
+
+
+# compiled forms
+class CompiledForm(object):
+    """
+    Validates data like a bound instance of form_class would, with the same field clean methods and
+    error messages, but without building a form (and deep copying its fields) for every request
+    """
+    form_class = None
+    fields = None
+    modify = False
+    error_class = ErrorList
+
+    def __init__(self, data=None):
+        self.data = data
+        self.is_bound = data is not None
+        self._errors = None
+
+    @property
+    def errors(self):
+        # like forms, data is cleaned when the errors are first needed
+        if self._errors is None:
+            self.full_clean()
+        return self._errors
+
+    def full_clean(self):
+        self._errors = ErrorDict()
+        if not self.is_bound:
+            return
+        self.cleaned_data = {}
+        data, cleaned_data, errors = self.data, self.cleaned_data, self._errors
+        for name, field in self.fields.items():
+            try:
+                cleaned_data[name] = field.clean(data.get(name))
+            except forms.ValidationError as e:
+                errors[name] = self.error_class(e.messages)
+        if self.modify:
+            self.cleaned_data = clean_modify_data(self.fields, data, cleaned_data)
+
+    def is_valid(self):
+        return self.is_bound and not self.errors
+
+
+def compile_form(form):
+    # returns a CompiledForm for a form class, or the form class itself when it has anything a
+    # CompiledForm doesn't replicate: custom clean methods, file fields or widgets with their own parsing
+    compiled = form.__dict__.get('_compiled_form')
+    if compiled is None:
+        compiled = form
+        if _is_compilable(form):
+            compiled = type('Compiled%s' % form.__name__, (CompiledForm, ),
+                            {'form_class': form, 'fields': form.base_fields, 'modify': issubclass(form, ModifyForm)})
+        form._compiled_form = compiled
+    return compiled
+
+
+def _is_compilable(form):
+    if not issubclass(form, MethodForm) or getattr(form, 'prefix', None) is not None:
+        return False
+    if form.clean not in (forms.BaseForm.clean, ModifyForm.clean):
+        return False
+    for method in ('full_clean', '_clean_fields', '_clean_form', '_post_clean', 'is_valid'):
+        if getattr(form, method) is not getattr(forms.BaseForm, method):
+            return False
+    if any(name.startswith('clean_') for name in dir(form)):
+        return False
+    for field in form.base_fields.values():
+        if isinstance(field, forms.FileField):
+            return False
+        if type(field.widget).value_from_datadict is not forms.Widget.value_from_datadict:
+            return False
+    return True
+
+
 # helper forms
 class SearchForm(MethodForm):
     q = StringField(required=False, help_text='Search query.')
@@ -128,9 +239,21 @@ class OptionalLimitOffsetForm(MethodForm):
     offset = IntegerField(required=False, min_value=0, max_value=1000, default_value=0, help_text='Offset.')
 
 
+class CursorForm(MethodForm):
+    # keyset pagination, the cursor holds the sort keys of the last row of the previous page
+    append_fields = True
+
+    limit = IntegerField(min_value=1, max_value=50, default_value=10, help_text='Limit.')
+    cursor = CursorField(required=False, help_text='Cursor, from the next link of the previous page.')
+
+
 class SearchableLimitOffsetForm(LimitOffsetForm, SearchForm):
     pass
 
 
 class SearchableOptionalLimitOffsetForm(OptionalLimitOffsetForm, SearchForm):
     pass
+
+
+class SearchableCursorForm(CursorForm, SearchForm):
+    pass
@@ -1,21 +1,46 @@
+import functools
 import re
 
-from apy import utils
+from apy import profiling, utils
 
 from . import models
 
 METHODS = {}
 
 
+class LazyForm(object):
+    """
+    Input form of a method class, built by factory on first access and then set on the class
+    that declared it, so forms of methods and http methods that are never used are never built
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        with profiling.record('form', '%s.%s' % (owner.__name__, self.name)):
+            form = self.factory()
+        for klass in owner.__mro__:
+            if klass.__dict__.get(self.name) is self:
+                setattr(klass, self.name, form)
+                break
+        return form
+
+
 class ClientMethodMetaClass(type):
     creation_counter = 0
 
     def __new__(cls, name, bases, attrs):
-        attrs['class_creation_counter'] = ClientMethodMetaClass.creation_counter
-        ClientMethodMetaClass.creation_counter += 1
-        new_class = super(ClientMethodMetaClass, cls).__new__(cls, name, bases, attrs)
-        METHODS[name] = new_class
-        return new_class
+        with profiling.record('client_method', name):
+            attrs['class_creation_counter'] = ClientMethodMetaClass.creation_counter
+            ClientMethodMetaClass.creation_counter += 1
+            new_class = super(ClientMethodMetaClass, cls).__new__(cls, name, bases, attrs)
+            METHODS[name] = new_class
+            return new_class
 
 
 class ClientMethod(object, metaclass=ClientMethodMetaClass):
@@ -34,6 +59,9 @@ class ClientMethod(object, metaclass=ClientMethodMetaClass):
 
     url_pattern = None
     names = {}
+    cache_control = None  # Cache-Control header sent with GET responses, e.g. 'private, max-age=60'
+    bulk_methods = ()  # http methods that also take a json array of objects, each cleaned with the method's form
+    response_cache_ttl = None  # seconds a GET response is cached and served to every user, see ServerMethod.get_cached_response
 
     url_pattern_re = re.compile('\(\?P<([^>]+)>[^()]+\)')
 
@@ -98,15 +126,20 @@ class ClientObjectsMethodMetaClass(ClientMethodMetaClass):
             names = attrs.setdefault('names', {})
             names.setdefault('POST', 'Create %s' % model.names['display'])
             names.setdefault('GET', 'Get %s' % model.names['plural_display'])
+            names.setdefault('PUT', 'Modify %s' % model.names['plural_display'])
             names.setdefault('DELETE', 'Delete %s' % model.names['plural_display'])
-            attrs.setdefault('PostForm', model.get_create_form())
-            attrs.setdefault('GetForm', model.get_read_many_form())
-            attrs.setdefault('DeleteForm', model.get_delete_many_form())
+            attrs.setdefault('PostForm', LazyForm(model.get_create_form))
+            attrs.setdefault('GetForm', LazyForm(model.get_read_many_form))
+            attrs.setdefault('PutForm', LazyForm(functools.partial(model.get_modify_form, model.get_id_field_name())))
+            attrs.setdefault('DeleteForm', LazyForm(model.get_delete_many_form))
         return super(ClientObjectsMethodMetaClass, cls).__new__(cls, name, bases, attrs)
 
 
 class ClientObjectsMethod(ClientMethod, metaclass=ClientObjectsMethodMetaClass):
+    # add PUT to http_method_names and bulk_methods to modify many objects in one request,
+    # the server method has to implement process_put
     http_method_names = ['POST', 'GET', 'DELETE']
+    bulk_methods = ('POST', )  # create many objects in one request
     model = NotImplemented
 
 
@@ -121,9 +154,9 @@ class ClientObjectMethodMetaClass(ClientMethodMetaClass):
             names.setdefault('GET', 'Get %s' % model.names['display'])
             names.setdefault('PUT', 'Modify %s' % model.names['display'])
             names.setdefault('DELETE', 'Delete %s' % model.names['display'])
-            attrs.setdefault('GetForm', model.get_read_form(attrs['id_field']))
-            attrs.setdefault('PutForm', model.get_modify_form(attrs['id_field']))
-            attrs.setdefault('DeleteForm', model.get_delete_form(attrs['id_field']))
+            attrs.setdefault('GetForm', LazyForm(functools.partial(model.get_read_form, attrs['id_field'])))
+            attrs.setdefault('PutForm', LazyForm(functools.partial(model.get_modify_form, attrs['id_field'])))
+            attrs.setdefault('DeleteForm', LazyForm(functools.partial(model.get_delete_form, attrs['id_field'])))
         return super(ClientObjectMethodMetaClass, cls).__new__(cls, name, bases, attrs)
 
 
@@ -153,13 +186,13 @@ class ClientObjectNestedMethodMetaClass(ClientMethodMetaClass):
                 elif not nested_model.readonly or nested_model.parent_class is model:
                     attrs['http_method_names'].append('POST')
             names.setdefault('GET', 'Get %s %s' % (model.names['display'], nested_model.names['item_plural_display']))
-            attrs.setdefault('GetForm', model.get_nested_read_form(nested_model, attrs['id_field']))
+            attrs.setdefault('GetForm', LazyForm(functools.partial(model.get_nested_read_form, nested_model, attrs['id_field'])))
             if 'POST' in attrs['http_method_names']:
                 names.setdefault('POST', 'Create %s in %s' % (nested_model.names['item_display'], model.names['display']))
-                attrs.setdefault('PostForm', nested_model.get_create_form())
+                attrs.setdefault('PostForm', LazyForm(nested_model.get_create_form))
             if 'DELETE' in attrs['http_method_names']:
                 names.setdefault('DELETE', 'Delete %s from %s' % (nested_model.names['item_display'], model.names['display']))
-                attrs.setdefault('DeleteForm', nested_model.get_create_form())
+                attrs.setdefault('DeleteForm', LazyForm(nested_model.get_create_form))
         return super(ClientObjectNestedMethodMetaClass, cls).__new__(cls, name, bases, attrs)
 
 
@@ -1,9 +1,13 @@
 import collections
+import itertools
 import re
 
+from apy import profiling, utils
+
 from . import fields as apy_fields, forms
 
 MODELS = {}
+FIELD_PLAN_CACHE = utils.LRUCache(maxsize=1024)
 
 
 # helpers
@@ -30,31 +34,82 @@ def camel_case_to_snake_case(name):
     return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
 
 
+QueryField = collections.namedtuple('QueryField', ['key', 'field', 'sub_fields', 'format'])
+
+
+class FieldPlan(tuple):
+    """
+    Immutable list of parsed query fields for a model, shared by every request that asks for the same fields
+    """
+
+    def __new__(cls, model, query_fields, fields_string=None, span=None):
+        self = tuple.__new__(cls, query_fields)
+        self.model = model
+        self._fields_string = fields_string
+        self._span = span  # (start, end) of a nested plan in fields_string, sliced only when asked for
+        self.keys = tuple(f.key for f in self)
+        self._compiled = {}
+        return self
+
+    def get_compiled(self, key, factory):
+        # memoizes objects derived from this plan, e.g. converters compiled for a server model
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = self._compiled[key] = factory(self)
+        return compiled
+
+    @property
+    def fields_string(self):
+        if self._span is not None:
+            start, end = self._span
+            self._fields_string, self._span = self._fields_string[start:end], None
+        return self._fields_string
+
+    @property
+    def normalized(self):
+        # canonical fields string: invalid fields dropped, id field added, nested fields in parentheses
+        return self.get_compiled('normalized', format_query_fields)
+
+    @property
+    def models(self):
+        # client models of this plan and of every nested plan in it
+        return self.get_compiled('models', get_query_fields_models)
+
+    def __repr__(self):
+        return 'FieldPlan(%s, %r)' % (self.model.__name__ if self.model else None, self.fields_string)
+
+
 class BaseClientModelMetaClass(type):
     creation_counter = 0
 
     def __new__(cls, name, bases, attrs):
-        names = attrs.get('names', {})
-        names.setdefault('display', split_camel_case(name))
-        names.setdefault('plural_display', names['display'] + 's')
-        names.setdefault('item_display', names['display'])
-        names.setdefault('item_plural_display', names['item_display'] + 's')
-        names.setdefault('lowercase', camel_case_to_snake_case(name))
-        names.setdefault('url', names['plural_display'].lower().replace(' ', '-'))
-        attrs['names'] = names
-        fields = get_model_fields(bases, attrs)
-        attrs['base_fields'] = fields
-        attrs['_field_indexes'] = {k: ix for ix, k in enumerate(attrs['base_fields'])}
-        attrs['class_creation_counter'] = BaseClientModelMetaClass.creation_counter
-        BaseClientModelMetaClass.creation_counter += 1
-        new_class = super(BaseClientModelMetaClass, cls).__new__(cls, name, bases, attrs)
-        for field in fields.values():
-            field.owner = new_class
-        MODELS[name] = new_class
-        return new_class
-
-
-QueryField = collections.namedtuple('QueryField', ['key', 'field', 'sub_fields', 'format'])
+        with profiling.record('client_model', name):
+            names = attrs.get('names', {})
+            names.setdefault('display', split_camel_case(name))
+            names.setdefault('plural_display', names['display'] + 's')
+            names.setdefault('item_display', names['display'])
+            names.setdefault('item_plural_display', names['item_display'] + 's')
+            names.setdefault('lowercase', camel_case_to_snake_case(name))
+            names.setdefault('url', names['plural_display'].lower().replace(' ', '-'))
+            attrs['names'] = names
+            fields = get_model_fields(bases, attrs)
+            attrs['base_fields'] = fields
+            attrs['_field_indexes'] = {k: ix for ix, k in enumerate(attrs['base_fields'])}
+            attrs['class_creation_counter'] = BaseClientModelMetaClass.creation_counter
+            BaseClientModelMetaClass.creation_counter += 1
+            new_class = super(BaseClientModelMetaClass, cls).__new__(cls, name, bases, attrs)
+            for field in fields.values():
+                field.owner = new_class
+            # field lists are computed once per class, subclasses get their own from their merged base_fields
+            new_class._selectable_fields = tuple(QueryField(k, v, None, None) for k, v in fields.items() if v.is_selectable)
+            new_class._default_fields = FieldPlan(new_class, [QueryField(k, v, None, None) for k, v in fields.items() if v.is_default])
+            new_class._nested_method_fields = tuple((k, v) for k, v in fields.items()
+                                                    if isinstance(v, apy_fields.NestedField) and v.has_method)
+            new_class._required_fields = tuple(k for k, f in fields.items() if f.required)
+            new_class._model = new_class
+            new_class._layouts = {}
+            MODELS[name] = new_class
+            return new_class
 
 
 class BaseClientModel(tuple, metaclass=BaseClientModelMetaClass):
@@ -67,31 +122,81 @@ class BaseClientModel(tuple, metaclass=BaseClientModelMetaClass):
     id_field = 'id'
     base_fields = None
     _field_indexes = None
+    _selectable_fields = None
+    _default_fields = None
+    _nested_method_fields = None
+    _required_fields = None
     parent_class = None
 
+    # instances are plain tuples of values, the keys they were created with live on a layout
+    # subclass shared by every instance with the same keys, so nothing is stored per instance
+    # until changes are made
+    sparse_storage = False  # only store the given fields instead of a value for every base field
+    keys = ()
+    changes = None
+    _model = None
+    _layouts = None
+    _size = 0
+    _converters = ()
+    _json_encoders = ()
+
     def __new__(cls, **kwargs):
-        vals = []
-        keys = []
-        for k, f in cls.base_fields.items():
-            if k in kwargs:
-                v = kwargs.pop(k)
-                keys.append(k)
-            else:
-                v = None
-            # if v is None and f.required:
-            #     raise ValueError('need to pass in %s to create a %s' % (k, cls.__name__))
-            vals.append(f.to_client(v))
+        # if v is None and f.required:
+        #     raise ValueError('need to pass in %s to create a %s' % (k, cls.__name__))
         # if kwargs:
         #     raise ValueError('invalid keys passed in to %s: %s' % (cls.__name__, ', '.join(kwargs)))
-        self = tuple.__new__(cls, vals)
-        self.keys = keys
-        self.changes = None
-        return self
+        return cls._get_layout(tuple(kwargs))._make(kwargs)
+
+    @classmethod
+    def from_client_data(cls, data):
+        # same as cls(**data) without the keyword argument packing
+        return cls._get_layout(tuple(data))._make(data)
+
+    @classmethod
+    def _get_layout(cls, given_keys):
+        layout = cls._layouts.get(given_keys)
+        if layout is None:
+            model = cls._model
+            indexes = model._field_indexes
+            keys = tuple(sorted((k for k in set(given_keys) if k in indexes), key=indexes.__getitem__))
+            layout = model._layouts.get(keys)
+            if layout is None:
+                layout = model._layouts[keys] = model._create_layout(keys)
+            model._layouts[given_keys] = layout
+        return layout
+
+    @classmethod
+    def _create_layout(cls, keys):
+        if cls.sparse_storage:
+            field_indexes = {k: ix for ix, k in enumerate(keys)}
+        else:
+            field_indexes = cls._field_indexes
+        attrs = {
+            '__module__': cls.__module__,
+            '__qualname__': cls.__qualname__,
+            'keys': keys,
+            '_field_indexes': field_indexes,
+            '_size': len(field_indexes),
+            '_converters': tuple((k, field_indexes[k], cls.base_fields[k].to_client) for k in keys),
+            # fields whose to_json returns the value as is get no encoder
+            '_json_encoders': tuple((k, field_indexes[k], None if cls.base_fields[k].has_identity_json else cls.base_fields[k])
+                                    for k in keys),
+        }
+        # bypass the metaclass, a layout is not a new model
+        return type.__new__(type(cls), cls.__name__, (cls,), attrs)
+
+    @classmethod
+    def _make(cls, data):
+        vals = [None] * cls._size
+        for k, ix, to_client in cls._converters:
+            vals[ix] = to_client(data[k])
+        return tuple.__new__(cls, vals)
 
     def _field_repr_iter(self):
-        for (k, f), v in zip(self.base_fields.items(), self):
+        for k in self.keys:
+            v = self[k]
             if v is None: continue
-            if isinstance(f, apy_fields.NestedField):
+            if isinstance(self.base_fields[k], apy_fields.NestedField):
                 yield k
             elif self.changes and k in self.changes:
                 yield '%s*=%r' % (k, self.changes[k])
@@ -104,6 +209,8 @@ class BaseClientModel(tuple, metaclass=BaseClientModelMetaClass):
     def __getitem__(self, key):
         ix = self._field_indexes.get(key)
         if ix is None:
+            if key in self.base_fields:  # not stored in a sparse layout
+                return None
             raise KeyError('no such field in %s: %s' % (self.__class__.__name__, key))
         return tuple.__getitem__(self, ix)
 
@@ -121,31 +228,43 @@ class BaseClientModel(tuple, metaclass=BaseClientModelMetaClass):
         return self[self.id_field]
 
     def to_dict(self):
-        return dict(zip(self.keys, self))
+        return {key: self[key] for key in self.keys}
 
     def to_json(self, request):
         d = collections.OrderedDict()
-        for key in self.keys:
-            d[key] = self.base_fields[key].to_json(request, self[key])
+        for key, ix, field in self._json_encoders:
+            value = tuple.__getitem__(self, ix)
+            d[key] = value if field is None else field.to_json(request, value)
         return d
 
+    @classmethod
+    def _columns_to_json(cls, request, objects):
+        # objects all have this layout, each column is encoded with one to_json_many call
+        columns = []
+        for _, ix, field in cls._json_encoders:
+            column = list(map(tuple.__getitem__, objects, itertools.repeat(ix)))
+            columns.append(column if field is None else field.to_json_many(request, column))
+        if not columns:
+            return [collections.OrderedDict() for _ in objects]
+        keys = cls.keys
+        return [collections.OrderedDict(zip(keys, row)) for row in zip(*columns)]
+
     # fields
     @classmethod
     def get_selectable_fields(cls):
-        return [QueryField(k, v, None, None) for k, v in cls.base_fields.items() if v.is_selectable]
+        return cls._selectable_fields
 
     @classmethod
     def get_default_fields(cls):
-        return [QueryField(k, v, None, None) for k, v in cls.base_fields.items() if v.is_default]
+        return cls._default_fields
 
     @classmethod
     def get_nested_method_fields(cls):
-        return [(k, v) for k, v in cls.base_fields.items()
-                if isinstance(v, apy_fields.NestedField) and v.has_method]
+        return cls._nested_method_fields
 
     @classmethod
     def get_required_fields(cls):
-        return [k for k, f in cls.base_fields.items() if f.required]
+        return cls._required_fields
 
     # form utils
     @classmethod
@@ -212,64 +331,222 @@ class BaseClientModel(tuple, metaclass=BaseClientModelMetaClass):
     @classmethod
     def parse_query_fields(cls, fields_string, ignore_invalid_fields=False, use_generic_fields=False):
         model = None if use_generic_fields else cls
-        return parse_query_fields(fields_string, model=model, ignore_invalid_fields=ignore_invalid_fields)
+        return get_field_plan(fields_string, model=model, ignore_invalid_fields=ignore_invalid_fields)
+
+
+def to_json_many(request, objects):
+    # same as [obj.to_json(request) for obj in objects], but encodes client models column by column
+    layouts = collections.OrderedDict()
+    for ix, obj in enumerate(objects):
+        layouts.setdefault(type(obj), []).append(ix)
+    if len(layouts) == 1:
+        layout = next(iter(layouts))
+        if issubclass(layout, BaseClientModel):
+            return layout._columns_to_json(request, objects)  # pylint: disable=W0212
+    result = [None] * len(objects)
+    for layout, ixs in layouts.items():
+        if issubclass(layout, BaseClientModel):
+            encoded = layout._columns_to_json(request, [objects[ix] for ix in ixs])  # pylint: disable=W0212
+        else:
+            encoded = [objects[ix].to_json(request) for ix in ixs]
+        for ix, d in zip(ixs, encoded):
+            result[ix] = d
+    return result
+
+
+def format_query_fields(query_fields):
+    parts = []
+    for query_field in query_fields:
+        if query_field.sub_fields is not None:
+            parts.append('%s(%s)' % (query_field.key, format_query_fields(query_field.sub_fields)))
+        elif query_field.format is not None:
+            parts.append('%s.%s' % (query_field.key, query_field.format))
+        else:
+            parts.append(query_field.key)
+    return ','.join(parts)
+
+
+def get_query_fields_models(query_fields):
+    # every client model whose data the query fields return, nested fields without sub fields
+    # return the default fields of their model
+    models = []
+    defaults_seen = set()  # default plans can refer to each other
+
+    def add(model, query_fields):
+        if model is not None and model not in models:
+            models.append(model)
+        for query_field in query_fields:
+            if not isinstance(query_field.field, apy_fields.NestedField):
+                continue
+            nested_model = query_field.field.get_model(model)
+            if query_field.sub_fields is not None:
+                add(nested_model, query_field.sub_fields)
+            elif nested_model not in defaults_seen:
+                defaults_seen.add(nested_model)
+                add(nested_model, nested_model.get_default_fields())
+
+    add(getattr(query_fields, 'model', None), query_fields)
+    return tuple(models)
+
+
+def get_field_plan(fields_string, model=None, ignore_invalid_fields=False):
+    # parsing is cached by the normalized fields string, clients tend to send the same few strings
+    fields_string = fields_string.replace(' ', '').lower()
+    key = (model, fields_string, ignore_invalid_fields)
+    plan = FIELD_PLAN_CACHE.get(key)
+    if plan is None:
+        query_fields = parse_query_fields(fields_string, model=model, ignore_invalid_fields=ignore_invalid_fields)
+        plan = FieldPlan(model, query_fields, fields_string)
+        FIELD_PLAN_CACHE.set(key, plan)
+    return plan
+
+
+_field_name_re = re.compile(r'[^,()/.]*')
+_field_format_re = re.compile(r'[^,()]*')
+
+
+class _QueryFieldsLevel(object):
+    # one list of fields in a fields string, either the top level or the sub fields of a nested field
+
+    def __init__(self, model, closer, start, key=None, field=None, ignore_invalid_fields=False, discard=False):
+        self.model = model
+        self.closer = closer  # ')' or '/' for nested levels, None for the top level
+        self.start = start
+        self.key = key
+        self.field = field
+        self.ignore_invalid_fields = ignore_invalid_fields
+        self.discard = discard  # sub fields of an invalid or non nested field are parsed but ignored
+        self.fields = []
+        self.invalid_fields = []
+
+    def get_field(self, key):
+        field = self.model.base_fields.get(key)
+        if field is None or not field.is_selectable:
+            self.invalid_fields.append(key)
+            return None
+        return field
+
+    def add_field(self, key, format_=None):
+        if self.discard:
+            return
+        if self.model is None:
+            self.fields.append(QueryField(key, None, None, format_))
+            return
+        field = self.get_field(key)
+        if field is None:
+            return
+        if format_ is not None and format_ not in getattr(field, 'formats', ()):
+            raise QueryFieldsError('invalid format "%s" on field "%s"' % (format_, key))
+        self.fields.append(QueryField(key, field, None, format_))
+
+    def open_nested(self, key, opener, start):
+        closer = ')' if opener == '(' else '/'
+        if self.discard or self.model is None:
+            return _QueryFieldsLevel(None, closer, start, key=key, discard=self.discard)
+        field = self.get_field(key)
+        if field is None:
+            return _QueryFieldsLevel(None, closer, start, discard=True)
+        if not isinstance(field, apy_fields.NestedField):
+            self.fields.append(QueryField(key, field, None, None))
+            return _QueryFieldsLevel(None, closer, start, discard=True)
+        return _QueryFieldsLevel(field.get_model(self.model), closer, start, key=key, field=field)
+
+    def close_nested(self, level, fields_string, end):
+        if level.discard:
+            return
+        # slicing the sub string here would copy every level of a deeply nested string again
+        sub_fields = FieldPlan(level.model, level.finish(), fields_string, span=(level.start, end))
+        self.fields.append(QueryField(level.key, level.field, sub_fields, None))
+
+    def finish(self):
+        if self.invalid_fields and not self.ignore_invalid_fields:
+            plural = 's' if len(self.invalid_fields) > 1 else ''
+            raise QueryFieldsError('invalid field%s: %s' % (plural, ','.join(self.invalid_fields)))
+        # make sure id field is always there
+        model = self.model
+        if model is not None and model.id_field and model.id_field not in [f.key for f in self.fields]:
+            self.fields.insert(0, QueryField(model.id_field, model.base_fields[model.id_field], None, None))
+        return self.fields
+
+
+class QueryFieldsError(Exception):
+    # a fields string naming unknown fields or formats, or not following the fields format
+    pass
+
+
+class _FieldsStringError(QueryFieldsError):
+    pass
+
+
+def _fields_string_error(fields_string, pos, message):
+    return _FieldsStringError('invalid fields "%s": %s at position %d' % (fields_string, message, pos))
 
 
-_nested_field_re = re.compile(r'(?P<field>[^(/]+)/(?P<sub_fields>.+)')
-_sub_fields_re = re.compile(r'(?P<field>[^(/]+)\((?P<sub_fields>.+)\)')
-_formatted_field_re = re.compile(r'(?P<field>[^(/]+)\.(?P<format>.+)')
 def parse_query_fields(fields_string, model=None, ignore_invalid_fields=False):
     # credit for fields format: https://developers.google.com/blogger/docs/2.0/json/performance
+    # fields := field (',' field)*
+    # field := name ['/' field | '(' fields ')' | '.' format]
+    # parsed in a single pass, nesting is kept on an explicit stack so deep strings don't recurse
     fields_string = fields_string.replace(' ', '').lower()
-    split_fields = ['']
-    open_brackets = 0
-    for c in fields_string:
-        if c == ',' and open_brackets == 0:
-            split_fields.append('')
-        else:
-            split_fields[-1] += c
-            if c == '(':
-                open_brackets += 1
+    top = _QueryFieldsLevel(model, None, 0, ignore_invalid_fields=ignore_invalid_fields)
+    try:
+        return _parse_fields_string(fields_string, top)
+    except _FieldsStringError:
+        if not ignore_invalid_fields:
+            raise
+        # keep the top level fields read before the malformed one
+        return top.finish()
+
+
+def _parse_fields_string(fields_string, level):
+    stack = []
+    pos = 0
+    while True:
+        m = _field_name_re.match(fields_string, pos)
+        name, pos = m.group(), m.end()
+        c = fields_string[pos:pos + 1]
+        if not name and c in ('(', '/', '.'):
+            raise _fields_string_error(fields_string, pos, 'expected a field name')
+        if c in ('(', '/'):
+            stack.append(level)
+            level = level.open_nested(name, c, pos + 1)
+            pos += 1
+            continue
+        if c == '.':
+            m = _field_format_re.match(fields_string, pos + 1)
+            if not m.group():
+                raise _fields_string_error(fields_string, pos + 1, 'expected a format after "%s."' % name)
+            level.add_field(name, format_=m.group())
+            pos = m.end()
+        elif name:
+            level.add_field(name)
+        # consume separators, closing every nested level that ends here
+        while True:
+            c = fields_string[pos:pos + 1]
+            if level.closer == '/':
+                if pos == level.start:
+                    raise _fields_string_error(fields_string, pos, 'expected a field name after "/"')
+                parent = stack.pop()
+                parent.close_nested(level, fields_string, pos)
+                level = parent
+            elif c == ',':
+                pos += 1
+                break
             elif c == ')':
-                open_brackets -= 1
-    fields = []
-    invalid_fields = []
-    for sf in split_fields:
-        if not sf.strip(): continue
-        sf = sf.strip().lower()
-        m = _nested_field_re.match(sf) or _sub_fields_re.match(sf) or _formatted_field_re.match(sf)
-        if m:
-            sf = m.group('field')
-        if model is None:
-            sub_fields = m and parse_query_fields(m.group('sub_fields'))
-            fields.append(QueryField(sf, None, sub_fields, None))
-        elif sf not in model.base_fields:
-            invalid_fields.append(sf)
-        else:
-            field = model.base_fields[sf]
-            if not field.is_selectable:
-                invalid_fields.append(sf)
-                continue
-            if isinstance(field, apy_fields.NestedField):
-                sub_fields = None
-                if m:
-                    nested_model = field.get_model(model)
-                    sub_fields = nested_model.parse_query_fields(m.group('sub_fields'))
-                fields.append(QueryField(sf, field, sub_fields, None))
-            elif m and m.groupdict().get('format'):
-                format_ = m.group('format')
-                if format_ not in field.formats:
-                    raise Exception('invalid format "%s" on field "%s"' % (format_, sf))
-                fields.append(QueryField(sf, field, None, format_))
+                if level.closer != ')':
+                    raise _fields_string_error(fields_string, pos, 'unmatched ")"')
+                if pos == level.start:
+                    raise _fields_string_error(fields_string, pos, 'expected fields inside "()"')
+                parent = stack.pop()
+                parent.close_nested(level, fields_string, pos)
+                level = parent
+                pos += 1
+            elif not c:
+                if stack:
+                    raise _fields_string_error(fields_string, level.start - 1, 'unclosed "("')
+                return level.finish()
             else:
-                fields.append(QueryField(sf, field, None, None))
-    if invalid_fields and not ignore_invalid_fields:
-        plural = 's' if len(invalid_fields) > 1 else ''
-        raise Exception('invalid field%s: %s' % (plural, ','.join(invalid_fields)))
-    # make sure id field is always there
-    if model is not None and model.id_field and model.id_field not in [f.key for f in fields]:
-        fields.insert(0, QueryField(model.id_field, model.base_fields[model.id_field], None, None))
-    return fields
+                raise _fields_string_error(fields_string, pos, 'unexpected "%s"' % c)
 
 
 class BaseClientRelation(BaseClientModel):
@@ -0,0 +1,78 @@
+import collections
+import contextlib
+import json
+import os
+import sys
+import time
+
+# set to 1 to print a startup report once InternalDispatch is built, or to a path ending in .json to export it there
+STARTUP_PROFILE_ENV = 'APY_PROFILE_STARTUP'
+
+
+class StartupProfiler(object):
+    """
+    Records how long each model and method takes to register, and each form and url to build,
+    timings are inclusive of anything nested in them
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.timings = []  # (category, name, seconds) in the order they finished
+        self.finished = False
+
+    @contextlib.contextmanager
+    def _record(self, category, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((category, name, time.perf_counter() - start))
+
+    def record(self, category, name):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._record(category, name)
+
+    def get_report(self):
+        totals = collections.OrderedDict()
+        for category, _, seconds in self.timings:
+            count, total = totals.get(category, (0, 0.0))
+            totals[category] = (count + 1, total + seconds)
+        return {
+            'categories': [{'category': category, 'count': count, 'seconds': total}
+                           for category, (count, total) in sorted(totals.items(), key=lambda x: -x[1][1])],
+            'timings': [{'category': category, 'name': name, 'seconds': seconds}
+                        for category, name, seconds in sorted(self.timings, key=lambda x: -x[2])],
+        }
+
+    def format_report(self, limit=20):
+        report = self.get_report()
+        lines = ['apy startup profile', '']
+        for d in report['categories']:
+            lines.append('%-14s %6d  %9.2f ms' % (d['category'], d['count'], d['seconds'] * 1000))
+        lines.extend(['', 'slowest %d:' % min(limit, len(report['timings']))])
+        for d in report['timings'][:limit]:
+            lines.append('%-14s %-40s %9.2f ms' % (d['category'], d['name'], d['seconds'] * 1000))
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return json.dumps(self.get_report(), indent=2)
+
+    def finish(self, setting=None):
+        # outputs the report as asked for by the environment variable, only the first time it is called
+        setting = os.environ.get(STARTUP_PROFILE_ENV, '') if setting is None else setting
+        if not self.enabled or not setting or self.finished:
+            return
+        self.finished = True
+        if setting.endswith('.json'):
+            with open(setting, 'w') as f:
+                f.write(self.to_json())
+        else:
+            sys.stderr.write(self.format_report() + '\n')
+
+
+PROFILER = StartupProfiler(enabled=bool(os.environ.get(STARTUP_PROFILE_ENV)))
+
+
+def record(category, name):
+    return PROFILER.record(category, name)
@@ -0,0 +1,180 @@
+import asyncio
+import collections
+import threading
+import time
+import uuid
+
+
+class BaseObjectCache(object):
+    """
+    Interface of the object cache that server models put in front of db_find(ids=...), also the
+    backend of the response cache. Rows are stored by (model name, id); a shared cache only needs
+    to implement these methods.
+    """
+
+    def get_many(self, keys):
+        # returns a dict with the row data of the keys found
+        raise NotImplementedError()
+
+    def set_many(self, items, ttl=None):
+        # items is a dict of key -> row data, ttl overrides the cache's default expiry
+        raise NotImplementedError()
+
+    def delete_many(self, keys):
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+    def get_stats(self):
+        return {}
+
+
+class LocalObjectCache(BaseObjectCache):
+    """
+    In process LRU cache whose entries expire ttl seconds after they were set, ttl=None never expires
+    """
+
+    def __init__(self, maxsize=10000, ttl=300, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+        self._data = collections.OrderedDict()  # key -> (expires, row data)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_many(self, keys):
+        found = {}
+        now = self.timer()
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is not None and entry[0] is not None and entry[0] <= now:
+                    del self._data[key]
+                    self.stats['expirations'] += 1
+                    entry = None
+                if entry is None:
+                    self.stats['misses'] += 1
+                    continue
+                self._data.move_to_end(key)
+                self.stats['hits'] += 1
+                found[key] = entry[1]
+        return found
+
+    def set_many(self, items, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = self.timer() + ttl if ttl is not None else None
+        with self._lock:
+            for key, data in items.items():
+                self._data[key] = (expires, data)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, size=len(self._data))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = float(stats['hits']) / lookups if lookups else 0.0
+        return stats
+
+
+class ResponseCache(object):
+    """
+    Encoded responses shared by every user of a method, see ClientMethod.response_cache_ttl.
+    Keys embed a generation token per model, create/update/delete of a model replace its token so
+    every cached response that depends on it stops matching. Only one computation per key runs at a time.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else LocalObjectCache(maxsize=1000, ttl=None)
+        self._locks = {}  # key -> [lock, number of users]
+        self._locks_lock = threading.Lock()
+        self._generations_lock = threading.Lock()
+
+    def get_generations(self, names):
+        keys = [('apy-generation', name) for name in names]
+        found = self.backend.get_many(keys)
+        if len(found) < len(keys):
+            # an unknown or evicted generation gets a new token, it can't match an older response;
+            # made under a lock so concurrent requests agree on it and share one computation
+            with self._generations_lock:
+                found = self.backend.get_many(keys)
+                missing = {key: uuid.uuid4().hex for key in keys if key not in found}
+                self.backend.set_many(missing)
+                found.update(missing)
+        return tuple(found[key] for key in keys)
+
+    def invalidate(self, *names):
+        self.backend.set_many({('apy-generation', name): uuid.uuid4().hex for name in names})
+
+    def get(self, key):
+        return self.backend.get_many([key]).get(key)
+
+    def set(self, key, value, ttl):
+        self.backend.set_many({key: value}, ttl=ttl)
+
+    def get_or_compute(self, key, compute, ttl):
+        # compute returns (value, cacheable), concurrent callers of a missing key wait for the first one
+        value = self.get(key)
+        if value is not None:
+            return value
+        lock = self._acquire_lock(key, threading.Lock)
+        try:
+            with lock:
+                value = self.get(key)
+                if value is None:
+                    value, cacheable = compute()
+                    if cacheable:
+                        self.set(key, value, ttl)
+        finally:
+            self._release_lock(key)
+        return value
+
+    async def aget_or_compute(self, key, acompute, ttl):
+        value = self.get(key)
+        if value is not None:
+            return value
+        lock = self._acquire_lock(('async', key), asyncio.Lock)
+        try:
+            async with lock:
+                value = self.get(key)
+                if value is None:
+                    value, cacheable = await acompute()
+                    if cacheable:
+                        self.set(key, value, ttl)
+        finally:
+            self._release_lock(('async', key))
+        return value
+
+    def _acquire_lock(self, key, lock_class):
+        with self._locks_lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [lock_class(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _release_lock(self, key):
+        with self._locks_lock:
+            entry = self._locks[key]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+
+RESPONSE_CACHE = ResponseCache()
@@ -10,6 +10,14 @@ class ApiException(Exception):
         self.details = details
 
 
+class InvalidParameter(ApiException):
+    pass
+
+
+class RequestBodyTooLarge(ApiException):
+    pass
+
+
 # errors
 class ErrorsMetaClass(type):
     def __new__(cls, name, bases, attrs):
@@ -36,7 +44,11 @@ class GeneralErrors(BaseErrors):
 
 
 class ParameterErrors(BaseErrors):
-    INVALID_PARAM = ('Invalid parameter', http.client.BAD_REQUEST)
+    INVALID_PARAM = ('Invalid parameter', http.client.BAD_REQUEST, InvalidParameter)
+
+
+class RequestErrors(BaseErrors):
+    REQUEST_TOO_LARGE = ('Request body too large', http.client.REQUEST_ENTITY_TOO_LARGE, RequestBodyTooLarge)
 
 
 class ResourceErrors(BaseErrors):
@@ -47,7 +59,7 @@ class AuthErrors(BaseErrors):
     FORBIDDEN = ('Forbidden', http.client.FORBIDDEN)
 
 
-class Errors(GeneralErrors, ParameterErrors, ResourceErrors, AuthErrors):
+class Errors(GeneralErrors, ParameterErrors, RequestErrors, ResourceErrors, AuthErrors):
 
     @classmethod
     def get_error_for_exception(cls, exc):
@@ -1,5 +1,9 @@
 import collections
 
+from .. import utils
+from .loaders import get_loader
+from .resolvers import get_resolver
+
 
 class BaseField(object):
     creation_counter = 0
@@ -15,9 +19,21 @@ class BaseField(object):
         self.creation_counter = BaseField.creation_counter
         BaseField.creation_counter += 1
 
+    def prefetch(self, request, owner, query_field, objects):
+        # called for every server field before any to_client, to announce rows that will be loaded
+        pass
+
+    def get_columns(self, owner, query_field):  # pylint: disable=W0613
+        # columns of the owner's rows that to_client reads, see BaseServerModel.get_columns
+        return list(self.required_fields or ())
+
     def to_client(self, request, owner, query_field, objects):
         raise NotImplementedError()
 
+    async def ato_client(self, request, owner, query_field, objects):
+        # used by async server methods, fields that do blocking io should override it
+        await utils.run_sync(self.to_client, request, owner, query_field, objects)
+
     # @classmethod TODO
     # def to_server(cls, request, objects, key):
     #     # used in modify and create
@@ -38,13 +54,63 @@ class BaseNestedField(BaseField):  # pylint: disable=W0223
         else:
             return self.model_or_name
 
+    def read_overridden(self, model, name='read'):
+        # models that override read (or aread), e.g. to check permissions or filter rows, get their nested
+        # objects from it instead of the batched find, the nested client models come back already built
+        from .models import BaseServerModel
+        return getattr(getattr(model, name), '__func__', None) is not getattr(BaseServerModel, name).__func__
+
+    def aread_overridden(self, model):
+        return self.read_overridden(model, 'aread') or self.read_overridden(model)
+
+    async def aread_nested(self, request, model, **kwargs):
+        # aread when the model overrides it, else the overridden read
+        if self.read_overridden(model, 'aread'):
+            return await model.aread(request, **kwargs)
+        return await utils.run_sync(model.read, request, **kwargs)
+
+    def get_nested_columns(self, model, query_field):
+        # columns to load for the nested objects, None for all of them
+        return model.get_columns(query_field.sub_fields) if model.use_projection else None
+
+    def convert(self, request, model, objects, query_fields, assign):
+        # converts nested objects with the next level of the active resolver, or right away without one;
+        # assign is called with their client models in the same order
+        resolver = get_resolver()
+        if resolver is None:
+            assign(model.to_client(request, objects, query_fields=query_fields))
+        else:
+            resolver.defer(model, objects, query_fields, assign)
+
+    async def aconvert(self, request, model, objects, query_fields, assign):
+        resolver = get_resolver()
+        if resolver is None:
+            assign(await model.ato_client(request, objects, query_fields=query_fields))
+        else:
+            resolver.defer(model, objects, query_fields, assign)
+
 
 class NestedField(BaseNestedField):
     # field that represents a model nested within a wrapping model
 
+    def get_columns(self, owner, query_field):
+        return [query_field.key] + super(NestedField, self).get_columns(owner, query_field)
+
     def to_client(self, request, owner, query_field, objects):
+        key = query_field.key
+        owners = [obj for obj in objects if obj.data.get(key) is not None]
         for obj in objects:
-            obj.client_data[query_field.key] = obj.data[query_field.key].self_to_client(request, query_field.sub_fields)
+            obj.client_data[key] = None
+
+        def assign(client_objects):
+            for obj, client_object in zip(owners, client_objects):
+                obj.client_data[key] = client_object
+
+        self.convert(request, self.get_model(owner), [obj.data[key] for obj in owners], query_field.sub_fields, assign)
+
+    async def ato_client(self, request, owner, query_field, objects):
+        # nested data is already in the objects, only its conversion is deferred
+        self.to_client(request, owner, query_field, objects)
 
 
 class NestedIdField(BaseNestedField):
@@ -53,12 +119,42 @@ class NestedIdField(BaseNestedField):
         super(NestedIdField, self).__init__(model_or_name, required_fields=[id_field], **kwargs)
         self.id_field = id_field
 
+    def prefetch(self, request, owner, query_field, objects):
+        loader = get_loader(request)
+        model = self.get_model(owner)
+        if loader is not None and model.use_request_loader:
+            loader.prime(model, (obj.data[self.id_field] for obj in objects if obj.data.get(self.id_field)),
+                         columns=self.get_nested_columns(model, query_field))
+
     def to_client(self, request, owner, query_field, objects):
+        model = self.get_model(owner)
+        ids, assign = self._prepare(model, query_field, objects)
+        if self.read_overridden(model):
+            assign(model.read(request, ids=ids, query_fields=query_field.sub_fields))
+            return
+        nested_objects = model.find(request, ids=ids, fields=self.get_nested_columns(model, query_field))
+        self.convert(request, model, nested_objects, query_field.sub_fields, assign)
+
+    async def ato_client(self, request, owner, query_field, objects):
+        model = self.get_model(owner)
+        ids, assign = self._prepare(model, query_field, objects)
+        if self.aread_overridden(model):
+            assign(await self.aread_nested(request, model, ids=ids, query_fields=query_field.sub_fields))
+            return
+        nested_objects = await model.afind(request, ids=ids, fields=self.get_nested_columns(model, query_field))
+        await self.aconvert(request, model, nested_objects, query_field.sub_fields, assign)
+
+    def _prepare(self, model, query_field, objects):  # pylint: disable=W0613
         ids = {obj.data[self.id_field] for obj in objects if obj.data.get(self.id_field)}
-        nested_objects = {d.get_id(): d for d in self.get_model(owner).read
-                          (request, ids=ids, query_fields=query_field.sub_fields)}
         for obj in objects:
-            obj.client_data[query_field.key] = nested_objects.get(obj.data[self.id_field])
+            obj.client_data[query_field.key] = None
+
+        def assign(client_objects):
+            nested_objects = {d.get_id(): d for d in client_objects}
+            for obj in objects:
+                obj.client_data[query_field.key] = nested_objects.get(obj.data[self.id_field])
+
+        return ids, assign
 
 
 class RelationIdField(BaseNestedField):  # pylint: disable=W0223
@@ -70,13 +166,52 @@ class RelationIdField(BaseNestedField):  # pylint: disable=W0223
 
     def to_client(self, request, owner, query_field, objects):
         ids = {obj.get_id() for obj in objects}
-        related_objects = self.get_model(owner).read(
-            request, condition={self.filter_id_field: {'$in': ids}}, query_fields=query_field.sub_fields)
-        data = collections.defaultdict(list)
-        for obj in related_objects:
-            data[obj[self.filter_id_field]].append(obj)
+        model = self.get_model(owner)
+        if self.read_overridden(model):
+            self._prepare(query_field, objects)(model.read(
+                request, condition={self.filter_id_field: {'$in': ids}}, query_fields=query_field.sub_fields))
+            return
+        columns = self.get_nested_columns(model, query_field)
+        loader = get_loader(request)
+        if loader is not None and model.use_request_loader:
+            related_objects = loader.load_related(model, self.filter_id_field, ids, columns=columns)
+        else:
+            related_objects = model.find(request, **self._find_kwargs(ids, columns))
+        self.convert(request, model, related_objects, query_field.sub_fields, self._prepare(query_field, objects))
+
+    async def ato_client(self, request, owner, query_field, objects):
+        ids = {obj.get_id() for obj in objects}
+        model = self.get_model(owner)
+        if self.aread_overridden(model):
+            self._prepare(query_field, objects)(await self.aread_nested(
+                request, model, condition={self.filter_id_field: {'$in': ids}}, query_fields=query_field.sub_fields))
+            return
+        columns = self.get_nested_columns(model, query_field)
+        loader = get_loader(request)
+        if loader is not None and model.use_request_loader:
+            related_objects = await loader.aload_related(model, self.filter_id_field, ids, columns=columns)
+        else:
+            related_objects = await model.afind(request, **self._find_kwargs(ids, columns))
+        await self.aconvert(request, model, related_objects, query_field.sub_fields, self._prepare(query_field, objects))
+
+    def _find_kwargs(self, ids, columns):
+        kwargs = {'condition': {self.filter_id_field: {'$in': ids}}}
+        if columns is not None:
+            kwargs['fields'] = columns + [self.filter_id_field] if self.filter_id_field not in columns else columns
+        return kwargs
+
+    def _prepare(self, query_field, objects):
         for obj in objects:
-            obj.client_data[query_field.key] = data[obj.get_id()]
+            obj.client_data[query_field.key] = []
+
+        def assign(client_objects):
+            data = collections.defaultdict(list)
+            for obj in client_objects:
+                data[obj[self.filter_id_field]].append(obj)
+            for obj in objects:
+                obj.client_data[query_field.key] = data[obj.get_id()]
+
+        return assign
 
 
 class AssociationField(BaseNestedField):
@@ -88,14 +223,57 @@ class AssociationField(BaseNestedField):
 
     def to_client(self, request, owner, query_field, objects):
         model = self.get_model(owner)
-        method = getattr(model, self.method)
         ids = {obj.get_id() for obj in objects}
-        data = method(request, ids,
-                      query_field.sub_fields or model.ClientModel.get_default_fields(),
-                      **self.extra_kwargs)
+        data = self.load_associated(request, model, self.method, ids, query_field)
+        for obj in objects:
+            obj.client_data[query_field.key] = data.get(obj.get_id(), [])
+
+    async def ato_client(self, request, owner, query_field, objects):
+        model = self.get_model(owner)
+        ids = {obj.get_id() for obj in objects}
+        data = await self.aload_associated(request, model, self.method, ids, query_field)
         for obj in objects:
             obj.client_data[query_field.key] = data.get(obj.get_id(), [])
 
+    def load_associated(self, request, model, method_name, ids, query_field):
+        method = getattr(model, method_name)
+        query_fields = query_field.sub_fields or model.ClientModel.get_default_fields()
+
+        def fetch(ids):
+            return method(request, ids, query_fields, **self.extra_kwargs)
+
+        key = self._get_loader_key(request, model, method_name, query_fields)
+        if key is None:
+            return fetch(ids)
+        return get_loader(request).load_associated(key, ids, fetch)
+
+    async def aload_associated(self, request, model, method_name, ids, query_field):
+        # uses the async version of the method (prefixed with a) when the model has one
+        method = getattr(model, 'a' + method_name, None)
+        query_fields = query_field.sub_fields or model.ClientModel.get_default_fields()
+
+        async def afetch(ids):
+            if method is None:
+                return await utils.run_sync(getattr(model, method_name), request, ids, query_fields,
+                                            **self.extra_kwargs)
+            return await method(request, ids, query_fields, **self.extra_kwargs)
+
+        key = self._get_loader_key(request, model, method_name, query_fields)
+        if key is None:
+            return await afetch(ids)
+        return await get_loader(request).aload_associated(key, ids, afetch)
+
+    def _get_loader_key(self, request, model, method_name, query_fields):
+        loader = get_loader(request)
+        if loader is None or not model.use_request_loader:
+            return None
+        key = (model, method_name, tuple(sorted(self.extra_kwargs.items())), query_fields)
+        try:
+            hash(key)
+        except TypeError:  # only plans and other hashable query fields are memoized
+            return None
+        return key
+
 
 class RelationField(AssociationField):
     # field that represents a model nested within a wrapping model, linked by an id
@@ -108,8 +286,13 @@ class RelationField(AssociationField):
     def to_client(self, request, owner, query_field, objects):
         model = self.get_model(owner)
         ids = {obj.get_id() for obj in objects}
-        data = model.get_related_objects(
-            request, ids, query_field.sub_fields or model.ClientModel.get_default_fields(),
-            **self.extra_kwargs)
+        data = self.load_associated(request, model, 'get_related_objects', ids, query_field)
+        for obj in objects:
+            obj.client_data[query_field.key] = data.get(obj.get_id(), [])
+
+    async def ato_client(self, request, owner, query_field, objects):
+        model = self.get_model(owner)
+        ids = {obj.get_id() for obj in objects}
+        data = await self.aload_associated(request, model, 'get_related_objects', ids, query_field)
         for obj in objects:
             obj.client_data[query_field.key] = data.get(obj.get_id(), [])
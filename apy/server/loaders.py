@@ -0,0 +1,198 @@
+import collections
+import threading
+
+
+class DataLoader(object):
+    """
+    Request scoped loader that batches and memoizes reads of server model rows.
+    Lookups by id for a model are coalesced into a single db_find_ids and every row
+    is kept for the rest of the request, server objects handed out are always fresh copies.
+    Rows loaded with only some columns (see BaseServerModel.get_columns) are fetched again
+    when a later lookup needs columns they don't have.
+    """
+
+    def __init__(self):
+        self.rows = collections.defaultdict(dict)  # model -> id -> row data, None if not found
+        self.row_columns = collections.defaultdict(dict)  # model -> id -> frozenset of loaded columns, None for all
+        self.pending = collections.defaultdict(set)  # model -> ids to fetch with the next load
+        self.pending_columns = {}  # model -> columns to fetch with the next load, None for all
+        self.related = {}  # (model, filter field, columns) -> id -> list of row data
+        self.associations = {}  # association key -> id -> value
+        self.stats = {'queries': 0, 'ids_fetched': 0, 'ids_cached': 0, 'column_cost': 0}
+        self.lock = threading.RLock()
+
+    def prime(self, model, ids, columns=None):
+        # announce ids that are about to be loaded, so they are fetched together with the next load of this model
+        columns = frozenset(columns) if columns is not None else None
+        with self.lock:
+            missing = [i for i in ids if i is not None and not self._has_row(model, i, columns)]
+            if missing:
+                self.pending[model].update(missing)
+                self._add_pending_columns(model, columns)
+
+    # by id
+    def load_many(self, model, ids, columns=None):
+        # server objects for the given ids in order, ids that don't exist are skipped
+        ids, missing, columns = self._claim_ids(model, ids, columns)
+        if missing:
+            self._store_rows(model, missing, columns, model.db_find_ids(list(missing), fields=self._fields(columns)))
+        return self._objects(model, ids)
+
+    async def aload_many(self, model, ids, columns=None):
+        ids, missing, columns = self._claim_ids(model, ids, columns)
+        if missing:
+            rows = await model.adb_find_ids(list(missing), fields=self._fields(columns))
+            self._store_rows(model, missing, columns, rows)
+        return self._objects(model, ids)
+
+    def _has_row(self, model, i, columns):
+        if i not in self.rows[model]:
+            return False
+        loaded = self.row_columns[model].get(i)
+        return loaded is None or (columns is not None and columns <= loaded)
+
+    def _add_pending_columns(self, model, columns):
+        if model not in self.pending_columns:
+            self.pending_columns[model] = columns
+        elif self.pending_columns[model] is not None:
+            self.pending_columns[model] = None if columns is None else self.pending_columns[model] | columns
+
+    def _claim_ids(self, model, ids, columns):
+        # returns the ids in order, the ids to fetch and the columns to fetch them with
+        ids = list(collections.OrderedDict.fromkeys(ids))
+        columns = frozenset(columns) if columns is not None else None
+        with self.lock:
+            missing = self.pending.pop(model, set())
+            if missing:
+                self._add_pending_columns(model, columns)
+                columns = self.pending_columns.pop(model)
+            else:
+                self.pending_columns.pop(model, None)
+            missing.update(i for i in ids if not self._has_row(model, i, columns))
+            self.stats['ids_cached'] += len(ids) - len([i for i in ids if i in missing])
+        return ids, missing, columns
+
+    def _fields(self, columns):
+        return sorted(columns) if columns is not None else None
+
+    def _store_rows(self, model, missing, columns, rows):
+        with self.lock:
+            cached = self.rows[model]
+            row_columns = self.row_columns[model]
+            self.stats['queries'] += 1
+            self.stats['ids_fetched'] += len(missing)
+            self.stats['column_cost'] += len(missing) * model.get_column_cost(columns)
+            for obj in rows:
+                i = obj.get_id()
+                previous = cached.get(i)
+                if columns is None or previous is None:
+                    row_columns[i] = columns
+                    cached[i] = obj.data
+                else:
+                    # keep the columns loaded before, the row now has both
+                    loaded = row_columns.get(i)
+                    row_columns[i] = None if loaded is None else loaded | columns
+                    cached[i] = dict(previous)
+                    cached[i].update(obj.data)
+            for i in missing:
+                cached.setdefault(i, None)
+
+    def _objects(self, model, ids):
+        cached = self.rows[model]
+        return [model(cached[i]) for i in ids if cached.get(i) is not None]
+
+    # by filter field
+    def load_related(self, model, filter_field, ids, columns=None):
+        # server objects whose filter_field is one of ids
+        ids, memo, missing = self._claim_related(model, filter_field, ids, columns)
+        if missing:
+            rows = model.db_find(**self._related_kwargs(filter_field, missing, columns))
+            self._store_related(memo, filter_field, missing, rows)
+        return [model(data) for i in ids for data in memo[i]]
+
+    async def aload_related(self, model, filter_field, ids, columns=None):
+        ids, memo, missing = self._claim_related(model, filter_field, ids, columns)
+        if missing:
+            rows = await model.adb_find(**self._related_kwargs(filter_field, missing, columns))
+            self._store_related(memo, filter_field, missing, rows)
+        return [model(data) for i in ids for data in memo[i]]
+
+    def _related_kwargs(self, filter_field, missing, columns):
+        kwargs = {'condition': {filter_field: {'$in': missing}}}
+        if columns is not None:
+            kwargs['fields'] = self._fields(frozenset(columns) | {filter_field})
+        return kwargs
+
+    def _claim_related(self, model, filter_field, ids, columns):
+        ids = list(collections.OrderedDict.fromkeys(ids))
+        columns = frozenset(columns) if columns is not None else None
+        with self.lock:
+            memo = self.related.setdefault((model, filter_field, columns), {})
+            missing = [i for i in ids if i not in memo]
+            self.stats['ids_cached'] += len(ids) - len(missing)
+        return ids, memo, missing
+
+    def _store_related(self, memo, filter_field, missing, rows):
+        with self.lock:
+            self.stats['queries'] += 1
+            self.stats['ids_fetched'] += len(missing)
+            for i in missing:
+                memo[i] = []
+            for obj in rows:
+                memo.setdefault(obj.data[filter_field], []).append(obj.data)
+
+    # by association method
+    def load_associated(self, key, ids, fetch):
+        # values keyed by id, fetch is called with the ids not seen yet for this key and returns a dict
+        memo, missing = self._claim_associated(key, ids)
+        if missing:
+            self._store_associated(memo, missing, fetch(missing))
+        return {i: memo[i] for i in ids}
+
+    async def aload_associated(self, key, ids, afetch):
+        memo, missing = self._claim_associated(key, ids)
+        if missing:
+            self._store_associated(memo, missing, await afetch(missing))
+        return {i: memo[i] for i in ids}
+
+    def _claim_associated(self, key, ids):
+        with self.lock:
+            memo = self.associations.setdefault(key, {})
+            missing = [i for i in ids if i not in memo]
+            self.stats['ids_cached'] += len(set(ids)) - len(set(missing))
+        return memo, missing
+
+    def _store_associated(self, memo, missing, data):
+        with self.lock:
+            self.stats['queries'] += 1
+            self.stats['ids_fetched'] += len(missing)
+            for i in missing:
+                memo[i] = data.get(i, [])
+
+    def forget(self, model, ids=None):
+        # drop what is known about a model after a write, ids=None forgets every row
+        with self.lock:
+            if ids is None:
+                self.rows.pop(model, None)
+                self.row_columns.pop(model, None)
+            else:
+                cached = self.rows[model]
+                row_columns = self.row_columns[model]
+                for i in ids:
+                    cached.pop(i, None)
+                    row_columns.pop(i, None)
+            for key in list(self.related):
+                if key[0] is model:
+                    del self.related[key]
+            for key in list(self.associations):
+                if key[0] is model:
+                    del self.associations[key]
+
+
+def get_loader(request):
+    if request is None:
+        return None
+    loader = getattr(request, 'apy_loader', None)
+    if loader is None:
+        loader = request.apy_loader = DataLoader()
+    return loader
@@ -1,24 +1,47 @@
+import asyncio
+import calendar
 import collections
+import collections.abc
+import copy
+import hashlib
+import io
 import json
 import functools
+import itertools
 import urllib.parse
 import http.client as http_client
 
 from django import http
 from django.conf import settings
 from django.conf.urls import patterns, url
+from django.core.exceptions import PermissionDenied
+try:
+    from django.db import close_old_connections
+except ImportError:  # django < 1.6
+    from django.db import close_connection as close_old_connections
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.datastructures import MultiValueDict
 from django.utils import importlib
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.csrf import csrf_exempt
 from django.http.multipartparser import MultiPartParserError
 
-from apy import utils
+from apy import profiling, utils
+from apy.client.forms import compile_form
 from apy.client.methods import METHODS
+from apy.client.models import FieldPlan, to_json_many
 
+from .cache import RESPONSE_CACHE
 from .models import CLIENT_TO_SERVER_MODELS
-from .errors import Errors
+from .errors import Errors, InvalidParameter, RequestBodyTooLarge
+from .loaders import get_loader
+from .resolvers import submit_to_field_executor
+from .routing import SegmentRouter
+from .serializers import DEFAULT_RESPONSE_FORMAT, MIMETYPES, SERIALIZERS, get_serializer, iter_json_array
 
 
 SERVER_METHODS = collections.OrderedDict()
-DEFAULT_RESPONSE_FORMAT = 'json'
+BULK_DATA_KEY = 'objects'  # key of the list of objects in the data of a bulk request, see ClientMethod.bulk_methods
 
 
 # helpers
@@ -37,20 +60,31 @@ class ServerMethodMetaClass(type):
     creation_counter = 0
 
     def __new__(cls, name, bases, attrs):
-        attrs['class_creation_counter'] = ServerMethodMetaClass.creation_counter
-        ServerMethodMetaClass.creation_counter += 1
-        if name in METHODS:
-            attrs['ClientMethod'] = METHODS[name]
-        new_class = super(ServerMethodMetaClass, cls).__new__(cls, name, bases, attrs)
-        client_method = attrs.get('ClientMethod', NotImplemented)
-        if client_method is not NotImplemented:
-            SERVER_METHODS[client_method] = new_class
-        return new_class
+        with profiling.record('server_method', name):
+            attrs['class_creation_counter'] = ServerMethodMetaClass.creation_counter
+            ServerMethodMetaClass.creation_counter += 1
+            if name in METHODS:
+                attrs['ClientMethod'] = METHODS[name]
+            new_class = super(ServerMethodMetaClass, cls).__new__(cls, name, bases, attrs)
+            client_method = attrs.get('ClientMethod', NotImplemented)
+            if client_method is not NotImplemented:
+                SERVER_METHODS[client_method] = new_class
+            return new_class
 
 
 class ServerMethod(object, metaclass=ServerMethodMetaClass):
     ClientMethod = NotImplemented
     errors = import_errors(getattr(settings, 'APY_ERRORS')) if hasattr(settings, 'APY_ERRORS') else Errors
+    stream_response = False  # send list data as a streaming response, encoding rows as they are sent
+    stream_chunk_size = 100  # rows per chunk when streaming
+    use_compiled_forms = True  # clean data with compiled forms where possible, see apy.client.forms.compile_form
+    conditional_get = True  # send ETag/Last-Modified with GET responses and answer conditional GETs with a 304
+    cursor_fields = None  # sort keys stored in next cursors of keyset pagination, the model's id field by default
+    response_cache_models = ()  # names of models in the response besides model and the field plans, see get_response_cache_key
+    max_body_size = getattr(settings, 'APY_MAX_BODY_SIZE', None)  # bytes allowed in a json request body, None for no limit
+    body_serializer = None  # decodes json request bodies, the json serializer with the highest priority by default
+    stream_bulk_body = False  # parse json array bodies of bulk methods item by item while reading them
+    body_chunk_size = 64 * 1024  # bytes read at a time with stream_bulk_body
 
     def __init__(self, **kwargs):
         """
@@ -66,13 +100,26 @@ class ServerMethod(object, metaclass=ServerMethodMetaClass):
         self.args = None
         self.kwargs = None
         self.dirty_data = None
+        self.bulk = False  # the data is a json array of objects, see ClientMethod.bulk_methods
         self.data = None
+        self.validators = (None, None)
+        self.next_cursor = None
 
     @classmethod
     def as_view(cls, **initkwargs):
         """
         Main entry point for a request-response process.
         """
+        cls._check_initkwargs(initkwargs)
+
+        def view(request, *args, **kwargs):
+            self = cls(**initkwargs)  # pylint: disable=W0142
+            return self.dispatch(request, *args, **kwargs)
+
+        return cls._wrap_view(view)
+
+    @classmethod
+    def _check_initkwargs(cls, initkwargs):
         # sanitize keyword arguments
         for key in initkwargs:
             if key in cls.ClientMethod.http_method_names:
@@ -83,10 +130,8 @@ class ServerMethod(object, metaclass=ServerMethodMetaClass):
                 raise TypeError("%s() received an invalid keyword %r" % (
                     cls.__name__, key))
 
-        def view(request, *args, **kwargs):
-            self = cls(**initkwargs)  # pylint: disable=W0142
-            return self.dispatch(request, *args, **kwargs)
-
+    @classmethod
+    def _wrap_view(cls, view):
         # take name and docstring from class
         functools.update_wrapper(view, cls, updated=())
 
@@ -99,30 +144,55 @@ class ServerMethod(object, metaclass=ServerMethodMetaClass):
         # Try to dispatch to the right method; if a method doesn't exist,
         # defer to the error handler. Also defer to the error handler if the
         # request method isn't on the approved list.
+        try:
+            if not self._setup_dispatch(request, args, kwargs):
+                return self.http_method_not_allowed()
+        except RequestBodyTooLarge as e:
+            return self.return_response(*self.handle_exception(e))
+        try:
+            http_response = self.check_not_modified()
+            if http_response is None:
+                http_response = self.get_cached_response()
+            if http_response is not None:
+                return http_response
+            response, http_status_code = self.get_response()
+        except InvalidFormError as e:
+            response, http_status_code = self.invalid_form_response(e)
+        except InvalidParameter as e:
+            response, http_status_code = self.handle_exception(e)
+
+        return self.return_response(response, http_status_code)
+
+    def _setup_dispatch(self, request, args, kwargs):
+        # returns False if the request method isn't allowed
         self.method = request.method.upper()
+        self.request = request  # also needed to pick the format of the not allowed response
         if self.method not in self.ClientMethod.http_method_names:
-            return self.http_method_not_allowed()
-        self.request = request
+            return False
         self.args = args
         self.kwargs = kwargs
+        self.bulk = False
         self.dirty_data = self._get_data_from_request()
-        try:
-            response, http_status_code = self.get_response()
-        except InvalidFormError as e:
-            messages = [f + ": " + ". ".join(map(str, v)) for f, v in list(e.form.errors.items())]
-            response, http_status_code = self.error_response(self.errors.INVALID_PARAM, messages)
-            return self.return_response(response, http_status_code)
+        self.data = None
+        self.validators = (None, None)
+        self.next_cursor = None
+        return True
 
-        return self.return_response(response, http_status_code)
+    def internal_dispatch(self, request, http_method, dirty_data, raise_exception=False, with_status=False):
+        self._setup_internal_dispatch(request, http_method, dirty_data)
+        response, http_status_code = self.get_response(raise_exception=raise_exception)
+        return (response, http_status_code) if with_status else response
 
-    def internal_dispatch(self, request, http_method, dirty_data, raise_exception=False):
+    def _setup_internal_dispatch(self, request, http_method, dirty_data):
         self.method = http_method
         self.request = request
         self.args = None
         self.kwargs = None
-        self.dirty_data = dirty_data
-        response, _ = self.get_response(raise_exception=raise_exception)
-        return response
+        self.bulk = isinstance(dirty_data, list)
+        self.dirty_data = {BULK_DATA_KEY: dirty_data} if self.bulk else dirty_data
+        self.data = None
+        self.validators = (None, None)
+        self.next_cursor = None
 
     def http_method_not_allowed(self):
         message = 'Only %s calls allowed for this url' % (','.join(self.ClientMethod.http_method_names))
@@ -147,18 +217,18 @@ class ServerMethod(object, metaclass=ServerMethodMetaClass):
             d['error_details'] = details
         return d, error['http_code']
 
+    def invalid_form_response(self, exc):
+        prefix = '' if exc.index is None else '%s[%d].' % (BULK_DATA_KEY, exc.index)
+        messages = [prefix + f + ": " + ". ".join(map(str, v)) for f, v in list(exc.form.errors.items())]
+        return self.error_response(self.errors.INVALID_PARAM, messages)
+
     def handle_exception(self, exc):
         if not hasattr(self.errors, 'get_error_for_exception'):
             raise exc
         return self.error_response(**self.errors.get_error_for_exception(exc))
 
     def get_response(self, raise_exception=False):
-        self.data = self.clean_data(self.dirty_data)
-        if 'language' in self.dirty_data:
-            self.request.language = self.dirty_data['language']
-        if 'timezone' in self.dirty_data:
-            self.request.timezone = self.dirty_data['timezone']
-        processor = getattr(self, 'process_%s' % self.method.lower())
+        processor = self._get_processor()
         try:
             response, http_status_code = processor()
         except Exception as e:  # pylint: disable=W0703
@@ -167,17 +237,84 @@ class ServerMethod(object, metaclass=ServerMethodMetaClass):
             return self.handle_exception(e)
         return response, http_status_code
 
+    def _get_processor(self):
+        # cleans the request data unless already done, and returns the process_<method> to call
+        if self.data is None:
+            self.clean_request_data()
+        return getattr(self, 'process_%s' % self.method.lower())
+
+    def clean_request_data(self):
+        self.data = self.clean_data(self.dirty_data)
+        self.check_cursor_fields()
+        if 'language' in self.dirty_data:
+            self.request.language = self.dirty_data['language']
+        if 'timezone' in self.dirty_data:
+            self.request.timezone = self.dirty_data['timezone']
+
+    ######################################
+    def get_version(self):
+        # see BaseServerModel.get_version
+        model = getattr(self, 'model', NotImplemented)
+        return None if model is NotImplemented else model.get_version(self.request, self.data)
+
+    def get_last_modified(self):
+        # see BaseServerModel.get_last_modified
+        model = getattr(self, 'model', NotImplemented)
+        return None if model is NotImplemented else model.get_last_modified(self.request, self.data)
+
+    def check_not_modified(self):
+        # answers a conditional GET with a 304 before processing it, when the version or last modified hooks allow it
+        if not self.conditional_get or self.method != 'GET':
+            return None
+        self.clean_request_data()
+        version = self.get_version()
+        etag = None
+        if version is not None:
+            etag = make_etag(self.ClientMethod.__name__, version, self.get_serializer().format, self.request.get_full_path())
+        last_modified = self.get_last_modified()
+        if last_modified is not None:
+            last_modified = calendar.timegm(last_modified.utctimetuple())
+        self.validators = (etag, last_modified)
+        if self.is_not_modified(etag, last_modified):
+            return self.not_modified_response(etag, last_modified)
+        return None
+
+    def is_not_modified(self, etag, last_modified):
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return etag is not None and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match))
+        if_modified_since = parse_http_date_safe(self.request.META.get('HTTP_IF_MODIFIED_SINCE') or '')
+        return if_modified_since is not None and last_modified is not None and last_modified <= if_modified_since
+
+    def not_modified_response(self, etag, last_modified):
+        return self.add_cache_headers(http.HttpResponseNotModified(), etag, last_modified)
+
+    def add_cache_headers(self, http_response, etag, last_modified):
+        if etag is not None:
+            http_response['ETag'] = etag
+        if last_modified is not None:
+            http_response['Last-Modified'] = http_date(last_modified)
+        if self.ClientMethod.cache_control:
+            http_response['Cache-Control'] = self.ClientMethod.cache_control
+        return http_response
+
+    def get_serializer(self):
+        return get_serializer((self.data or {}).get('format'), self.request.META.get('HTTP_ACCEPT'))
+
     ######################################
     def _get_data_from_request(self):
         data = {}
         if self.method.upper() == 'GET':
             self._add_querydict_to_data(self.request.GET, data)
         elif self.method.upper() == 'POST':
-            self._add_querydict_to_data(self.request.POST, data)
+            if self._get_content_type().startswith('application/json'):
+                data = self._parse_request_body()
+            else:
+                self._add_querydict_to_data(self.request.POST, data)
         elif self.method.upper() == 'PUT':
-            self._parse_request_body(data)
+            data = self._parse_request_body()
         elif self.method.upper() == 'DELETE':
-            self._parse_request_body(data)
+            data = self._parse_request_body()
         # add kwargs from url path
         if self.kwargs:
             data.update(self.kwargs)
@@ -189,22 +326,79 @@ class ServerMethod(object, metaclass=ServerMethodMetaClass):
                 k = k[:-2]
             data[k] = v
 
-    def _parse_request_body(self, data):
-        content_type = self.request.META.get('HTTP_CONTENT_TYPE', self.request.META.get('CONTENT_TYPE', ''))
-        if not content_type: return
+    def _get_content_type(self):
+        return self.request.META.get('HTTP_CONTENT_TYPE', self.request.META.get('CONTENT_TYPE', ''))
+
+    def _parse_request_body(self):
+        data = {}
+        content_type = self._get_content_type()
+        if not content_type: return data
         if content_type.startswith('multipart/'):
-            querydict = self.request.parse_file_upload(self.request.META, self.request)[0]
-        elif content_type.startswith('application/json'):
-            querydict = json.loads(self.request.body.decode('utf-8'))
-        else:
+            self._add_querydict_to_data(self.request.parse_file_upload(self.request.META, self.request)[0], data)
+            return data
+        if not content_type.startswith('application/json'):
             raise Exception('invalid content type: {0}'.format(content_type))
-        self._add_querydict_to_data(querydict, data)
+        if self.stream_bulk_body and self.method in self.ClientMethod.bulk_methods:
+            return self._parse_streamed_json_body()
+        self._check_body_size(self.request.META.get('CONTENT_LENGTH'))
+        body = self.request.body
+        self._check_body_size(len(body))  # also for bodies sent without a length
+        # decoded straight from the bytes, without a decoded copy of the text
+        return self._json_body_to_data(self.get_body_serializer().loads(body))
+
+    def _parse_streamed_json_body(self):
+        # the items of an array body are decoded while it is read, so only one chunk of it is held at a time
+        chunks = self._iter_body_chunks()
+        first = next(chunks, b'')
+        if first.lstrip()[:1] == b'[':
+            self.bulk = True
+            return {BULK_DATA_KEY: list(iter_json_array(itertools.chain([first], chunks)))}
+        return self._json_body_to_data(self.get_body_serializer().loads(first + b''.join(chunks)))
+
+    def _iter_body_chunks(self):
+        size = 0
+        while True:
+            chunk = self.request.read(self.body_chunk_size)
+            if not chunk:
+                return
+            size += len(chunk)
+            self._check_body_size(size)
+            yield chunk
+
+    def _check_body_size(self, size):
+        try:
+            size = int(size or 0)
+        except ValueError:
+            return
+        if self.max_body_size is not None and size > self.max_body_size:
+            raise RequestBodyTooLarge(['request body: at most %d bytes allowed' % self.max_body_size])
+
+    def _json_body_to_data(self, body):
+        if isinstance(body, list):  # bulk request
+            self.bulk = True
+            return {BULK_DATA_KEY: body}
+        if not isinstance(body, dict):
+            raise Exception('invalid request body: a json object or array is required')
+        # the decoded object becomes the data, only keys ending with [] are renamed
+        for k in [k for k in body if k.endswith('[]')]:
+            body[k[:-2]] = body.pop(k)
+        return body
+
+    def get_body_serializer(self):
+        return self.body_serializer or MIMETYPES['application/json']
 
     def clean_data(self, dirty_data):
         form = self.ClientMethod.get_input_form(self.method)
-        if form:
+        if self.bulk and self.method not in self.ClientMethod.bulk_methods:
+            # the form would only see the url kwargs and clean every other field to its empty value
+            raise InvalidParameter(['request body: a json object is required for %s' % self.method])
+        if form and self.bulk:
+            cleaned_data = {BULK_DATA_KEY: self.clean_objects(form, dirty_data[BULK_DATA_KEY])}
+        elif form:
             if getattr(self.request, 'FILES'):
                 f = form(dirty_data, self.request.FILES)
+            elif self.use_compiled_forms:
+                f = compile_form(form)(dirty_data)
             else:
                 f = form(dirty_data)
             if not f.is_valid():
@@ -214,9 +408,42 @@ class ServerMethod(object, metaclass=ServerMethodMetaClass):
             cleaned_data = {}
         if dirty_data.get('callback'):
             cleaned_data['callback'] = str(dirty_data['callback'])
+        if dirty_data.get('format'):
+            cleaned_data.setdefault('format', str(dirty_data['format']))
         return cleaned_data
 
+    def clean_objects(self, form, objects):
+        # cleans every object of a bulk request with the method's form, the first invalid one raises
+        if self.use_compiled_forms:
+            form = compile_form(form)
+        cleaned_objects = []
+        for ix, obj in enumerate(objects):
+            if not isinstance(obj, dict):
+                raise InvalidParameter(['%s[%d]: a json object is required' % (BULK_DATA_KEY, ix)])
+            f = form(obj)
+            if not f.is_valid():
+                raise InvalidFormError(f, index=ix)
+            cleaned_objects.append(f.cleaned_data)
+        return cleaned_objects
+
     def return_response(self, response, http_status_code):
+        self.add_pagination(response)
+        serializer = self.get_serializer()
+        if serializer.is_json and self.stream_response and is_streamable(response.get('data')):
+            mimetype, callback = self.get_mimetype(serializer)
+            chunks = stream_json_encode(response, self.request, callback=callback, chunk_size=self.stream_chunk_size,
+                                        dumps=serializer.dumps)
+            http_response = http.StreamingHttpResponse(chunks, status=http_status_code, mimetype=mimetype)
+            if self.is_cacheable(http_status_code):
+                self.add_cache_headers(http_response, *self.validators)
+            return http_response
+        formatted_response, mimetype = self.encode_response(response, serializer)
+        return self.make_http_response(formatted_response, http_status_code, mimetype)
+
+    def add_pagination(self, response):
+        if self.is_cursor_paginated():
+            self.add_cursor_pagination(response)
+            return
         # add pagination to requests with limit and offset
         if self.data and self.data.get('limit') is not None and self.data.get('offset') is not None:
             response['pagination'] = {}
@@ -229,29 +456,270 @@ class ServerMethod(object, metaclass=ServerMethodMetaClass):
                 d['limit'] = min(self.data['limit'], self.data['offset'] - d['offset'])
                 response['pagination']['prev'] = self.request.build_absolute_uri(self.request.path + '?' + urllib.parse.urlencode(d))
 
-        response_format = self.data and self.data.get('format') or DEFAULT_RESPONSE_FORMAT
-        if response_format not in ['json']:
-            response_format = DEFAULT_RESPONSE_FORMAT  # TODO add support for xml
-        if response_format == 'json':
-            formatted_response = json_encode(response, self.request)
-            # raise Exception(formatted_response)
-            mimetype = 'application/json'
-            callback = self.data and self.data.get('callback')
-            if callback:
-                formatted_response = '%s(%s)' % (callback, formatted_response)
-                mimetype = 'text/javascript'
+    def is_cursor_paginated(self):
+        # requests cleaned by a CursorForm
+        return bool(self.data) and 'cursor' in self.data and self.data.get('limit') is not None
 
-        return http.HttpResponse(formatted_response, status=http_status_code, mimetype=mimetype)
+    def add_cursor_pagination(self, response):
+        if not response.get('ok'):
+            return
+        next_cursor = self.get_next_cursor(response.get('data'))
+        response['pagination'] = {}
+        if next_cursor is not None:
+            d = collections.OrderedDict(urllib.parse.parse_qsl(self.request.META['QUERY_STRING']) if self.request.META.get('QUERY_STRING') else [])
+            d.pop('offset', None)
+            d['cursor'] = next_cursor
+            d['limit'] = self.data['limit']
+            response['pagination']['next'] = self.request.build_absolute_uri(self.request.path + '?' + urllib.parse.urlencode(d))
 
+    def check_cursor_fields(self):
+        # the next cursor is made from the cursor fields of the last row, so the response has to have them
+        if not self.is_cursor_paginated():
+            return
+        query_fields = self.data.get('fields')
+        if query_fields is None:
+            model = getattr(self, 'nested_model', NotImplemented)
+            model = getattr(self, 'model', NotImplemented) if model is NotImplemented else model
+            if model is NotImplemented:
+                return
+            query_fields = model.ClientModel.get_default_fields()
+        keys = [query_field.key for query_field in query_fields]
+        missing = [key for key in self.get_cursor_fields() if key not in keys]
+        if missing:
+            raise InvalidParameter(['fields: %s required with a cursor' % ', '.join(missing)])
+
+    def get_cursor_kwargs(self):
+        # cursor and limit for db_find or get_related_objects, to be passed by process_<method>
+        return {'cursor': self.data.get('cursor'), 'limit': self.data['limit']}
+
+    def get_cursor_fields(self):
+        if self.cursor_fields is not None:
+            return self.cursor_fields
+        model = getattr(self, 'model', NotImplemented)
+        return (model.ClientModel.id_field, ) if model is not NotImplemented else ()
+
+    def get_next_cursor(self, rows):
+        # cursor of the page after rows, made from the cursor fields of the last row, None on the last page;
+        # process_<method> can set self.next_cursor instead, e.g. when rows is an iterator
+        if self.next_cursor is not None:
+            return self.next_cursor
+        if not isinstance(rows, list) or len(rows) < self.data['limit']:
+            return None
+        last = rows[-1]
+        values = {}
+        for key in self.get_cursor_fields():  # in the response, see check_cursor_fields
+            values[key] = last[key]
+        return utils.make_cursor(values)
+
+    def get_mimetype(self, serializer):
+        # returns the mimetype and the jsonp callback, if any
+        callback = serializer.is_json and self.data and self.data.get('callback')
+        return ('text/javascript' if callback else serializer.mimetype), callback
+
+    def encode_response(self, response, serializer):
+        mimetype, callback = self.get_mimetype(serializer)
+        formatted_response = serializer.dumps(response_to_json(response, self.request))
+        if callback:
+            formatted_response = wrap_callback(callback, formatted_response)
+        return formatted_response, mimetype
+
+    def is_cacheable(self, http_status_code):
+        return self.conditional_get and self.method == 'GET' and http_status_code == http_client.OK
+
+    def make_http_response(self, formatted_response, http_status_code, mimetype, etag=None):
+        if not self.is_cacheable(http_status_code):
+            return http.HttpResponse(formatted_response, status=http_status_code, mimetype=mimetype)
+
+        # without a version hook the ETag is a hash of the body
+        etag = self.validators[0] or etag or make_etag(formatted_response)
+        last_modified = self.validators[1]
+        if self.is_not_modified(etag, last_modified):
+            return self.not_modified_response(etag, last_modified)
+        http_response = http.HttpResponse(formatted_response, status=http_status_code, mimetype=mimetype)
+        return self.add_cache_headers(http_response, etag, last_modified)
 
-def json_encode(response, request):
+    ######################################
+    def get_cached_response(self):
+        # GETs of methods with a response_cache_ttl are served from the response cache, None for other requests
+        ttl = self.ClientMethod.response_cache_ttl
+        if not ttl or self.method != 'GET':
+            return None
+        if self.data is None:
+            self.clean_request_data()
+        cached = RESPONSE_CACHE.get_or_compute(self.get_response_cache_key(), self._compute_cached_response, ttl)
+        return self.make_http_response(*cached)
+
+    def _compute_cached_response(self):
+        response, http_status_code = self.get_response()
+        return self._to_cached_response(response, http_status_code)
+
+    def _to_cached_response(self, response, http_status_code):
+        # (formatted response, status, mimetype, etag), and whether it can be cached
+        self.add_pagination(response)
+        formatted_response, mimetype = self.encode_response(response, self.get_serializer())
+        etag = make_etag(formatted_response) if self.conditional_get else None
+        return (formatted_response, http_status_code, mimetype, etag), http_status_code == http_client.OK
+
+    def get_response_cache_key(self):
+        # cleaned data with field plans normalized, response format, host, the language and timezone the
+        # response is formatted for, and the generation of every model in the response, so writes to any
+        # of them invalidate it
+        model_names = list(self.response_cache_models)
+        models = [model for model in (getattr(self, 'model', NotImplemented), getattr(self, 'nested_model', NotImplemented))
+                  if model is not NotImplemented]
+        model_names.extend(model.ClientModel.__name__ for model in models)
+        items = []
+        has_plan = False
+        for k, v in sorted(self.data.items()):
+            if isinstance(v, FieldPlan):
+                has_plan = True
+                model_names.extend(m.__name__ for m in v.models)
+                v = v.normalized
+            items.append((k, v))
+        if not has_plan:
+            # no fields asked for, the response has the default fields
+            for model in models:
+                model_names.extend(m.__name__ for m in model.ClientModel.get_default_fields().models)
+        # pagination links repeat the query string
+        paginated = self.data.get('limit') is not None and (self.data.get('offset') is not None or 'cursor' in self.data)
+        query_string = self.request.META.get('QUERY_STRING', '') if paginated else ''
+        generations = RESPONSE_CACHE.get_generations(sorted(set(model_names)))
+        # set from the request data by clean_request_data, or by a middleware
+        locale = (getattr(self.request, 'language', None), getattr(self.request, 'timezone', None))
+        return ('apy-response', make_etag(self.ClientMethod.__name__, items, self.get_serializer().format,
+                                          self.request.get_host(), self.request.path, query_string, locale, generations))
+
+
+def response_to_json(response, request):
     data = response.get('data')
     if data is not None:
         if isinstance(data, list):
-            response['data'] = [d.to_json(request) for d in data]
+            response['data'] = to_json_many(request, data)
         else:
             response['data'] = data.to_json(request)
-    return json.dumps(response)
+    return response
+
+
+def json_encode(response, request):
+    return json.dumps(response_to_json(response, request))
+
+
+def make_etag(*parts):
+    # strong etag, a hash of the body or of what identifies it
+    digest = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode('utf-8')
+        digest.update(part)
+        digest.update(b'\0')
+    return '"%s"' % digest.hexdigest()
+
+
+def parse_etags(header):
+    # etags listed in an If-None-Match header, weak ones compare equal to their strong version
+    etags = []
+    for etag in header.split(','):
+        etag = etag.strip()
+        if etag.startswith('W/'):
+            etag = etag[2:]
+        if etag:
+            etags.append(etag)
+    return etags
+
+
+def wrap_callback(callback, formatted_response):
+    if isinstance(formatted_response, bytes):
+        return b'%s(%s)' % (callback.encode('utf-8'), formatted_response)
+    return '%s(%s)' % (callback, formatted_response)
+
+
+def is_streamable(data):
+    return isinstance(data, (list, collections.abc.Iterator))
+
+
+def stream_json_encode(response, request, callback=None, chunk_size=100, dumps=json.dumps):
+    # same output as json_encode, but the data rows are converted and encoded a chunk at a time
+    others = {k: v for k, v in response.items() if k != 'data'}
+    envelope = dumps(others) if others else '{}'
+    if isinstance(envelope, bytes):
+        envelope = envelope.decode('utf-8')
+    # the other keys are followed by a comma, if there are any
+    yield '%s%s%s"data": [' % ('%s(' % callback if callback else '', envelope[:-1], ', ' if others else '')
+    rows = iter(response['data'])
+    first = True
+    while True:
+        chunk = [dumps(d) for d in to_json_many(request, list(itertools.islice(rows, chunk_size)))]
+        if not chunk:
+            break
+        separator = b', ' if isinstance(chunk[0], bytes) else ', '
+        yield (separator[:0] if first else separator) + separator.join(chunk)
+        first = False
+    yield ']})' if callback else ']}'
+
+
+class AsyncServerMethod(ServerMethod):
+    """
+    Server method whose process_<method> are coroutines, as_view returns a coroutine view.
+    Cleaning the data and encoding the response stay synchronous.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        cls._check_initkwargs(initkwargs)
+
+        async def view(request, *args, **kwargs):
+            self = cls(**initkwargs)  # pylint: disable=W0142
+            return await self.dispatch(request, *args, **kwargs)
+
+        return cls._wrap_view(view)
+
+    async def dispatch(self, request, *args, **kwargs):  # pylint: disable=W0236
+        try:
+            if not self._setup_dispatch(request, args, kwargs):
+                return self.http_method_not_allowed()
+        except RequestBodyTooLarge as e:
+            return self.return_response(*self.handle_exception(e))
+        try:
+            http_response = self.check_not_modified()
+            if http_response is None:
+                http_response = await self.aget_cached_response()
+            if http_response is not None:
+                return http_response
+            response, http_status_code = await self.get_response()
+        except InvalidFormError as e:
+            response, http_status_code = self.invalid_form_response(e)
+        except InvalidParameter as e:
+            response, http_status_code = self.handle_exception(e)
+
+        return self.return_response(response, http_status_code)
+
+    async def internal_dispatch(self, request, http_method, dirty_data, raise_exception=False, with_status=False):  # pylint: disable=W0236
+        self._setup_internal_dispatch(request, http_method, dirty_data)
+        response, http_status_code = await self.get_response(raise_exception=raise_exception)
+        return (response, http_status_code) if with_status else response
+
+    async def aget_cached_response(self):
+        ttl = self.ClientMethod.response_cache_ttl
+        if not ttl or self.method != 'GET':
+            return None
+        if self.data is None:
+            self.clean_request_data()
+        cached = await RESPONSE_CACHE.aget_or_compute(self.get_response_cache_key(), self._acompute_cached_response, ttl)
+        return self.make_http_response(*cached)
+
+    async def _acompute_cached_response(self):
+        response, http_status_code = await self.get_response()
+        return self._to_cached_response(response, http_status_code)
+
+    async def get_response(self, raise_exception=False):  # pylint: disable=W0236
+        processor = self._get_processor()
+        try:
+            response, http_status_code = await processor()
+        except Exception as e:  # pylint: disable=W0703
+            if raise_exception:
+                raise
+            return self.handle_exception(e)
+        return response, http_status_code
 
 
 # errors
@@ -260,9 +728,10 @@ class AccessForbiddenError(Exception):
 
 
 class InvalidFormError(Exception):
-    def __init__(self, form):
+    def __init__(self, form, index=None):
         Exception.__init__(self, form.errors.as_text())
         self.form = form
+        self.index = index  # position of the invalid object in a bulk request
 
 
 # helper classes
@@ -283,6 +752,9 @@ class ServerObjectsMethod(ServerMethod, metaclass=ServerObjectsMethodMetaClass):
     def process_get(self):
         raise NotImplementedError()
 
+    def process_put(self):
+        raise NotImplementedError()
+
     def process_delete(self):
         raise NotImplementedError()
 
@@ -328,37 +800,126 @@ class ServerObjectNestedMethod(ServerMethod, metaclass=ServerObjectNestedMethodM
         raise NotImplementedError()
 
 
+class AsyncServerObjectsMethod(AsyncServerMethod, ServerObjectsMethod):
+    async def process_post(self):
+        raise NotImplementedError()
+
+    async def process_get(self):
+        raise NotImplementedError()
+
+    async def process_put(self):
+        raise NotImplementedError()
+
+    async def process_delete(self):
+        raise NotImplementedError()
+
+
+class AsyncServerObjectMethod(AsyncServerMethod, ServerObjectMethod):
+    async def process_get(self):
+        raise NotImplementedError()
+
+    async def process_put(self):
+        raise NotImplementedError()
+
+    async def process_delete(self):
+        raise NotImplementedError()
+
+
+class AsyncServerObjectNestedMethod(AsyncServerMethod, ServerObjectNestedMethod):
+    async def process_post(self):
+        raise NotImplementedError()
+
+    async def process_get(self):
+        raise NotImplementedError()
+
+
 def add_nested_methods_for_model(lcls, model, base_class):
     for name, field in model.ClientModel.get_nested_method_fields():  # pylint: disable=W0612
         cname = '%s%sNestedMethod' % (model.__name__, utils.snake_case_to_camel_case(name))
         lcls[cname] = type(cname, (base_class,), {})
 
 
+class MethodInfo(dict):
+    # description of a method in InternalDispatch.categories, its 'form' is only built when looked up
+    def __missing__(self, key):
+        if key != 'form':
+            raise KeyError(key)
+        form = self['form'] = self['method'].get_input_form(self['http_method'])
+        return form
+
+    def get(self, key, default=None):
+        return self[key] if key == 'form' else super(MethodInfo, self).get(key, default)
+
+
+CSRF_MIDDLEWARE = 'django.middleware.csrf.CsrfViewMiddleware'
+
+
 # way to call the api internally
 class InternalDispatch(object):
-    def __init__(self, version):
+    errors = ServerMethod.errors
+    max_batch_operations = 50  # operations allowed in one request to the batch endpoint
+    max_body_size = ServerMethod.max_body_size
+
+    def __init__(self, version, use_router=None, use_batch=None):
+        # with use_router (APY_USE_ROUTER by default) every request goes through router_view, which finds
+        # the method with a SegmentRouter instead of django trying one regex per method
+        self.use_router = getattr(settings, 'APY_USE_ROUTER', False) if use_router is None else use_router
+        # with use_batch (APY_BATCH by default) the /batch url is added, see batch_view
+        self.use_batch = getattr(settings, 'APY_BATCH', False) if use_batch is None else use_batch
+        self.router = SegmentRouter()
         self.server_methods = {}
+        self.views = {}
         self.urls = []
         self.categories = collections.OrderedDict()
         for client_method, server_method in SERVER_METHODS.items():
-            url_pattern = '^/%s$' % (client_method.url_pattern)
-            view = server_method.as_view()
-            self.server_methods[client_method] = server_method()
-            self.urls.append(url(
-                    url_pattern, view,
-                    name='api-v{version}-{name}'.format(version=version, name=client_method.__name__)))
+            with profiling.record('url', client_method.__name__):
+                url_pattern = '^/%s$' % (client_method.url_pattern)
+                view = server_method.as_view()
+                self.server_methods[client_method] = server_method()
+                self.views[client_method] = view
+                self.router.add(client_method.url_pattern, view)
+                self.urls.append(url(
+                        url_pattern, view,
+                        name='api-v{version}-{name}'.format(version=version, name=client_method.__name__)))
+                if profiling.PROFILER.enabled:
+                    # so the profile includes it, instead of it happening on the first request
+                    self.compile_url(self.urls[-1])
             category_methods = self.categories.setdefault(client_method.category, [])
             for http_method in client_method.http_method_names:
                 if http_method not in client_method.names:
                     raise Exception('cannot create class %s, name for %s not specified' %
                                     (client_method.__name__, http_method))
-                category_methods.append(
+                category_methods.append(MethodInfo(
                     {'method': client_method,
                      'http_method': http_method,
                      'name': client_method.__name__,
-                     'display_name': client_method.names[http_method],
-                     'form': client_method.get_input_form(http_method)})
-        self.urlpatterns = patterns('', *self.urls)
+                     'display_name': client_method.names[http_method]}))
+        if self.use_batch:
+            self.urls.append(url('^/batch$', self.batch_view, name='api-v{version}-batch'.format(version=version)))
+            self.router.add('batch', self.batch_view)
+        if self.use_router:
+            # the other urls stay after it so reverse() keeps working, they are never tried
+            self.urlpatterns = patterns('', url('^/(?P<path>.*)$', csrf_exempt(self.router_view)), *self.urls)
+        else:
+            self.urlpatterns = patterns('', *self.urls)
+        profiling.PROFILER.finish()
+
+    @staticmethod
+    def compile_url(pattern):
+        # django compiles the regex of a url pattern the first time it is read
+        return pattern.regex
+
+    def router_view(self, request, path):
+        # django's middleware only sees this view, csrf is checked here against the view the path resolves to
+        route = self.router.resolve(path)
+        if route is None:
+            raise http.Http404('No api method matches "%s"' % path)
+        view, kwargs = route
+        if CSRF_MIDDLEWARE in getattr(settings, 'MIDDLEWARE_CLASSES', ()):
+            http_response = CsrfViewMiddleware().process_view(request, view, (), kwargs)
+            if http_response is not None:
+                return http_response
+        return view(request, **kwargs)
 
     def internal_call(self, request, http_method, client_method, dirty_data, raise_exception=True):
         dirty_data = dirty_data.copy()
@@ -381,3 +942,150 @@ class InternalDispatch(object):
 
     def internal_delete(self, request, client_method, dirty_data, raise_exception=True):
         return self.internal_call(request, 'DELETE', client_method, dirty_data, raise_exception=raise_exception)
+
+    # batch endpoint
+    def batch_view(self, request):
+        """
+        Runs the operations posted as {"operations": [{"method": "GET", "name": client method name, "data": {...}}, ...],
+        "parallel": false} (or just the list) through the views of their methods, with their decorators, each on its
+        own copy of the request that shares the request's loader. Django's middleware, csrf included, only sees
+        the batch request. Responds with the status and body of every operation in order; with "parallel"
+        consecutive GETs run at the same time, every other operation waits for the ones before it.
+        """
+        response, http_status_code = self._run_batch(request)
+        serializer = get_serializer(request.GET.get('format'), request.META.get('HTTP_ACCEPT'))
+        return http.HttpResponse(serializer.dumps(response), status=http_status_code, mimetype=serializer.mimetype)
+
+    def _run_batch(self, request):
+        if request.method.upper() != 'POST':
+            return self._batch_error(self.errors.INVALID_HTTP_METHOD, ['Only POST calls allowed for this url'])
+        content_type = request.META.get('CONTENT_TYPE', '').split(';')[0].strip()
+        serializer = MIMETYPES.get(content_type, SERIALIZERS[DEFAULT_RESPONSE_FORMAT])
+        # the declared length is checked before the body is read
+        if self._is_too_large(request.META.get('CONTENT_LENGTH')) or self._is_too_large(len(request.body)):
+            return self._batch_error(self.errors.REQUEST_TOO_LARGE,
+                                     ['request body: at most %d bytes allowed' % self.max_body_size])
+        try:
+            payload = serializer.loads(request.body)
+        except ValueError:
+            return self._batch_error(self.errors.INVALID_PARAM, ['invalid request body'])
+        parallel = False
+        if isinstance(payload, dict):
+            operations, parallel = payload.get('operations'), bool(payload.get('parallel'))
+        else:
+            operations = payload
+        if not isinstance(operations, list):
+            return self._batch_error(self.errors.INVALID_PARAM, ['operations: a list is required'])
+        if len(operations) > self.max_batch_operations:
+            return self._batch_error(self.errors.INVALID_PARAM,
+                                     ['operations: at most %d allowed' % self.max_batch_operations])
+
+        get_loader(request)  # created before the requests of the operations copy it, so they share it
+        results = [None] * len(operations)
+        gets = []  # indexes of consecutive GETs that can run together
+
+        def run_gets():
+            if len(gets) > 1:
+                futures = [(ix, submit_to_field_executor(self.run_pooled_operation, request, operations[ix])) for ix in gets]
+                for ix, future in futures:
+                    results[ix] = future.result()
+            elif gets:
+                results[gets[0]] = self.run_operation(request, operations[gets[0]])
+            del gets[:]
+
+        for ix, operation in enumerate(operations):
+            if parallel and isinstance(operation, dict) and str(operation.get('method', 'GET')).upper() == 'GET':
+                gets.append(ix)
+                continue
+            run_gets()
+            results[ix] = self.run_operation(request, operation)
+        run_gets()
+        return {'ok': True, 'data': results}, http_client.OK
+
+    def _is_too_large(self, size):
+        try:
+            return self.max_body_size is not None and int(size or 0) > self.max_body_size
+        except ValueError:
+            return False
+
+    def run_pooled_operation(self, request, operation):
+        # run_operation on an executor thread: django only closes stale or broken connections around
+        # requests, which these long lived threads never see, so it is done around every operation
+        close_old_connections()
+        try:
+            return self.run_operation(request, operation)
+        finally:
+            close_old_connections()
+
+    def run_operation(self, request, operation):
+        # returns {"status": http status code, "body": response} for one operation of a batch
+        if not isinstance(operation, dict):
+            return self._batch_result(*self._batch_error(self.errors.INVALID_PARAM, ['operation: an object is required']))
+        http_method = str(operation.get('method', 'GET')).upper()
+        client_method = METHODS.get(operation.get('name'))
+        if client_method not in self.views:
+            return self._batch_result(*self._batch_error(self.errors.UNKNOWN_API_METHOD,
+                                                         ['Invalid client method: "%s"' % operation.get('name')]))
+        if http_method not in client_method.http_method_names:
+            message = 'Only %s calls allowed for this method' % (','.join(client_method.http_method_names))
+            return self._batch_result(*self._batch_error(self.errors.INVALID_HTTP_METHOD, [message]))
+        data = operation.get('data') or {}
+        if not isinstance(data, (dict, list)) or (http_method == 'GET' and isinstance(data, list)):
+            return self._batch_result(*self._batch_error(self.errors.INVALID_PARAM, ['data: an object is required']))
+        try:
+            http_response = self.views[client_method](self.make_operation_request(request, http_method, data))
+            if asyncio.iscoroutine(http_response):
+                http_response = asyncio.run(http_response)
+        except PermissionDenied:
+            return self._batch_result(*self._batch_error(self.errors.FORBIDDEN, None))
+        except http.Http404:
+            return self._batch_result(*self._batch_error(self.errors.NOT_FOUND, None))
+        return self._batch_result(self._operation_body(http_response), http_response.status_code)
+
+    def make_operation_request(self, request, http_method, data):
+        # a copy of the batch request carrying the data of one operation, what its view sets on it stays there
+        operation_request = copy.copy(request)
+        operation_request.method = http_method
+        operation_request.META = dict(request.META, REQUEST_METHOD=http_method, QUERY_STRING='',
+                                      HTTP_ACCEPT='application/json')
+        operation_request.META.pop('HTTP_CONTENT_TYPE', None)
+        operation_request.GET = http.QueryDict('', mutable=True)
+        operation_request._post = http.QueryDict('')  # pylint: disable=W0212
+        operation_request._files = MultiValueDict()  # pylint: disable=W0212
+        if isinstance(data, dict):
+            data = {k: v for k, v in data.items() if k not in ('format', 'callback')}  # responses are always json
+        if http_method == 'GET':
+            for k, v in data.items():
+                operation_request.GET.setlist(k, [str(x) for x in v] if isinstance(v, list) else [str(v)])
+            operation_request.META.pop('CONTENT_TYPE', None)
+            operation_request.META.pop('CONTENT_LENGTH', None)
+            body = b''
+        else:
+            body = SERIALIZERS['json'].dumps(data)
+            body = body.encode('utf-8') if isinstance(body, str) else body
+            operation_request.META.update(CONTENT_TYPE='application/json', CONTENT_LENGTH=str(len(body)))
+        operation_request._body = body  # pylint: disable=W0212
+        operation_request._stream = io.BytesIO(body)  # pylint: disable=W0212
+        operation_request._read_started = False  # pylint: disable=W0212
+        return operation_request
+
+    def _operation_body(self, http_response):
+        if getattr(http_response, 'streaming', False):
+            content = b''.join(http_response.streaming_content)
+        else:
+            content = http_response.content
+        if not content:
+            return None
+        try:
+            return SERIALIZERS['json'].loads(content)
+        except ValueError:  # e.g. the response of a decorator
+            return content.decode('utf-8', 'replace')
+
+    def _batch_result(self, body, http_status_code):
+        return {'status': http_status_code, 'body': body}
+
+    def _batch_error(self, error, messages):
+        response = {'ok': False, 'error': error['name']}
+        if messages:
+            response['error_messages'] = messages
+        return response, error['http_code']
@@ -1,8 +1,14 @@
 import collections
+import operator
 
-from apy.client.models import MODELS
+from apy.client.models import MODELS, FieldPlan
+
+from apy import profiling, utils
 
 from . import fields as apy_fields
+from .cache import RESPONSE_CACHE
+from .loaders import get_loader
+from .resolvers import LevelResolver, aresolve_server_fields, resolve_server_fields
 
 SERVER_MODELS = {}
 CLIENT_TO_SERVER_MODELS = {}
@@ -24,18 +30,162 @@ def get_model_fields(bases, attrs):
 
 class BaseServerModelMetaClass(type):
     def __new__(cls, name, bases, attrs):
-        attrs['base_fields'] = get_model_fields(bases, attrs)
-        if name in MODELS:
-            attrs['ClientModel'] = MODELS[name]
-        new_class = super(BaseServerModelMetaClass, cls).__new__(cls, name, bases, attrs)
-        SERVER_MODELS[name] = new_class
-        CLIENT_TO_SERVER_MODELS[new_class.ClientModel] = new_class
-        return new_class
+        with profiling.record('server_model', name):
+            attrs['base_fields'] = get_model_fields(bases, attrs)
+            if name in MODELS:
+                attrs['ClientModel'] = MODELS[name]
+            new_class = super(BaseServerModelMetaClass, cls).__new__(cls, name, bases, attrs)
+            SERVER_MODELS[name] = new_class
+            CLIENT_TO_SERVER_MODELS[new_class.ClientModel] = new_class
+            return new_class
+
+
+class ClientRow(object):
+    """
+    client_data of an object converted by a RowBuilder of a model with unrestricted_read: the values
+    sit at their positions in the client model layout, so the client model is built without a dict.
+    """
+    __slots__ = ('values', )
+    layout = None
+    indexes = None
+    converters = ()  # (index, to_client) of the values still unconverted, i.e. the server fields
+
+    def __init__(self, values):
+        self.values = values
+
+    def __setitem__(self, key, value):
+        self.values[self.indexes[key]] = value
+
+    def __getitem__(self, key):
+        return self.values[self.indexes[key]]
+
+    def __iter__(self):
+        return iter(self.layout.keys)
+
+    def build(self):
+        values = self.values
+        for ix, to_client in self.converters:
+            values[ix] = to_client(values[ix])
+        return tuple.__new__(self.layout, values)
+
+
+class RowBuilder(object):
+    """
+    Converts server objects to client models for one field plan, compiled once per (model, plan).
+    Rows get a client_data dict built in one step instead of key by key, since server fields fill it
+    in by key and check_read_permissions takes and returns it. Models with unrestricted_read skip
+    check_read_permissions, so their plain fields are converted straight into the client model layout
+    and only the server fields go through a ClientRow.
+    """
+
+    def __init__(self, model, query_fields):
+        self.model = model
+        client_fields = model.ClientModel.base_fields
+        required_keys = []
+        optional_keys = []
+        server_fields = []
+        for query_field in query_fields:
+            client_field = client_fields.get(query_field.key)
+            if client_field is None:
+                raise Exception('invalid query field %r' % (query_field, ))
+            server_field = model.base_fields.get(query_field.key)
+            if server_field is not None:
+                server_fields.append((server_field, query_field))
+            elif client_field.default_to_none:
+                optional_keys.append(query_field.key)
+            else:
+                required_keys.append(query_field.key)
+        self.required_keys = tuple(required_keys)
+        self.optional_keys = tuple(optional_keys)
+        self.server_fields = tuple(server_fields)
+        self.server_keys = tuple(query_field.key for _, query_field in server_fields)
+        self._getter = operator.itemgetter(*required_keys) if required_keys else None
+        self.row_class = None
+        if model.unrestricted_read:
+            layout = model.ClientModel._get_layout(tuple(query_field.key for query_field in query_fields))
+            converters = {k: (ix, to_client) for k, ix, to_client in layout._converters}
+            self.row_class = type('ClientRow', (ClientRow, ), {
+                '__slots__': (),
+                'layout': layout,
+                'indexes': layout._field_indexes,
+                'converters': tuple(converters[k] for k in self.server_keys),
+            })
+            self._required = tuple((k, ) + converters[k] for k in required_keys)
+            self._optional = tuple((k, ) + converters[k] for k in optional_keys)
+            self._blank = [None] * layout._size
+
+    def populate(self, request, objects):
+        # fills in client_data of every object, plain fields row by row and server fields in one call each
+        self.prepare(objects)
+        resolve_server_fields(request, self.model, self.server_fields, objects)
+
+    async def apopulate(self, request, objects):
+        self.prepare(objects)
+        await aresolve_server_fields(request, self.model, self.server_fields, objects)
+
+    def prepare(self, objects):
+        # fills in the plain fields, server fields get placeholders to keep the key order
+        if self.row_class is not None:
+            self.prepare_rows(objects)
+            return
+        model, keys, getter, optional_keys = self.model, self.required_keys, self._getter, self.optional_keys
+        server_keys = self.server_keys
+        single_key = keys[0] if len(keys) == 1 else None  # itemgetter returns a bare value for one key
+        for obj in objects:
+            if not isinstance(obj, model):
+                raise Exception('cannot convert "%r" to client model: not an instance of %s' % (obj, model.__name__))
+            if obj.client_data is not None:
+                raise Exception('object already converted to client data!!')
+            data = obj.data
+            if getter is None:
+                client_data = {}
+            else:
+                try:
+                    values = getter(data)
+                except KeyError as e:
+                    raise KeyError("'%s' not in %r" % (e.args[0], data))
+                client_data = {single_key: values} if single_key is not None else dict(zip(keys, values))
+            for key in optional_keys:
+                client_data[key] = data.get(key)
+            for key in server_keys:
+                client_data[key] = None
+            obj.client_data = client_data
+
+    def prepare_rows(self, objects):
+        # converts the plain fields straight into the layout, server fields are converted by ClientRow.build
+        model, row_class, blank, required, optional = self.model, self.row_class, self._blank, self._required, self._optional
+        for obj in objects:
+            if not isinstance(obj, model):
+                raise Exception('cannot convert "%r" to client model: not an instance of %s' % (obj, model.__name__))
+            if obj.client_data is not None:
+                raise Exception('object already converted to client data!!')
+            data = obj.data
+            values = blank[:]
+            try:
+                for key, ix, to_client in required:
+                    values[ix] = to_client(data[key])
+            except KeyError as e:
+                raise KeyError("'%s' not in %r" % (e.args[0], data))
+            for key, ix, to_client in optional:
+                values[ix] = to_client(data.get(key))
+            obj.client_data = row_class(values)
 
 
 class BaseServerModel(object, metaclass=BaseServerModelMetaClass):
     ClientModel = NotImplemented
     base_fields = None
+    use_row_builder = False  # populate client data with a RowBuilder compiled per field plan
+    # every request may read every field: check_read_permissions isn't called and a RowBuilder writes
+    # the values straight into the client models instead of building a client_data dict first
+    unrestricted_read = False
+    use_request_loader = True  # batch and memoize reads by id for the rest of the request, see find
+    object_cache = None  # a cache.BaseObjectCache serving reads by id across requests, see db_find_ids
+    # read passes the columns its field plan needs to db_find, see get_columns; off by default since
+    # check_read_permissions and custom server fields then only see those columns and always_columns
+    use_projection = False
+    always_columns = ()  # columns every read loads, e.g. the ones check_read_permissions looks at
+    column_costs = {}  # relative cost of loading a column, 1 if not listed, see get_column_cost
+    field_concurrency = None  # resolve up to this many sibling server fields at once, see resolve_server_fields
 
     def __init__(self, *args, **kwargs):
         self.data = dict(*args, **kwargs)
@@ -53,20 +203,71 @@ class BaseServerModel(object, metaclass=BaseServerModelMetaClass):
     def create(cls, request, **row):
         cls.check_create_permissions(request, row)
         data = cls.db_insert(request, row)
-        return cls(data) if data else None
+        obj = cls(data) if data else None
+        if obj is not None:
+            obj.forget(request)
+        return obj
+
+    @classmethod
+    def find(cls, request, **kwargs):
+        # db_find for reads, lookups by ids alone go through the request's DataLoader
+        if not cls._is_find_by_ids(kwargs):
+            return cls.db_find(**kwargs)
+        loader = get_loader(request) if cls.use_request_loader else None
+        if loader is not None:
+            return loader.load_many(cls, kwargs['ids'], columns=kwargs.get('fields'))
+        return cls.db_find_ids(kwargs['ids'], fields=kwargs.get('fields'))
+
+    @classmethod
+    def _is_find_by_ids(cls, kwargs):
+        # lookups by ids alone, optionally with the columns to load
+        return kwargs.get('ids') is not None and not set(kwargs) - {'ids', 'fields'}
 
     @classmethod
     def read(cls, request, query_fields, **kwargs):
-        return cls.to_client(request, cls.db_find(**kwargs), query_fields=query_fields)
+        if cls.use_projection and 'fields' not in kwargs:
+            kwargs['fields'] = cls.get_columns(query_fields)
+        return cls.to_client(request, cls.find(request, **kwargs), query_fields=query_fields)
 
     @classmethod
     def read_one(cls, request, query_fields, **kwargs):
         rows = cls.read(request, query_fields, **kwargs)
         return rows[0] if rows else None
 
+    @classmethod
+    async def acreate(cls, request, **row):
+        cls.check_create_permissions(request, row)
+        data = await cls.adb_insert(request, row)
+        obj = cls(data) if data else None
+        if obj is not None:
+            obj.forget(request)
+        return obj
+
+    @classmethod
+    async def afind(cls, request, **kwargs):
+        if not cls._is_find_by_ids(kwargs):
+            return await cls.adb_find(**kwargs)
+        loader = get_loader(request) if cls.use_request_loader else None
+        if loader is not None:
+            return await loader.aload_many(cls, kwargs['ids'], columns=kwargs.get('fields'))
+        return await cls.adb_find_ids(kwargs['ids'], fields=kwargs.get('fields'))
+
+    @classmethod
+    async def aread(cls, request, query_fields, **kwargs):
+        if cls.use_projection and 'fields' not in kwargs:
+            kwargs['fields'] = cls.get_columns(query_fields)
+        return await cls.ato_client(request, await cls.afind(request, **kwargs), query_fields=query_fields)
+
+    @classmethod
+    async def aread_one(cls, request, query_fields, **kwargs):
+        rows = await cls.aread(request, query_fields, **kwargs)
+        return rows[0] if rows else None
+
     def update(self, request, **updated_fields):
         self.check_update_permissions(request, updated_fields)
-        return self.db_update(request, updated_fields)
+        val = self.db_update(request, updated_fields)
+        self.forget(request)
+        return val
 
     def save(self, request):
         val = self.update(request, **self.updated_data)
@@ -76,12 +277,122 @@ class BaseServerModel(object, metaclass=BaseServerModelMetaClass):
 
     def delete(self, request):
         self.check_delete_permissions(request)
-        return self.db_remove(request)
+        val = self.db_remove(request)
+        self.forget(request)
+        return val
+
+    async def aupdate(self, request, **updated_fields):
+        self.check_update_permissions(request, updated_fields)
+        val = await self.adb_update(request, updated_fields)
+        self.forget(request)
+        return val
+
+    async def asave(self, request):
+        val = await self.aupdate(request, **self.updated_data)
+        self.data.update(self.updated_data)
+        self.updated_data.clear()
+        return val
+
+    async def adelete(self, request):
+        self.check_delete_permissions(request)
+        val = await self.adb_remove(request)
+        self.forget(request)
+        return val
+
+    def forget(self, request):
+        self.forget_many(request, [self.get_id()])
+
+    @classmethod
+    def forget_many(cls, request, ids):
+        # called after a write, drops the objects from the request's loader and the object cache,
+        # and invalidates every cached response that includes this model
+        loader = get_loader(request)
+        if loader is not None:
+            loader.forget(cls, ids)
+        cls.invalidate_cached(ids)
+        RESPONSE_CACHE.invalidate(cls.ClientModel.__name__)
+
+    # bulk crud, the permission checks and database operations get every object at once
+    @classmethod
+    def bulk_create(cls, request, rows):
+        cls.check_create_permissions_many(request, rows)
+        objects = [cls(data) for data in cls.db_bulk_insert(request, rows) if data]
+        cls.forget_many(request, [obj.get_id() for obj in objects])
+        return objects
+
+    @classmethod
+    def bulk_update(cls, request, updates):
+        # updates is a list of (object, updated fields)
+        cls.check_update_permissions_many(request, updates)
+        vals = cls.db_bulk_update(request, updates)
+        cls.forget_many(request, [obj.get_id() for obj, _ in updates])
+        return vals
+
+    @classmethod
+    def bulk_save(cls, request, objects):
+        vals = cls.bulk_update(request, [(obj, obj.updated_data) for obj in objects])
+        for obj in objects:
+            obj.data.update(obj.updated_data)
+            obj.updated_data.clear()
+        return vals
+
+    @classmethod
+    def bulk_delete(cls, request, objects):
+        cls.check_delete_permissions_many(request, objects)
+        vals = cls.db_bulk_remove(request, objects)
+        cls.forget_many(request, [obj.get_id() for obj in objects])
+        return vals
+
+    @classmethod
+    async def abulk_create(cls, request, rows):
+        cls.check_create_permissions_many(request, rows)
+        objects = [cls(data) for data in await cls.adb_bulk_insert(request, rows) if data]
+        cls.forget_many(request, [obj.get_id() for obj in objects])
+        return objects
+
+    @classmethod
+    async def abulk_update(cls, request, updates):
+        cls.check_update_permissions_many(request, updates)
+        vals = await cls.adb_bulk_update(request, updates)
+        cls.forget_many(request, [obj.get_id() for obj, _ in updates])
+        return vals
+
+    @classmethod
+    async def abulk_delete(cls, request, objects):
+        cls.check_delete_permissions_many(request, objects)
+        vals = await cls.adb_bulk_remove(request, objects)
+        cls.forget_many(request, [obj.get_id() for obj in objects])
+        return vals
 
     # conversion to client model
     @classmethod
     def to_client(cls, request, objects, query_fields=None):
+        # nested fields are resolved level by level, see LevelResolver
+        return LevelResolver(request).resolve(cls, objects, query_fields)
+
+    @classmethod
+    async def ato_client(cls, request, objects, query_fields=None):
+        return await LevelResolver(request).aresolve(cls, objects, query_fields)
+
+    @classmethod
+    def populate_client_data(cls, request, objects, query_fields=None):
+        query_fields = query_fields or cls.ClientModel.get_default_fields()
+        if cls.use_row_builder:
+            cls.get_row_builder(query_fields).populate(request, objects)
+            return
+        resolve_server_fields(request, cls, cls.prepare_client_data(objects, query_fields), objects)
+
+    @classmethod
+    async def apopulate_client_data(cls, request, objects, query_fields=None):
         query_fields = query_fields or cls.ClientModel.get_default_fields()
+        if cls.use_row_builder:
+            await cls.get_row_builder(query_fields).apopulate(request, objects)
+            return
+        await aresolve_server_fields(request, cls, cls.prepare_client_data(objects, query_fields), objects)
+
+    @classmethod
+    def prepare_client_data(cls, objects, query_fields):
+        # fills in the plain fields of every object, returns the (server_field, query_field) pairs left to resolve
         for obj in objects:
             if not isinstance(obj, cls):
                 raise Exception('cannot convert "%r" to client model: not an instance of %s' % (obj, cls.__name__))
@@ -90,13 +401,16 @@ class BaseServerModel(object, metaclass=BaseServerModelMetaClass):
             obj.client_data = collections.OrderedDict()
 
         # takes the values in this instance of the model, and returns them as in an instance of ClientModel
+        server_fields = []
         for query_field in query_fields:
             client_field = cls.ClientModel.base_fields.get(query_field.key)
             if client_field is None:
                 raise Exception('invalid query field %r' % (query_field, ))
             server_field = cls.base_fields.get(query_field.key)
             if server_field is not None:
-                server_field.to_client(request, cls, query_field, objects)
+                server_fields.append((server_field, query_field))
+                for obj in objects:
+                    obj.client_data[query_field.key] = None  # filled in by resolve_server_fields, keeps the key order
             else:
                 for obj in objects:
                     if query_field.key not in obj.data:
@@ -106,17 +420,127 @@ class BaseServerModel(object, metaclass=BaseServerModelMetaClass):
                             raise KeyError("'%s' not in %r" % (query_field.key, obj.data))
                     else:
                         obj.client_data[query_field.key] = obj.data[query_field.key]
+        return server_fields
+
+    @classmethod
+    def get_columns(cls, query_fields=None):
+        # the columns db_find has to load to convert objects with these query fields: the id, always_columns,
+        # the plain fields asked for and the columns the server fields need, memoized on field plans
+        query_fields = query_fields or cls.ClientModel.get_default_fields()
+        if isinstance(query_fields, FieldPlan):
+            return query_fields.get_compiled(('columns', cls), cls._get_columns)
+        return cls._get_columns(query_fields)
+
+    @classmethod
+    def _get_columns(cls, query_fields):
+        columns = [cls.ClientModel.id_field]
+        columns.extend(cls.always_columns)
+        for query_field in query_fields:
+            server_field = cls.base_fields.get(query_field.key)
+            if server_field is None:
+                columns.append(query_field.key)
+            else:
+                columns.extend(server_field.get_columns(cls, query_field))
+        return list(collections.OrderedDict.fromkeys(columns))
 
-        return [cls.ClientModel(**obj.check_read_permissions(request)) for obj in objects]
+    @classmethod
+    def get_column_cost(cls, columns=None):
+        # relative cost of loading a row with these columns, None for all of them
+        costs = cls.column_costs
+        if columns is None:
+            columns = set(cls.ClientModel.base_fields) | set(costs)
+        return sum(costs.get(column, 1) for column in columns)
+
+    @classmethod
+    def build_client_models(cls, request, objects):
+        from_client_data = cls.ClientModel.from_client_data
+        if cls.unrestricted_read:
+            return [obj.client_data.build() if isinstance(obj.client_data, ClientRow) else from_client_data(obj.client_data)
+                    for obj in objects]
+        return [from_client_data(obj.check_read_permissions(request)) for obj in objects]
+
+    @classmethod
+    def get_row_builder(cls, query_fields):
+        if not isinstance(query_fields, FieldPlan):
+            return RowBuilder(cls, query_fields)
+        return query_fields.get_compiled(('row_builder', cls), lambda plan: RowBuilder(cls, plan))
 
     def self_to_client(self, request, query_fields=None):
         return self.to_client(request, [self], query_fields=query_fields)[0]
 
+    async def aself_to_client(self, request, query_fields=None):
+        return (await self.ato_client(request, [self], query_fields=query_fields))[0]
+
     # database operations
     @classmethod
     def db_find(cls, ids=None, condition=None, fields=None, **kwargs):
+        # with keyset pagination kwargs has cursor, the sort keys of the last row already returned (None for
+        # the first page), and limit; return the rows that sort after it
         raise NotImplementedError()
 
+    @classmethod
+    def db_find_ids(cls, ids, fields=None):
+        # db_find(ids=ids) with the object cache in front, only the ids missing from the cache reach the database
+        if cls.object_cache is None:
+            return cls.db_find(**cls._find_ids_kwargs(ids, fields))
+        cached, missing, found = cls._get_cached(ids, fields)
+        if missing:
+            cls._set_cached(cached, found, fields, cls.db_find(**cls._find_ids_kwargs(missing, fields)))
+        return [cls(cached[i]) for i in ids if i in cached]
+
+    @classmethod
+    def _find_ids_kwargs(cls, ids, fields):
+        kwargs = {'ids': list(ids)}
+        if fields is not None:
+            kwargs['fields'] = fields
+        return kwargs
+
+    @classmethod
+    def _get_cached(cls, ids, fields):
+        # cache entries are (columns or None for all, row data), entries without the columns asked for are misses
+        ids = list(ids)
+        found = {key[1]: entry for key, entry in cls.object_cache.get_many([(cls.__name__, i) for i in ids]).items()}
+        cached = {}
+        for i, (columns, data) in found.items():
+            if columns is None or (fields is not None and set(fields) <= set(columns)):
+                cached[i] = data
+        return cached, [i for i in ids if i not in cached], found
+
+    @classmethod
+    def _set_cached(cls, cached, found, fields, objects):
+        items = {}
+        for obj in objects:
+            i = obj.get_id()
+            data = dict(obj.data)
+            columns = None if fields is None else list(fields)
+            if fields is not None and i in found and found[i][0] is not None:
+                # keep the columns cached before, the entry now has both
+                previous_columns, previous_data = found[i]
+                data = dict(previous_data)
+                data.update(obj.data)
+                columns = sorted(set(previous_columns) | set(fields))
+            cached[i] = data
+            items[(cls.__name__, i)] = (columns, data)
+        cls.object_cache.set_many(items)
+
+    @classmethod
+    def invalidate_cached(cls, ids):
+        if cls.object_cache is not None:
+            cls.object_cache.delete_many([(cls.__name__, i) for i in ids])
+
+    @classmethod
+    def db_bulk_insert(cls, request, rows):
+        # returns the data of every inserted row, override to insert them in one round trip
+        return [cls.db_insert(request, row) for row in rows]
+
+    @classmethod
+    def db_bulk_update(cls, request, updates):
+        return [obj.db_update(request, updated_fields) for obj, updated_fields in updates]
+
+    @classmethod
+    def db_bulk_remove(cls, request, objects):
+        return [obj.db_remove(request) for obj in objects]
+
     @classmethod
     def db_find_one(cls, **kwargs):
         rows = cls.db_find(**kwargs)
@@ -132,6 +556,54 @@ class BaseServerModel(object, metaclass=BaseServerModelMetaClass):
     def db_remove(self, request):
         raise NotImplementedError()
 
+    # async database operations, by default the blocking ones run on the event loop's executor
+    @classmethod
+    async def adb_find(cls, **kwargs):
+        return await utils.run_sync(cls.db_find, **kwargs)
+
+    @classmethod
+    async def adb_find_ids(cls, ids, fields=None):
+        if cls.object_cache is None:
+            return await cls.adb_find(**cls._find_ids_kwargs(ids, fields))
+        cached, missing, found = cls._get_cached(ids, fields)
+        if missing:
+            cls._set_cached(cached, found, fields, await cls.adb_find(**cls._find_ids_kwargs(missing, fields)))
+        return [cls(cached[i]) for i in ids if i in cached]
+
+    @classmethod
+    async def adb_insert(cls, request, row):
+        return await utils.run_sync(cls.db_insert, request, row)
+
+    async def adb_update(self, request, updated_fields):
+        return await utils.run_sync(self.db_update, request, updated_fields)
+
+    async def adb_remove(self, request):
+        return await utils.run_sync(self.db_remove, request)
+
+    @classmethod
+    async def adb_bulk_insert(cls, request, rows):
+        return await utils.run_sync(cls.db_bulk_insert, request, rows)
+
+    @classmethod
+    async def adb_bulk_update(cls, request, updates):
+        return await utils.run_sync(cls.db_bulk_update, request, updates)
+
+    @classmethod
+    async def adb_bulk_remove(cls, request, objects):
+        return await utils.run_sync(cls.db_bulk_remove, request, objects)
+
+    # http caching
+    @classmethod
+    def get_version(cls, request, data):
+        # a value that changes whenever a GET of this model with the cleaned data would return something else,
+        # lets the server method compute its ETag without running the request, None if unknown
+        return None
+
+    @classmethod
+    def get_last_modified(cls, request, data):
+        # datetime of the last change to what a GET of this model with the cleaned data returns, None if unknown
+        return None
+
     # permissions
     @classmethod
     def check_create_permissions(cls, request, row):
@@ -151,13 +623,35 @@ class BaseServerModel(object, metaclass=BaseServerModelMetaClass):
         # raise PermissionDeniedError if this request is not allowed to delete this object
         raise NotImplementedError()
 
+    # batched permissions, override to check all objects of a bulk operation at once
+    @classmethod
+    def check_create_permissions_many(cls, request, rows):
+        for row in rows:
+            cls.check_create_permissions(request, row)
+
+    @classmethod
+    def check_update_permissions_many(cls, request, updates):
+        for obj, updated_fields in updates:
+            obj.check_update_permissions(request, updated_fields)
+
+    @classmethod
+    def check_delete_permissions_many(cls, request, objects):
+        for obj in objects:
+            obj.check_delete_permissions(request)
+
 
 class BaseServerRelation(BaseServerModel):  # pylint: disable=W0223
 
     @classmethod
-    def get_related_objects(cls, request, ids, query_fields, filtered_relation_field=None, condition=None, limit=None, offset=None):
+    def get_related_objects(cls, request, ids, query_fields, filtered_relation_field=None, condition=None, limit=None, offset=None,
+                            cursor=None):
+        # cursor works like in db_find, offset is None when it's given
         raise NotImplementedError()
 
+    @classmethod
+    async def aget_related_objects(cls, request, ids, query_fields, **kwargs):
+        return await utils.run_sync(cls.get_related_objects, request, ids, query_fields, **kwargs)
+
 # # exceptions
 # class ValidationError(Exception):
 #     pass
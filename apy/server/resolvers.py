@@ -0,0 +1,157 @@
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import threading
+
+FIELD_EXECUTOR_WORKERS = 16  # threads shared by all requests resolving server fields concurrently
+_field_executor = None
+_field_executor_lock = threading.Lock()
+_worker_state = threading.local()
+# a context variable rather than a request attribute, so worker threads and async tasks
+# see the resolver of the pass that started them and not one started by a sibling
+_current_resolver = contextvars.ContextVar('apy_resolver', default=None)
+
+
+class LevelResolver(object):
+    """
+    Converts a tree of server objects to client models breadth first. All objects of a model at one
+    depth of the tree get their client data populated in a single pass, no matter how many parent
+    objects or fields they came from, then client models are built from the deepest level up.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.pending = []
+        self.levels = []
+
+    def defer(self, model, objects, query_fields, assign):
+        # convert objects with the next level, assign gets their client models in the same order
+        self.pending.append((model, objects, query_fields, assign))
+
+    def resolve(self, model, objects, query_fields=None):
+        result = self._start(model, objects, query_fields)
+        token = _current_resolver.set(self)
+        try:
+            while self.pending:
+                for group_model, group_objects, group_query_fields in self._next_level():
+                    group_model.populate_client_data(self.request, group_objects, group_query_fields)
+        finally:
+            _current_resolver.reset(token)
+        self._build()
+        return result
+
+    async def aresolve(self, model, objects, query_fields=None):
+        result = self._start(model, objects, query_fields)
+        token = _current_resolver.set(self)
+        try:
+            while self.pending:
+                for group_model, group_objects, group_query_fields in self._next_level():
+                    await group_model.apopulate_client_data(self.request, group_objects, group_query_fields)
+        finally:
+            _current_resolver.reset(token)
+        self._build()
+        return result
+
+    def _start(self, model, objects, query_fields):
+        result = []
+        self.pending = [(model, list(objects), query_fields, result.extend)]
+        self.levels = []
+        return result
+
+    def _next_level(self):
+        # jobs for the same model and the same (cached) field plan share one pass
+        jobs, self.pending = self.pending, []
+        self.levels.append(jobs)
+        groups = collections.OrderedDict()
+        for job in jobs:
+            groups.setdefault((job[0], id(job[2])), []).append(job)
+        for group in groups.values():
+            group_objects = group[0][1] if len(group) == 1 else [obj for job in group for obj in job[1]]
+            yield group[0][0], group_objects, group[0][2]
+
+    def _build(self):
+        for jobs in reversed(self.levels):
+            for job_model, job_objects, _, assign in jobs:
+                assign(job_model.build_client_models(self.request, job_objects))
+
+
+def get_resolver():
+    return _current_resolver.get()
+
+
+def get_field_executor():
+    global _field_executor  # pylint: disable=W0603
+    with _field_executor_lock:
+        if _field_executor is None:
+            _field_executor = concurrent.futures.ThreadPoolExecutor(max_workers=FIELD_EXECUTOR_WORKERS)
+    return _field_executor
+
+
+def submit_to_field_executor(func, *args):
+    # runs func on the shared executor in a copy of the current context, marked as a worker so
+    # whatever it resolves runs in order on the same thread instead of waiting on the executor
+    def run():
+        _worker_state.active = True
+        try:
+            return func(*args)
+        finally:
+            _worker_state.active = False
+
+    return get_field_executor().submit(contextvars.copy_context().run, run)
+
+
+def get_field_concurrency(request, model):
+    return getattr(request, 'apy_field_concurrency', None) or model.field_concurrency
+
+
+def resolve_server_fields(request, model, server_fields, objects):
+    # runs to_client of every (server_field, query_field); sibling fields are independent, so with a
+    # concurrency limit set on the request (apy_field_concurrency) or the model (field_concurrency)
+    # up to that many of them run at once on the shared executor
+    for server_field, query_field in server_fields:
+        server_field.prefetch(request, model, query_field, objects)
+    limit = get_field_concurrency(request, model)
+    # fields already running on the executor resolve their own nested fields in order, so they never wait on it
+    if not limit or limit < 2 or len(server_fields) < 2 or getattr(_worker_state, 'active', False):
+        for server_field, query_field in server_fields:
+            server_field.to_client(request, model, query_field, objects)
+        return
+
+    def run(server_field, query_field):
+        server_field.to_client(request, model, query_field, objects)
+
+    waiting = collections.deque(server_fields)
+    futures = []
+    running = set()
+    while waiting or running:
+        while waiting and len(running) < limit:
+            future = submit_to_field_executor(run, *waiting.popleft())
+            futures.append(future)
+            running.add(future)
+        _, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+    for future in futures:
+        future.result()  # raises the error of the first failed field in query order
+
+
+async def aresolve_server_fields(request, model, server_fields, objects):
+    # async version of resolve_server_fields, with a concurrency limit sibling fields are awaited together
+    for server_field, query_field in server_fields:
+        server_field.prefetch(request, model, query_field, objects)
+    limit = get_field_concurrency(request, model)
+    if not limit or limit < 2 or len(server_fields) < 2:
+        for server_field, query_field in server_fields:
+            await server_field.ato_client(request, model, query_field, objects)
+        return
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(server_field, query_field):
+        async with semaphore:
+            await server_field.ato_client(request, model, query_field, objects)
+
+    results = await asyncio.gather(*(run(server_field, query_field) for server_field, query_field in server_fields),
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result  # the error of the first failed field in query order
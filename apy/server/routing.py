@@ -0,0 +1,95 @@
+import re
+
+# segments of url patterns the trie can match without a regex
+LITERAL_SEGMENT_RE = re.compile(r'^[\w\-~]+$')
+PARAM_RE = re.compile(r'\(\?P<(\w+)>\[\^/\]\+\)')
+PARAM_SEGMENT_RE = re.compile(r'^\x00(\w+)\x00$')  # a param once marked by split_pattern
+
+
+class RouteNode(object):
+    def __init__(self):
+        self.literals = {}  # segment -> RouteNode
+        self.params = []  # (kwarg name, RouteNode), for segments that match anything but "/"
+        self.route = None  # (registration index, view) of the pattern ending here
+
+
+class SegmentRouter(object):
+    """
+    Resolves paths to views by walking a trie of their "/" separated segments, so the time to find a
+    view doesn't grow with the number of routes. Patterns whose segments are all literals or
+    "(?P<name>[^/]+)" go into the trie, any other pattern is matched as a regex. The result is the same
+    as trying every pattern in the order they were added, like django does.
+    """
+
+    def __init__(self):
+        self.root = RouteNode()
+        self.regex_routes = []  # (registration index, compiled pattern, view) in order
+        self.count = 0
+
+    def add(self, pattern, view):
+        # pattern is a url_pattern of a client method, relative to the root of the api and without ^ or $
+        index = self.count
+        self.count += 1
+        segments = self.split_pattern(pattern)
+        if segments is None:
+            self.regex_routes.append((index, re.compile('^%s$' % pattern), view))
+            return
+        node = self.root
+        for kind, value in segments:
+            if kind == 'literal':
+                node = node.literals.setdefault(value, RouteNode())
+                continue
+            for name, child in node.params:
+                if name == value:
+                    node = child
+                    break
+            else:
+                child = RouteNode()
+                node.params.append((value, child))
+                node = child
+        if node.route is None:  # with the same pattern twice the first one wins
+            node.route = (index, view)
+
+    @staticmethod
+    def split_pattern(pattern):
+        # [('literal', segment) or ('param', name), ...], None when the pattern needs a regex
+        segments = []
+        # params are marked first, their [^/] would be split otherwise
+        for segment in PARAM_RE.sub(lambda m: '\x00%s\x00' % m.group(1), pattern).split('/'):
+            if LITERAL_SEGMENT_RE.match(segment):
+                segments.append(('literal', segment))
+                continue
+            match = PARAM_SEGMENT_RE.match(segment)
+            if match is None:
+                return None
+            segments.append(('param', match.group(1)))
+        return segments
+
+    def resolve(self, path):
+        # returns (view, kwargs) of the first route matching path, None if no route does
+        best = self._resolve_node(self.root, path.split('/'), 0, {})
+        for index, regex, view in self.regex_routes:
+            if best is not None and index > best[0]:
+                break
+            match = regex.match(path)
+            if match is not None:
+                return view, match.groupdict()
+        return best[1:] if best is not None else None
+
+    def _resolve_node(self, node, segments, depth, kwargs):
+        # (index, view, kwargs) of the earliest added route under node matching the rest of segments
+        if depth == len(segments):
+            return node.route + (dict(kwargs),) if node.route is not None else None
+        segment = segments[depth]
+        best = None
+        child = node.literals.get(segment)
+        if child is not None:
+            best = self._resolve_node(child, segments, depth + 1, kwargs)
+        if segment:
+            for name, child in node.params:
+                kwargs[name] = segment
+                found = self._resolve_node(child, segments, depth + 1, kwargs)
+                del kwargs[name]
+                if found is not None and (best is None or found[0] < best[0]):
+                    best = found
+        return best
@@ -0,0 +1,227 @@
+import codecs
+import collections
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+SERIALIZERS = collections.OrderedDict()  # response format -> serializer
+MIMETYPES = {}  # mimetype -> serializer, for content negotiation
+DEFAULT_RESPONSE_FORMAT = 'json'
+
+
+class SerializerMetaClass(type):
+    def __new__(cls, name, bases, attrs):
+        new_class = super(SerializerMetaClass, cls).__new__(cls, name, bases, attrs)
+        # for each format keep the available serializer with the highest priority
+        if new_class.format is not None and new_class.is_available():
+            current = SERIALIZERS.get(new_class.format)
+            if current is None or new_class.priority > current.priority:
+                SERIALIZERS[new_class.format] = new_class
+                for mimetype in (new_class.mimetype, ) + tuple(new_class.mimetypes):
+                    MIMETYPES[mimetype] = new_class
+        return new_class
+
+
+class BaseSerializer(object, metaclass=SerializerMetaClass):
+    format = None
+    mimetype = None
+    mimetypes = ()  # other mimetypes that select this serializer in an Accept header
+    priority = 0
+    is_json = False  # output is json text, so it can be wrapped in a jsonp callback and streamed
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    @classmethod
+    def dumps(cls, data):
+        # returns str or bytes
+        raise NotImplementedError()
+
+    @classmethod
+    def loads(cls, content):
+        raise NotImplementedError()
+
+
+class JsonSerializer(BaseSerializer):
+    format = 'json'
+    mimetype = 'application/json'
+    is_json = True
+
+    @classmethod
+    def dumps(cls, data):
+        return json.dumps(data)
+
+    @classmethod
+    def loads(cls, content):
+        return json.loads(content)
+
+
+class UJsonSerializer(JsonSerializer):
+    priority = 1
+
+    @classmethod
+    def is_available(cls):
+        return ujson is not None
+
+    @classmethod
+    def dumps(cls, data):
+        return ujson.dumps(data, ensure_ascii=False)
+
+    @classmethod
+    def loads(cls, content):
+        return ujson.loads(content)
+
+
+class OrJsonSerializer(JsonSerializer):
+    """
+    Keys that aren't strings are converted like json.dumps does. Unlike json.dumps, NaN and infinities
+    are written as null (json.dumps writes NaN, which isn't json) and datetimes as iso strings (json.dumps
+    raises); what orjson can't encode, e.g. integers over 64 bits, goes through json.dumps.
+    """
+    priority = 2
+
+    @classmethod
+    def is_available(cls):
+        return orjson is not None
+
+    @classmethod
+    def dumps(cls, data):
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:  # orjson.JSONEncodeError
+            return json.dumps(data)
+
+    @classmethod
+    def loads(cls, content):
+        return orjson.loads(content)
+
+
+class MsgpackSerializer(BaseSerializer):
+    format = 'msgpack'
+    mimetype = 'application/x-msgpack'
+    mimetypes = ('application/msgpack', )
+
+    @classmethod
+    def is_available(cls):
+        return msgpack is not None
+
+    @classmethod
+    def dumps(cls, data):
+        return msgpack.packb(data, use_bin_type=True)
+
+    @classmethod
+    def loads(cls, content):
+        return msgpack.unpackb(content, raw=False, strict_map_key=False)  # maps keyed by ints, like dumps writes
+
+
+# helpers
+def parse_accept_header(accept):
+    # mimetypes in the Accept header, most preferred first
+    mimetypes = []
+    for ix, part in enumerate(accept.split(',')):
+        params = part.strip().split(';')
+        quality = 1.0
+        for param in params[1:]:
+            k, _, v = param.strip().partition('=')
+            if k == 'q':
+                try:
+                    quality = float(v)
+                except ValueError:
+                    quality = 0.0
+        if params[0] and quality > 0:
+            mimetypes.append((-quality, ix, params[0].strip().lower()))
+    return [mimetype for _, _, mimetype in sorted(mimetypes)]
+
+
+def get_serializer(response_format=None, accept=None):
+    # an explicit format parameter wins over the Accept header, anything unknown gets the default format
+    if response_format in SERIALIZERS:
+        return SERIALIZERS[response_format]
+    if not response_format and accept:
+        for mimetype in parse_accept_header(accept):
+            if mimetype in MIMETYPES:
+                return MIMETYPES[mimetype]
+    return SERIALIZERS[DEFAULT_RESPONSE_FORMAT]
+
+
+JSON_WHITESPACE = ' \t\n\r'
+NUMBER_TAIL_RE = re.compile(r'[\d.eE+\-]*\Z')  # what may still follow a number cut by the end of a chunk
+
+
+def iter_json_array(chunks):
+    """
+    Yields the items of a json array as its utf-8 encoded text arrives in chunks (bytes), so the
+    whole text is never held at once. Raises ValueError if it isn't a single json array.
+    """
+    keys = {}  # json.loads shares equal keys within a document, items decoded one by one share them here
+
+    def shared_keys(pairs):
+        return {keys.setdefault(k, k): v for k, v in pairs}
+
+    decoder = json.JSONDecoder(object_pairs_hook=shared_keys)
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    state = {'buf': '', 'eof': False}
+
+    def refill(pos):
+        # drops the buffer up to pos and appends the next chunk, returns False at the end of the text
+        if state['eof']:
+            return False
+        chunk = next(chunks, None)
+        state['eof'] = chunk is None
+        state['buf'] = state['buf'][pos:] + text_decoder.decode(chunk or b'', final=state['eof'])
+        return True
+
+    pos = 0
+    expected = '['  # delimiters allowed next, None where an item is expected
+    while True:
+        buf = state['buf']
+        while pos < len(buf) and buf[pos] in JSON_WHITESPACE:
+            pos += 1
+        if pos == len(buf):
+            if not refill(pos):
+                raise ValueError('unexpected end of json array')
+            pos = 0
+            continue
+        if expected is not None:
+            if buf[pos] == ']' and expected != '[':
+                pos += 1
+                break
+            if buf[pos] in expected:
+                pos += 1
+                expected = ']' if expected == '[' else None  # after "[" an item or the end of the array
+                continue
+            if expected != ']':
+                raise ValueError('expected "%s" in json array' % '" or "'.join(expected))
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            end = None
+        # an item running into the end of the buffer may go on in the next chunk, e.g. 1 of 1e3
+        if end is None or NUMBER_TAIL_RE.match(buf, end):
+            if refill(pos):
+                pos = 0
+                continue
+            if end is None:
+                raise ValueError('invalid json array item')
+        yield item
+        pos = end
+        expected = ',]'
+    if state['buf'][pos:].strip(JSON_WHITESPACE) or any(chunk.strip() for chunk in chunks):
+        raise ValueError('extra data after json array')
@@ -1,15 +1,122 @@
+import asyncio
+import collections
+import contextvars
 import datetime
+import functools
 
 import pytz
+from django.core import signing
 
 
 def snake_case_to_camel_case(name):
     return ''.join(x.capitalize() for x in name.split('_'))
 
 
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=pytz.utc)
+
+
 def ms_to_datetime(value):
-    return pytz.utc.localize(datetime.datetime.utcfromtimestamp(value / 1000))
+    return EPOCH + datetime.timedelta(milliseconds=value)
 
 
 def datetime_to_ms(value):
-    return round(float(value.astimezone(pytz.utc).strftime('%s.%f')) * 1000)
+    if value.tzinfo is None:
+        value = value.astimezone(pytz.utc)  # naive datetimes are taken to be in local time
+    delta = value - EPOCH
+    return _us_to_ms((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def _us_to_ms(us):
+    # integer round half to even, without going through a float
+    ms, rest = divmod(us, 1000)
+    if rest > 500 or (rest == 500 and ms % 2):
+        ms += 1
+    return ms
+
+
+# batch versions for converting whole columns, None values are passed through
+def ms_to_datetimes(values):
+    epoch, timedelta = EPOCH, datetime.timedelta
+    return [None if value is None else epoch + timedelta(milliseconds=value) for value in values]
+
+
+def datetimes_to_ms(values):
+    epoch, utc, us_to_ms = EPOCH, pytz.utc, _us_to_ms
+    result = []
+    for value in values:
+        if value is None:
+            result.append(None)
+            continue
+        if value.tzinfo is None:
+            value = value.astimezone(utc)
+        delta = value - epoch
+        result.append(us_to_ms((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds))
+    return result
+
+
+# keyset pagination cursors
+CURSOR_SALT = 'apy.cursor'
+
+
+def make_cursor(values):
+    # opaque signed cursor, values are the sort keys of the last row of a page keyed by field name
+    values = {k: {'$dt': v.isoformat()} if isinstance(v, datetime.datetime) else v for k, v in values.items()}
+    return signing.dumps(values, salt=CURSOR_SALT, compress=True)
+
+
+def parse_cursor(cursor):
+    # raises signing.BadSignature for cursors that weren't made by make_cursor
+    values = signing.loads(cursor, salt=CURSOR_SALT)
+    if not isinstance(values, dict):
+        raise signing.BadSignature('invalid cursor')
+    return {k: datetime.datetime.fromisoformat(v['$dt']) if isinstance(v, dict) and '$dt' in v else v
+            for k, v in values.items()}
+
+
+async def run_sync(func, *args, **kwargs):
+    # runs a blocking call on the event loop's default executor, in a copy of the current context
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+class LRUCache(object):
+    """
+    Bounded mapping that evicts the least recently used key, with hit/miss counters
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        try:
+            self._data.move_to_end(key)
+        except KeyError:  # evicted by another thread in the meantime
+            pass
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
@@ -14,4 +14,9 @@ setup(
         'django >= 1.5.1',
         'pytz',
         ],
+    extras_require={
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+        'msgpack': ['msgpack'],
+        },
     )
@@ -0,0 +1,53 @@
+# client side of the api the tests run against, see server_api
+from apy.client import fields, methods
+from apy.client.models import BaseClientModel
+
+
+class Author(BaseClientModel):
+    id = fields.IntegerField(is_default=True)
+    name = fields.StringField(is_default=True, required=True, modifiable=True)
+    born = fields.DateTimeField(creatable=True, modifiable=True)
+    bio = fields.StringField(creatable=True, modifiable=True)
+
+
+class Book(BaseClientModel):
+    id = fields.IntegerField(is_default=True)
+    title = fields.StringField(is_default=True, required=True, modifiable=True)
+    author_id = fields.IntegerField(creatable=True, is_query_filter=True)
+    author = fields.NestedField('Author')
+    pages = fields.IntegerField(creatable=True, modifiable=True, default_to_none=True)
+
+
+class Authors(methods.ClientObjectsMethod):
+    model = Author
+
+
+class AuthorObject(methods.ClientObjectMethod):
+    model = Author
+
+
+class Books(methods.ClientObjectsMethod):
+    model = Book
+
+
+class BookObject(methods.ClientObjectMethod):
+    model = Book
+
+
+class Shelf(BaseClientModel):
+    id = fields.IntegerField(is_default=True)
+    name = fields.StringField(is_default=True)
+    owner = fields.NestedField('Author')
+    curator = fields.NestedField('Author')
+    items = fields.NestedField('ShelfItem')
+    rating = fields.StringField()
+    score = fields.StringField()
+    badge = fields.StringField()
+
+
+class ShelfItem(BaseClientModel):
+    id = fields.IntegerField(is_default=True)
+    shelf_id = fields.IntegerField(is_default=True)
+    note = fields.StringField(is_default=True)
+    book = fields.NestedField('Book')
+    stamp = fields.StringField()
@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+import unittest
+
+import django
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(SECRET_KEY='apy-tests', ALLOWED_HOSTS=['*'], USE_I18N=False)
+    if hasattr(django, 'setup'):  # django >= 1.7
+        django.setup()
+
+# benchmarks time code on the machine running them, they only run when asked for so a loaded
+# machine can't fail the suite
+BENCHMARK_ENV = 'APY_BENCHMARK'
+benchmark = unittest.skipUnless(os.environ.get(BENCHMARK_ENV), 'set %s=1 to run benchmarks' % BENCHMARK_ENV)
+
+
+def best_time(func, repeat=5, number=1):
+    # seconds of the fastest of repeat runs of number calls
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(title, timings):
+    # timings is a list of (label, seconds)
+    lines = ['', title]
+    for label, seconds in timings:
+        lines.append('  %-40s %10.3f ms' % (label, seconds * 1000))
+    sys.stderr.write('\n'.join(lines) + '\n')
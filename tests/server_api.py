@@ -0,0 +1,227 @@
+# server side of the api the tests run against, rows are kept in memory
+import copy
+import threading
+import time
+
+from django import http
+
+import helpers  # noqa, configures django
+import client_api  # noqa, the client models and methods the server ones are matched with by name
+from apy.server import fields
+from apy.server.methods import BULK_DATA_KEY, ServerObjectMethod, ServerObjectsMethod
+from apy.server.models import BaseServerModel
+
+AUTHORS = {
+    1: {'id': 1, 'name': 'Ursula', 'bio': 'Wrote about Earthsea'},
+    2: {'id': 2, 'name': 'Stanislaw', 'bio': 'Wrote about Solaris'},
+}
+BOOKS = {
+    1: {'id': 1, 'title': 'A Wizard of Earthsea', 'author_id': 1, 'pages': 183},
+    2: {'id': 2, 'title': 'The Dispossessed', 'author_id': 1, 'pages': 387},
+    3: {'id': 3, 'title': 'Solaris', 'author_id': 2, 'pages': 204},
+    4: {'id': 4, 'title': 'The Cyberiad', 'author_id': 2, 'pages': 295},
+}
+SHELVES = {
+    1: {'id': 1, 'name': 'Favourites', 'owner_id': 1, 'curator_id': 2},
+    2: {'id': 2, 'name': 'To read', 'owner_id': 2, 'curator_id': None},
+    3: {'id': 3, 'name': 'Lent out', 'owner_id': 1, 'curator_id': 1},
+}
+SHELF_ITEMS = {
+    1: {'id': 1, 'shelf_id': 1, 'book_id': 1, 'note': 'again', 'hidden': False},
+    2: {'id': 2, 'shelf_id': 1, 'book_id': 3, 'note': 'signed', 'hidden': False},
+    3: {'id': 3, 'shelf_id': 2, 'book_id': 4, 'note': 'gift', 'hidden': True},
+    4: {'id': 4, 'shelf_id': 3, 'book_id': 2, 'note': 'to Anna', 'hidden': False},
+}
+
+
+class MemoryStore(object):
+    """
+    db_* operations over the dict of rows in ROWS, every db_find is recorded in queries and takes delay
+    seconds, check_read_permissions records the keys of the client data it gets in client_keys
+    """
+    ROWS = {}
+    delay = 0
+    rows = None
+    queries = None
+    client_keys = None
+
+    @classmethod
+    def reset(cls):
+        cls.rows = copy.deepcopy(cls.ROWS)
+        cls.queries = []
+        cls.client_keys = []
+
+    @classmethod
+    def db_find(cls, ids=None, condition=None, fields=None, cursor=None, limit=None, **kwargs):
+        cls.queries.append(dict(kwargs, ids=ids, condition=condition, fields=fields, cursor=cursor, limit=limit))
+        if cls.delay:
+            time.sleep(cls.delay)
+        if ids is None:
+            rows = [cls.rows[i] for i in sorted(cls.rows)]
+        else:
+            rows = [cls.rows[i] for i in ids if i in cls.rows]
+        for key, value in (condition or {}).items():
+            rows = [row for row in rows if row.get(key) in value['$in']]
+        if cursor is not None:
+            rows = [row for row in rows if row['id'] > cursor['id']]
+        if limit is not None:
+            rows = rows[:limit]
+        if fields is not None:
+            rows = [{k: row[k] for k in fields if k in row} for row in rows]
+        return [cls(dict(row)) for row in rows]
+
+    @classmethod
+    def db_insert(cls, request, row):
+        row = dict(row, id=max(cls.rows or [0]) + 1)
+        cls.rows[row['id']] = row
+        return dict(row)
+
+    def db_update(self, request, updated_fields):
+        self.rows[self.get_id()].update(updated_fields)
+        return True
+
+    def db_remove(self, request):
+        return self.rows.pop(self.get_id(), None) is not None
+
+    # everyone can do everything
+    @classmethod
+    def check_create_permissions(cls, request, row):
+        pass
+
+    def check_read_permissions(self, request):
+        self.client_keys.append(list(self.client_data))
+        return self.client_data
+
+    def check_update_permissions(self, request, updated_fields):
+        pass
+
+    def check_delete_permissions(self, request):
+        pass
+
+
+class LabelField(fields.BaseField):
+    """
+    Server field whose value takes delay seconds to compute, counts how many are computed at once
+    """
+    delay = 0
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls):
+        cls.running = cls.peak = 0
+
+    def to_client(self, request, owner, query_field, objects):
+        with self.lock:
+            LabelField.running += 1
+            LabelField.peak = max(LabelField.peak, LabelField.running)
+        try:
+            time.sleep(self.delay)
+            for obj in objects:
+                obj.client_data[query_field.key] = '%s %s' % (query_field.key, obj.get_id())
+        finally:
+            with self.lock:
+                LabelField.running -= 1
+
+
+class Author(MemoryStore, BaseServerModel):
+    ROWS = AUTHORS
+
+
+class Book(MemoryStore, BaseServerModel):
+    ROWS = BOOKS
+    author = fields.NestedIdField('Author', 'author_id')
+
+
+class Shelf(MemoryStore, BaseServerModel):
+    ROWS = SHELVES
+    owner = fields.NestedIdField('Author', 'owner_id')
+    curator = fields.NestedIdField('Author', 'curator_id')
+    items = fields.RelationIdField('ShelfItem', 'shelf_id')
+    rating = LabelField()
+    score = LabelField()
+    badge = LabelField()
+
+
+class ShelfItem(MemoryStore, BaseServerModel):
+    ROWS = SHELF_ITEMS
+    book = fields.NestedIdField('Book', 'book_id')
+    stamp = LabelField()
+
+    @classmethod
+    def read(cls, request, query_fields, **kwargs):
+        # hidden items are left out, nested items are read through here and resolve their own fields
+        items = super(ShelfItem, cls).read(request, query_fields, **kwargs)
+        return [item for item in items if not cls.rows[item.get_id()]['hidden']]
+
+
+def reset():
+    for model in (Author, Book, Shelf, ShelfItem):
+        model.reset()
+    LabelField.reset()
+
+
+def given(data):
+    # cleaned data without the fields the request didn't give
+    return {k: v for k, v in data.items() if v is not None and k != 'fields'}
+
+
+class Authors(ServerObjectsMethod):
+    def process_get(self):
+        kwargs = {}
+        if self.data.get('author_ids') is not None:
+            kwargs['ids'] = self.data['author_ids']
+        return self.ok_response(self.model.read(self.request, self.data.get('fields'), **kwargs))
+
+
+class AuthorObject(ServerObjectMethod):
+    def process_get(self):
+        author = self.model.read_one(self.request, self.data.get('fields'), ids=[self.data['author_id']])
+        if author is None:
+            raise http.Http404()
+        return self.ok_response(author)
+
+
+class Books(ServerObjectsMethod):
+    def process_get(self):
+        kwargs = {}
+        if self.data.get('book_ids') is not None:
+            kwargs['ids'] = self.data['book_ids']
+        if self.data.get('author_id') is not None:
+            kwargs['condition'] = {'author_id': {'$in': [self.data['author_id']]}}
+        return self.ok_response(self.model.read(self.request, self.data.get('fields'), **kwargs))
+
+    def process_post(self):
+        if self.bulk:
+            objects = self.model.bulk_create(self.request, [given(d) for d in self.data[BULK_DATA_KEY]])
+            return self.ok_response(self.model.to_client(self.request, objects))
+        book = self.model.create(self.request, **given(self.data))
+        return self.ok_response(book.self_to_client(self.request))
+
+    def process_delete(self):
+        books = self.model.find(self.request, ids=self.data['book_ids'] or [])
+        self.model.bulk_delete(self.request, books)
+        return self.ok_response()
+
+
+class BookObject(ServerObjectMethod):
+    def get_book(self):
+        book = self.model.find(self.request, ids=[self.data['book_id']])
+        if not book:
+            raise http.Http404()
+        return book[0]
+
+    def process_get(self):
+        return self.ok_response(self.get_book().self_to_client(self.request, self.data.get('fields')))
+
+    def process_put(self):
+        book = self.get_book()
+        book.updated_data.update(given(self.data))
+        del book.updated_data['book_id']
+        book.save(self.request)
+        return self.ok_response(self.model.read_one(self.request, None, ids=[book.get_id()]))
+
+    def process_delete(self):
+        self.get_book().delete(self.request)
+        return self.ok_response()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import unittest
+
+from django.test import RequestFactory
+
+import client_api
+import server_api
+from apy.client import methods
+from apy.client.models import MODELS
+from apy.server.cache import RESPONSE_CACHE
+from apy.server.methods import AsyncServerObjectsMethod, response_to_json
+
+SHELF_FIELDS = 'score,items(shelf_id,stamp,note,book(title,author)),name,rating,curator,owner(name),badge'
+
+
+class AsyncBooks(methods.ClientObjectsMethod):
+    model = client_api.Book
+
+
+class AsyncCachedBooks(AsyncBooks):
+    model = client_api.Book
+    response_cache_ttl = 60
+
+
+async def process_get(self):
+    # same as server_api.Books.process_get
+    kwargs = {}
+    if self.data.get('book_ids') is not None:
+        kwargs['ids'] = self.data['book_ids']
+    if self.data.get('author_id') is not None:
+        kwargs['condition'] = {'author_id': {'$in': [self.data['author_id']]}}
+    return self.ok_response(await self.model.aread(self.request, self.data.get('fields'), **kwargs))
+
+
+# the server side, made with type() so the names don't shadow the client classes
+ServerAsyncBooks = type('AsyncBooks', (AsyncServerObjectsMethod, ), {'process_get': process_get})
+ServerAsyncCachedBooks = type('AsyncCachedBooks', (ServerAsyncBooks, ), {})
+
+
+def to_json(objects, request):
+    return json.dumps(response_to_json({'data': objects}, request)['data'])
+
+
+class AsyncReadTest(unittest.TestCase):
+    def setUp(self):
+        server_api.reset()
+
+    def compare(self, model, fields, concurrency=None, **kwargs):
+        plan = MODELS[model.__name__].parse_query_fields(fields)
+        results = []
+        for read in (lambda request: model.read(request, plan, **kwargs),
+                     lambda request: asyncio.run(model.aread(request, plan, **kwargs))):
+            server_api.reset()
+            request = RequestFactory().get('/')
+            request.apy_field_concurrency = concurrency
+            result = to_json(read(request), request)
+            # concurrent sibling fields may each miss the loader, so the queries are only compared without
+            results.append((result, server_api.Book.queries, server_api.Author.queries) if not concurrency else (result, ))
+        self.assertEqual(results[1], results[0])
+        return json.loads(results[0][0])
+
+    def test_aread(self):
+        books = self.compare(server_api.Book, 'title,pages,author(name,bio)')
+        self.assertEqual(books[3], {'id': 4, 'title': 'The Cyberiad', 'pages': 295,
+                                    'author': {'id': 2, 'name': 'Stanislaw', 'bio': 'Wrote about Solaris'}})
+        self.compare(server_api.Book, 'title', ids=[3, 1])
+        self.compare(server_api.Author, 'name')
+
+    def test_aread_server_fields(self):
+        for concurrency in (None, 4):
+            shelves = self.compare(server_api.Shelf, SHELF_FIELDS, concurrency)
+            self.assertEqual(shelves[0]['badge'], 'badge 1')
+            self.assertEqual([item['note'] for item in shelves[0]['items']], ['again', 'signed'])
+
+
+class AsyncViewTest(unittest.TestCase):
+    def setUp(self):
+        server_api.reset()
+        RESPONSE_CACHE.backend.clear()
+        self.factory = RequestFactory()
+
+    def call(self, view, data=None):
+        http_response = view(self.factory.get('/books', data or {}))
+        if asyncio.iscoroutine(http_response):
+            http_response = asyncio.run(http_response)
+        return http_response.status_code, http_response['Content-Type'], http_response.content
+
+    def test_coroutine_view(self):
+        http_response = ServerAsyncBooks.as_view()(self.factory.get('/books'))
+        self.assertTrue(asyncio.iscoroutine(http_response))
+        self.assertEqual(asyncio.run(http_response).status_code, 200)
+        self.assertEqual(ServerAsyncBooks.as_view().__name__, 'AsyncBooks')
+
+    def test_same_response(self):
+        for data in (None, {'fields': 'title,author(name)'}, {'author_id': 2, 'fields': 'pages'},
+                     {'book_ids': '4,2'}, {'fields': 'title,author('}, {'fields': 'missing'}):
+            self.assertEqual(self.call(ServerAsyncBooks.as_view(), data), self.call(server_api.Books.as_view(), data), data)
+        status, _, content = self.call(ServerAsyncBooks.as_view(), {'fields': 'title,author('})
+        self.assertEqual((status, json.loads(content.decode('utf-8'))['error']), (400, 'invalid_param'))
+
+    def test_cached_response(self):
+        expected = self.call(server_api.Books.as_view(), {'fields': 'title'})
+        server_api.reset()
+        self.assertEqual(self.call(ServerAsyncCachedBooks.as_view(), {'fields': 'title'}), expected)
+        self.assertEqual(self.call(ServerAsyncCachedBooks.as_view(), {'fields': 'id,title'}), expected)
+        self.assertEqual(len(server_api.Book.queries), 1)
+        server_api.Book.create(self.factory.post('/books'), title='Eden', author_id=2)
+        status, _, content = self.call(ServerAsyncCachedBooks.as_view(), {'fields': 'title'})
+        self.assertEqual(json.loads(content.decode('utf-8'))['data'][-1]['title'], 'Eden')
+        self.assertEqual(len(server_api.Book.queries), 2)
+
+    def test_internal_dispatch(self):
+        request = self.factory.get('/books')
+        expected = server_api.Books().internal_dispatch(request, 'GET', {'author_id': 1})
+        response = asyncio.run(ServerAsyncBooks().internal_dispatch(self.factory.get('/books'), 'GET', {'author_id': 1}))
+        self.assertEqual(to_json(response['data'], request), to_json(expected['data'], request))
+        self.assertEqual([book['title'] for book in response['data']], ['A Wizard of Earthsea', 'The Dispossessed'])
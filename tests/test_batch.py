@@ -0,0 +1,99 @@
+import json
+import threading
+import unittest
+
+from django.test import RequestFactory
+
+import server_api
+from apy.server import methods
+from apy.server.methods import InternalDispatch
+
+OPERATIONS = [
+    {'method': 'GET', 'name': 'Books', 'data': {'fields': 'title,author(name)'}},
+    {'method': 'GET', 'name': 'AuthorObject', 'data': {'author_id': 2}},
+    {'method': 'GET', 'name': 'BookObject', 'data': {'book_id': 3, 'fields': 'pages'}},
+    {'method': 'PUT', 'name': 'BookObject', 'data': {'book_id': 3, 'title': 'Solaris', 'pages': 205}},
+    {'method': 'GET', 'name': 'BookObject', 'data': {'book_id': 3, 'fields': 'pages'}},
+    {'method': 'GET', 'name': 'Authors', 'data': {'fields': 'bio'}},
+]
+
+
+class BatchViewTest(unittest.TestCase):
+    dispatch = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dispatch = InternalDispatch(1, use_batch=True)
+
+    def setUp(self):
+        server_api.reset()
+        self.closed_on = []
+        self.close_old_connections = methods.close_old_connections
+        methods.close_old_connections = lambda: self.closed_on.append(threading.current_thread())
+
+    def tearDown(self):
+        methods.close_old_connections = self.close_old_connections
+        server_api.Book.delay = server_api.Author.delay = 0
+
+    def post(self, payload, body=None):
+        body = json.dumps(payload) if body is None else body
+        http_response = self.dispatch.batch_view(RequestFactory().post('/batch', body, content_type='application/json'))
+        return http_response.status_code, json.loads(http_response.content.decode('utf-8'))
+
+    def test_sequential(self):
+        status, response = self.post(OPERATIONS)
+        self.assertEqual(status, 200)
+        self.assertEqual([result['status'] for result in response['data']], [200] * 6)
+        bodies = [result['body']['data'] for result in response['data']]
+        self.assertEqual(bodies[0][2], {'id': 3, 'title': 'Solaris', 'author': {'id': 2, 'name': 'Stanislaw'}})
+        self.assertEqual(bodies[1], {'id': 2, 'name': 'Stanislaw'})
+        self.assertEqual((bodies[2]['pages'], bodies[4]['pages']), (204, 205))  # in order around the PUT
+        self.assertEqual(self.closed_on, [])  # nothing ran on the executor
+
+    def test_parallel(self):
+        status, sequential = self.post(OPERATIONS)
+        server_api.reset()
+        server_api.Book.delay = server_api.Author.delay = 0.05
+        status, parallel = self.post({'operations': OPERATIONS, 'parallel': True})
+        self.assertEqual(status, 200)
+        self.assertEqual(parallel, sequential)
+        # the GETs before and after the PUT ran on the executor, each closing old connections before and after
+        self.assertEqual(len(self.closed_on), 10)
+        self.assertNotIn(threading.current_thread(), self.closed_on)
+
+    def test_invalid_operations(self):
+        status, response = self.post([
+            1,
+            {'method': 'GET', 'name': 'Nope'},
+            {'method': 'PATCH', 'name': 'Books'},
+            {'method': 'GET', 'name': 'Books', 'data': [1]},
+            {'method': 'GET', 'name': 'BookObject', 'data': {'book_id': 9}},
+            {'method': 'GET', 'name': 'Authors'},
+        ])
+        self.assertEqual(status, 200)
+        self.assertEqual([(result['status'], result['body']['error']) for result in response['data'][:5]], [
+            (400, 'invalid_param'),
+            (400, 'unknown_api_method'),
+            (405, 'invalid_http_method'),
+            (400, 'invalid_param'),
+            (404, 'not_found'),
+        ])
+        self.assertEqual((response['data'][5]['status'], len(response['data'][5]['body']['data'])), (200, 2))
+        self.assertEqual(response['data'][1]['body']['error_messages'], ['Invalid client method: "Nope"'])
+
+    def test_invalid_payload(self):
+        for payload, body in (({'operations': {}}, None), (None, '[{'), (None, 'x' * 10)):
+            status, response = self.post(payload, body)
+            self.assertEqual((status, response['error']), (400, 'invalid_param'), body or payload)
+        status, response = self.post([{'name': 'Books'}] * (InternalDispatch.max_batch_operations + 1))
+        self.assertEqual(response['error_messages'], ['operations: at most 50 allowed'])
+
+    def test_body_limit(self):
+        self.dispatch.max_body_size = 100
+        try:
+            status, response = self.post(OPERATIONS)
+        finally:
+            del self.dispatch.max_body_size
+        self.assertEqual((status, response['error']), (413, 'request_too_large'))
+        self.assertEqual(response['error_messages'], ['request body: at most 100 bytes allowed'])
+        self.assertEqual(server_api.Book.queries, [])
@@ -0,0 +1,63 @@
+import json
+import unittest
+
+from django.test import RequestFactory
+
+import server_api
+from apy.server.errors import InvalidParameter
+
+
+class BulkRequestTest(unittest.TestCase):
+    def setUp(self):
+        server_api.reset()
+        self.factory = RequestFactory()
+
+    def call(self, view, method, path, body, **kwargs):
+        request = getattr(self.factory, method)(path, json.dumps(body), content_type='application/json')
+        http_response = view(request, **kwargs)
+        return http_response.status_code, json.loads(http_response.content.decode('utf-8'))
+
+    def test_bulk_create(self):
+        status, response = self.call(server_api.Books.as_view(), 'post', '/books',
+                                     [{'title': 'Lathe of Heaven', 'author_id': 1}, {'title': 'Eden', 'author_id': 2}])
+        self.assertEqual(status, 200)
+        self.assertEqual([book['title'] for book in response['data']], ['Lathe of Heaven', 'Eden'])
+        self.assertEqual(len(server_api.Book.rows), 6)
+
+    def test_invalid_object(self):
+        status, response = self.call(server_api.Books.as_view(), 'post', '/books', [{'title': 'Eden'}, {'author_id': 2}])
+        self.assertEqual(status, 400)
+        self.assertEqual(response['error_messages'], ['objects[1].title: This field is required.'])
+        self.assertEqual(len(server_api.Book.rows), 4)
+
+    def test_non_object_items(self):
+        status, response = self.call(server_api.Books.as_view(), 'post', '/books', [{'title': 'Eden'}, 1, 2])
+        self.assertEqual(status, 400)
+        self.assertEqual(response['error'], 'invalid_param')
+        self.assertEqual(response['error_messages'], ['objects[1]: a json object is required'])
+        self.assertEqual(len(server_api.Book.rows), 4)
+
+    def test_array_for_method_without_bulk(self):
+        status, response = self.call(server_api.BookObject.as_view(), 'put', '/books/1', [{'title': 'x'}], book_id='1')
+        self.assertEqual((status, response['error']), (400, 'invalid_param'))
+        self.assertEqual(server_api.Book.rows[1]['title'], 'A Wizard of Earthsea')
+        status, response = self.call(server_api.Books.as_view(), 'delete', '/books', [1, 2])
+        self.assertEqual((status, response['error']), (400, 'invalid_param'))
+        self.assertEqual(len(server_api.Book.rows), 4)
+
+    def test_array_for_internal_call(self):
+        server_method = server_api.BookObject()
+        request = self.factory.put('/books/1')
+        with self.assertRaises(InvalidParameter):
+            server_method.internal_dispatch(request, 'PUT', [{'title': 'x'}])
+        self.assertEqual(server_api.Book.rows[1]['title'], 'A Wizard of Earthsea')
+
+    def test_object_body(self):
+        status, response = self.call(server_api.BookObject.as_view(), 'put', '/books/1', {'title': 'Earthsea', 'pages': 200},
+                                     book_id='1')
+        self.assertEqual(status, 200)
+        self.assertEqual(server_api.Book.rows[1], {'id': 1, 'title': 'Earthsea', 'author_id': 1, 'pages': 200})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+import helpers
+from client_api import Author, Book
+from apy import utils
+from apy.client import forms
+
+FORMS = {
+    'read': Book.get_read_form('book_id'),
+    'read_many': Book.get_read_many_form(),
+    'nested_read': Author.get_nested_read_form(Book, 'author_id'),
+    'create': Book.get_create_form(),
+    'modify': Book.get_modify_form('book_id'),
+    'delete': Book.get_delete_form('book_id'),
+    'delete_many': Book.get_delete_many_form(),
+    'cursor': Book.get_read_many_form(base_form=forms.SearchableCursorForm),
+}
+
+DATA = [
+    {},
+    {'book_id': '1', 'author_id': '2', 'fields': 'title,author(name)', 'limit': '5', 'offset': '10',
+     'title': 'Earthsea', 'pages': '183', 'book_ids': '1,2, 3', 'q': 'wizard'},
+    {'book_id': 'x', 'author_id': '', 'limit': '0', 'offset': '-1', 'pages': 'many', 'book_ids': '1,x'},
+    {'book_id': 1, 'limit': 50, 'offset': 1000, 'title': '', 'pages': 12.5, 'book_ids': ''},
+    {'limit': '51', 'offset': '1001', 'title': 'x' * 1000, 'fields': ' TITLE , id '},
+    {'book_id': '3', 'title': 'Solaris'},  # pages not given, modify forms leave it out
+    {'fields': 'nope'},
+    {'fields': 'author('},
+    {'cursor': 'garbage', 'limit': '10'},
+    {'cursor': utils.make_cursor({'id': 3}), 'fields': 'title'},
+]
+
+
+def outcome(form):
+    # what a server method sees after cleaning: validity, cleaned data and errors, or the exception raised
+    try:
+        valid = form.is_valid()
+    except Exception as e:  # pylint: disable=W0703
+        return 'raised', type(e), str(e)
+    return valid, form.cleaned_data, form.errors.as_text()
+
+
+class CompiledFormParityTest(unittest.TestCase):
+    def test_compiled(self):
+        for name, form in FORMS.items():
+            self.assertTrue(issubclass(forms.compile_form(form), forms.CompiledForm), name)
+
+    def test_parity(self):
+        for name, form in FORMS.items():
+            compiled = forms.compile_form(form)
+            for data in DATA:
+                self.assertEqual(outcome(compiled(dict(data))), outcome(form(dict(data))), '%s %r' % (name, data))
+
+    def test_unbound(self):
+        for form in FORMS.values():
+            self.assertFalse(forms.compile_form(form)().is_valid())
+
+    def test_fallback(self):
+        class CustomForm(forms.MethodForm):
+            name = forms.StringField()
+
+            def clean_name(self):
+                return self.cleaned_data['name'].upper()
+
+        self.assertIs(forms.compile_form(CustomForm), CustomForm)
+
+
+@helpers.benchmark
+class CompiledFormBenchmark(unittest.TestCase):
+    def test_clean(self):
+        data = DATA[1]
+        timings = []
+        for name in ('read', 'read_many', 'create', 'modify'):
+            form = FORMS[name]
+            compiled = forms.compile_form(form)
+            timings.append(('%s form' % name, helpers.best_time(lambda: form(dict(data)).is_valid(), number=1000)))
+            timings.append(('%s compiled' % name, helpers.best_time(lambda: compiled(dict(data)).is_valid(), number=1000)))
+        helpers.report('form cleaning, 1000 requests', timings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import datetime
+import functools
+import json
+import unittest
+import urllib.parse
+
+from django.test import RequestFactory
+
+import client_api
+import server_api
+from apy import utils
+from apy.client import forms, methods
+from apy.server.methods import ServerMethod
+
+BORN = {
+    1: datetime.datetime(1929, 10, 21, 8, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+    2: datetime.datetime(1921, 9, 12, 23, 59, 59, 999999),
+    3: datetime.datetime(1947, 9, 21),
+    4: datetime.datetime(1920, 8, 22, 12, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=-5))),
+}
+
+
+class AuthorPages(methods.ClientReadMethod):
+    url_pattern = 'author-pages'
+    names = {'GET': 'Authors by page'}
+    GetForm = methods.LazyForm(functools.partial(client_api.Author.get_read_many_form, base_form=forms.CursorForm))
+
+
+def process_get(self):
+    self.cursors.append(self.data['cursor'])
+    return self.ok_response(self.model.read(self.request, self.data.get('fields'), **self.get_cursor_kwargs()))
+
+
+# the server side, made with type() so the name doesn't shadow the client class
+ServerAuthorPages = type('AuthorPages', (ServerMethod, ), {
+    'model': server_api.Author,
+    'cursor_fields': ('born', 'id'),
+    'cursors': [],
+    'process_get': process_get,
+})
+
+
+class CursorPaginationTest(unittest.TestCase):
+    def setUp(self):
+        server_api.reset()
+        server_api.Author.rows = {i: {'id': i, 'name': 'Author %d' % i, 'born': born} for i, born in BORN.items()}
+        del ServerAuthorPages.cursors[:]
+
+    def get(self, data):
+        http_response = ServerAuthorPages.as_view()(RequestFactory().get('/author-pages', data))
+        return http_response.status_code, json.loads(http_response.content.decode('utf-8'))
+
+    def next_data(self, response):
+        return dict(urllib.parse.parse_qsl(urllib.parse.urlparse(response['pagination']['next']).query))
+
+    def test_pages(self):
+        status, response = self.get({'fields': 'name,born', 'limit': 3, 'cursor': ''})
+        self.assertEqual(status, 200)
+        self.assertEqual([author['id'] for author in response['data']], [1, 2, 3])
+        data = self.next_data(response)
+        self.assertEqual((data['fields'], data['limit']), ('name,born', '3'))
+        status, response = self.get(data)
+        self.assertEqual(status, 200)
+        self.assertEqual([author['id'] for author in response['data']], [4])
+        self.assertEqual(response['pagination'], {})  # the last page
+        self.assertEqual(ServerAuthorPages.cursors, [None, {'born': BORN[3], 'id': 3}])
+
+    def test_full_last_page(self):
+        status, response = self.get({'fields': 'born', 'limit': 2, 'cursor': ''})
+        status, response = self.get(self.next_data(response))
+        self.assertEqual([author['id'] for author in response['data']], [3, 4])
+        # a full page always links to the next one, which may be empty
+        status, response = self.get(self.next_data(response))
+        self.assertEqual((status, response['data'], response['pagination']), (200, [], {}))
+
+    def test_datetime_round_trip(self):
+        for born in BORN.values():
+            parsed = utils.parse_cursor(utils.make_cursor({'born': born, 'id': 7, 'name': 'x'}))
+            self.assertEqual(parsed, {'born': born, 'id': 7, 'name': 'x'})
+            self.assertEqual(parsed['born'].tzinfo, born.tzinfo)
+        for limit, last in ((1, 1), (2, 2), (4, 4)):
+            del ServerAuthorPages.cursors[:]
+            status, response = self.get({'fields': 'born', 'limit': limit, 'cursor': ''})
+            self.get(self.next_data(response))
+            self.assertEqual(ServerAuthorPages.cursors[1], {'born': BORN[last], 'id': last})
+
+    def test_tampered_cursor(self):
+        _, response = self.get({'fields': 'born', 'limit': 1, 'cursor': ''})
+        data = self.next_data(response)
+        cursor = data['cursor']
+        for tampered in (cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B'), cursor[1:], 'x' + cursor, 'nope',
+                         utils.make_cursor({'id': 1})[:-2]):
+            status, response = self.get(dict(data, cursor=tampered))
+            self.assertEqual((status, response['error']), (400, 'invalid_param'), tampered)
+            self.assertEqual(response['error_messages'], ['cursor: Invalid cursor.'])
+        self.assertEqual(len(ServerAuthorPages.cursors), 1)  # no other request reached process_get
+
+    def test_missing_cursor_fields(self):
+        for fields in (None, 'name', 'name,id'):
+            status, response = self.get({'limit': 2, 'cursor': ''} if fields is None else
+                                        {'fields': fields, 'limit': 2, 'cursor': ''})
+            self.assertEqual((status, response['error']), (400, 'invalid_param'), fields)
+            self.assertEqual(response['error_messages'], ['fields: born required with a cursor'])
+        self.assertEqual(ServerAuthorPages.cursors, [])
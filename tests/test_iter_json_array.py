@@ -0,0 +1,87 @@
+import json
+import unittest
+
+from apy.server.serializers import iter_json_array
+
+ITEMS = [
+    0, -0, 7, -42, 1234567890123456789012345, 3.25, -0.5, 1e3, 1.5e-10, -2.5E+20, 1e999,
+    True, False, None, '', 'plain',
+    'caf\xe9', '中文', '\U0001f600 emoji', '\\"quoted\\" \n\t',
+    [], {}, [1, [2.75, [-3e2]]],
+    {'name': 'été', 'pages': 183, 'tags': ['a', 'ж'], 'rating': -4.5e-1, 'nested': {'ok': True}},
+]
+# every item once in the repo's own encoding, once with the non-ascii text escaped, with uneven whitespace
+DOCUMENT = '[%s]' % ', \n\t'.join(
+    [json.dumps(item, ensure_ascii=False) for item in ITEMS] + [json.dumps(item) for item in ITEMS] +
+    ['%d.%de-%d' % (i, i * 7, i % 5) for i in range(1, 400)] +
+    [json.dumps({'id': i, 'title': 'łódź %d' % i, 'price': i * 1.01}, ensure_ascii=False) for i in range(300)])
+CHUNK_SIZES = list(range(1, 65)) + [97, 128, 255, 256, 1000, 1023, 4096, 5000, 9999, 10000]
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    def test_document(self):
+        data = DOCUMENT.encode('utf-8')
+        self.assertGreater(len(data), 10000)
+        expected = json.loads(DOCUMENT)
+        for size in CHUNK_SIZES:
+            self.assertEqual(list(iter_json_array(chunked(data, size))), expected, size)
+
+    def test_numbers(self):
+        # every split of a number, e.g. "1" "2.5e-3" is not 1 and 2.5e-3
+        for text in ('[12.5e-3]', '[-100]', '[1,2345,6E+7]', '[ 0.000001 ]', '[123456789]'):
+            data = text.encode('utf-8')
+            for size in range(1, len(data) + 1):
+                self.assertEqual(list(iter_json_array(chunked(data, size))), json.loads(text), (text, size))
+            for cut in range(1, len(data)):
+                self.assertEqual(list(iter_json_array([data[:cut], data[cut:]])), json.loads(text), (text, cut))
+
+    def test_multibyte(self):
+        text = '["\xe9", "中文", "\U0001f600", {"ж": "\U0001f4da"}]'
+        data = text.encode('utf-8')
+        for cut in range(1, len(data)):
+            self.assertEqual(list(iter_json_array([data[:cut], data[cut:]])), json.loads(text), cut)
+
+    def test_empty_chunks(self):
+        self.assertEqual(list(iter_json_array([b'', b'[1', b'', b'', b',2]', b''])), [1, 2])
+        self.assertEqual(list(iter_json_array([b' [ ', b'] \n'])), [])
+
+    def test_yields_as_it_reads(self):
+        chunks = iter([b'[{"a": 1}, ', b'{"a": 2}', b', 3]'])
+        items = iter_json_array(chunks)
+        self.assertEqual(next(items), {'a': 1})
+        self.assertEqual(next(chunks), b'{"a": 2}')  # the second item wasn't read yet
+
+    def test_invalid(self):
+        cases = [
+            ('[1, 2,]', 'invalid json array item'),
+            ('[,1]', 'invalid json array item'),
+            ('[1 2]', 'expected ","'),
+            ('[1]2', 'extra data after json array'),
+            ('[1] [2]', 'extra data after json array'),
+            ('[{"a": 1}] x', 'extra data after json array'),
+            ('[1, 2', 'unexpected end of json array'),
+            ('', 'unexpected end of json array'),
+            ('[1.5e]', 'expected ","'),  # 1.5 then a stray e
+            ('["open]', 'invalid json array item'),
+        ]
+        for text, message in cases:
+            data = text.encode('utf-8')
+            with self.assertRaises(ValueError, msg=text):
+                json.loads(text)
+            for size in range(1, len(data) + 2):
+                with self.assertRaisesRegex(ValueError, message, msg=(text, size)):
+                    list(iter_json_array(chunked(data, size)))
+
+    def test_not_an_array(self):
+        for text in ('{"a": 1}', '1', '"[1]"'):
+            with self.assertRaisesRegex(ValueError, 'expected "\\["', msg=text):
+                list(iter_json_array([text.encode('utf-8')]))
+
+    def test_invalid_utf8(self):
+        for chunks in ([b'["\xff"]'], [b'["\xc3', b'"]'], [b'["\xe4\xb8']):
+            with self.assertRaises(ValueError):
+                list(iter_json_array(chunks))
@@ -0,0 +1,157 @@
+import collections
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import helpers
+from apy.client import fields, forms, methods
+from apy.client.models import BaseClientModel
+from apy.server.methods import InternalDispatch, ServerObjectsMethod
+from apy.server.models import BaseServerModel
+
+BUILT = collections.Counter()
+
+
+def counted(name, factory):
+    def build():
+        BUILT[name] += 1
+        return factory()
+    return build
+
+
+class Pamphlet(BaseClientModel):
+    id = fields.IntegerField(is_default=True)
+    title = fields.StringField(is_default=True, required=True, modifiable=True)
+
+
+class Pamphlets(methods.ClientObjectsMethod):
+    model = Pamphlet
+    GetForm = methods.LazyForm(counted('GetForm', Pamphlet.get_read_many_form))
+    PostForm = methods.LazyForm(counted('PostForm', Pamphlet.get_create_form))
+
+
+class PamphletSearch(methods.ClientReadMethod):
+    url_pattern = 'pamphlet-search'
+    names = {'GET': 'Search pamphlets'}
+    GetForm = methods.LazyForm(counted('SearchForm', Pamphlet.get_read_many_form))
+
+
+class RecentPamphletSearch(PamphletSearch):
+    url_pattern = 'recent-pamphlet-search'
+
+
+# the server side, made with type() so the names don't shadow the client classes
+type('Pamphlet', (BaseServerModel, ), {})
+type('Pamphlets', (ServerObjectsMethod, ), {})
+
+
+class LazyFormTest(unittest.TestCase):
+    def test_not_built_by_dispatch(self):
+        dispatch = InternalDispatch(1)
+        self.assertEqual(BUILT['PostForm'], 0)
+        for name in ('PostForm', 'PutForm'):
+            self.assertIsInstance(Pamphlets.__dict__[name], methods.LazyForm)
+        infos = [info for info in dispatch.categories[None] if info['method'] is Pamphlets]
+        self.assertEqual([info['http_method'] for info in infos], ['POST', 'GET', 'DELETE'])
+        self.assertEqual(BUILT['PostForm'], 0)
+        form = infos[0]['form']  # built when the documentation looks it up
+        self.assertEqual(BUILT['PostForm'], 1)
+        self.assertIs(form, Pamphlets.get_input_form('POST'))
+
+    def test_built_once(self):
+        form = RecentPamphletSearch.get_input_form('GET')
+        self.assertTrue(issubclass(form, forms.MethodForm))
+        self.assertIs(PamphletSearch.get_input_form('GET'), form)
+        self.assertIs(RecentPamphletSearch.get_input_form('GET'), form)
+        self.assertEqual(BUILT['SearchForm'], 1)
+        # set on the class that declared it, subclasses find it there
+        self.assertIs(PamphletSearch.__dict__['GetForm'], form)
+        self.assertNotIn('GetForm', RecentPamphletSearch.__dict__)
+
+    def test_generated_forms(self):
+        form = Pamphlets.get_input_form('DELETE')
+        self.assertIs(Pamphlets.__dict__['DeleteForm'], form)
+        self.assertEqual(list(form.base_fields), ['pamphlet_ids'])
+
+
+SYNTHETIC_CLIENT = '''
+class {name}(BaseClientModel):
+    id = fields.IntegerField(is_default=True)
+    title = fields.StringField(is_default=True, required=True, modifiable=True)
+    summary = fields.StringField(creatable=True, modifiable=True)
+    kind = fields.StringField(is_query_filter=True, creatable=True)
+    count = fields.IntegerField(creatable=True, modifiable=True)
+    created = fields.DateTimeField()
+    tags = fields.ArrayField()
+    parent = fields.NestedField('{parent}')
+
+
+class {name}s(methods.ClientObjectsMethod):
+    model = {name}
+
+
+class {name}Object(methods.ClientObjectMethod):
+    model = {name}
+'''
+
+SYNTHETIC_SERVER = '''
+class {name}(BaseServerModel):
+    parent = fields.NestedIdField('{parent}', 'parent_id')
+
+
+class {name}s(ServerObjectsMethod):
+    pass
+
+
+class {name}Object(ServerObjectMethod):
+    pass
+'''
+
+
+def write_synthetic_api(directory, prefix, count):
+    # a client and a server module with count models, each with an objects and an object method
+    names = ['%s%d' % (prefix, i) for i in range(count)]
+    client = ['from apy.client import fields, methods', 'from apy.client.models import BaseClientModel']
+    server = ['from apy.server import fields', 'from apy.server.methods import ServerObjectMethod, ServerObjectsMethod',
+              'from apy.server.models import BaseServerModel', 'import %s_client' % prefix.lower()]
+    for ix, name in enumerate(names):
+        client.append(SYNTHETIC_CLIENT.format(name=name, parent=names[ix - 1]))
+        server.append(SYNTHETIC_SERVER.format(name=name, parent=names[ix - 1]))
+    for suffix, lines in (('client', client), ('server', server)):
+        with open(os.path.join(directory, '%s_%s.py' % (prefix.lower(), suffix)), 'w') as f:
+            f.write('\n'.join(lines))
+    return names
+
+
+@helpers.benchmark
+class StartupBenchmark(unittest.TestCase):
+    def test_import_synthetic_api(self):
+        directory = tempfile.mkdtemp()
+        sys.path.insert(0, directory)
+        try:
+            names = write_synthetic_api(directory, 'Synthetic', 500)
+            timings = []
+            start = time.perf_counter()
+            importlib.import_module('synthetic_server')
+            timings.append(('import 500 models', time.perf_counter() - start))
+            start = time.perf_counter()
+            InternalDispatch(1)
+            timings.append(('InternalDispatch', time.perf_counter() - start))
+            client_methods = [methods.METHODS[name + suffix] for name in names for suffix in ('s', 'Object')]
+            start = time.perf_counter()
+            for client_method in client_methods:
+                for http_method in client_method.http_method_names:
+                    client_method.get_input_form(http_method)
+            timings.append(('build every form (skipped at startup)', time.perf_counter() - start))
+            helpers.report('startup with a synthetic api', timings)
+        finally:
+            sys.path.remove(directory)
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import asyncio
+import unittest
+
+from django.test import RequestFactory
+
+import server_api
+from apy.server.cache import LocalObjectCache
+
+Book = server_api.Book
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ObjectCacheTest(unittest.TestCase):
+    def setUp(self):
+        server_api.reset()
+        self.clock = Clock()
+        Book.object_cache = LocalObjectCache(maxsize=3, ttl=10, timer=self.clock)
+
+    def tearDown(self):
+        Book.object_cache = None
+
+    def find(self, ids, fields=None):
+        # without a request there is no loader, every read goes to db_find_ids
+        return [book.get_id() for book in Book.find(None, ids=ids, fields=fields)]
+
+    def queried_ids(self):
+        ids = [query['ids'] for query in Book.queries]
+        del Book.queries[:]
+        return ids
+
+    def test_hits(self):
+        self.assertEqual(self.find([1, 2]), [1, 2])
+        self.assertEqual(self.find([2, 1]), [2, 1])
+        self.assertEqual(self.queried_ids(), [[1, 2]])
+        stats = Book.object_cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (2, 2, 2))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_partial_miss(self):
+        self.find([1, 2])
+        self.assertEqual(self.find([1, 3, 2, 9]), [1, 3, 2])
+        self.assertEqual(self.queried_ids(), [[1, 2], [3, 9]])
+        self.find([9])  # ids that don't exist aren't cached
+        self.assertEqual(self.queried_ids(), [[9]])
+
+    def test_columns(self):
+        self.find([1], fields=['id', 'title'])
+        self.find([1], fields=['title'])
+        self.assertEqual(self.queried_ids(), [[1]])
+        self.find([1], fields=['id', 'pages'])  # the cached entry doesn't have pages
+        self.find([1], fields=['title', 'pages'])
+        self.assertEqual(self.queried_ids(), [[1]])
+        self.find([1])  # all columns
+        self.find([1])
+        self.assertEqual(self.queried_ids(), [[1]])
+
+    def test_invalidation(self):
+        request = RequestFactory().get('/books')
+        self.find([1, 2, 3])
+        book = Book.find(None, ids=[1])[0]
+        book.update(request, title='Earthsea')
+        self.assertEqual(Book.find(None, ids=[1])[0].data['title'], 'Earthsea')
+        Book.find(None, ids=[2])[0].delete(request)
+        self.assertEqual(self.find([1, 2, 3]), [1, 3])
+        Book.bulk_delete(request, Book.find(None, ids=[3]))
+        self.assertEqual(self.find([3]), [])
+        self.assertEqual(self.queried_ids(), [[1, 2, 3], [1], [2], [3]])
+        self.assertEqual(Book.object_cache.get_stats()['invalidations'], 3)
+
+    def test_ttl(self):
+        self.find([1])
+        self.clock.now = 9.9
+        self.find([1])
+        self.clock.now = 10
+        self.find([1])
+        self.assertEqual(self.queried_ids(), [[1], [1]])
+        self.assertEqual(Book.object_cache.get_stats()['expirations'], 1)
+
+    def test_lru_eviction(self):
+        self.find([1, 2, 3])
+        self.find([1])  # 2 is now the least recently used
+        self.find([4])
+        self.assertEqual(self.queried_ids(), [[1, 2, 3], [4]])
+        self.find([1, 3, 4])
+        self.assertEqual(self.queried_ids(), [])
+        self.find([2])
+        self.assertEqual(self.queried_ids(), [[2]])
+        stats = Book.object_cache.get_stats()
+        self.assertEqual((stats['evictions'], stats['size']), (2, 3))
+        self.assertEqual((stats['hits'], stats['misses']), (4, 5))
+        self.assertEqual(stats['hit_ratio'], 4.0 / 9)
+
+    def test_async(self):
+        self.find([1])
+        rows = asyncio.run(Book.adb_find_ids([1, 2]))
+        self.assertEqual([row.get_id() for row in rows], [1, 2])
+        self.assertEqual(self.queried_ids(), [[1], [2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import unittest
+
+from django.test import RequestFactory
+
+import server_api
+from apy.client.models import MODELS
+from apy.server.methods import response_to_json
+
+
+def plan(model, fields):
+    return MODELS[model.__name__].parse_query_fields(fields)
+
+
+def columns(model):
+    # the columns db_find was asked for by each query, the loader passes them sorted
+    return [None if query['fields'] is None else sorted(query['fields']) for query in model.queries]
+
+
+def to_json(objects, request):
+    return json.loads(json.dumps(response_to_json({'data': objects}, request)['data']))
+
+
+class ProjectionTest(unittest.TestCase):
+    def setUp(self):
+        server_api.reset()
+        server_api.Book.use_projection = server_api.Author.use_projection = True
+
+    def tearDown(self):
+        for model in (server_api.Book, server_api.Author):
+            for attr in ('use_projection', 'always_columns'):
+                if attr in model.__dict__:
+                    delattr(model, attr)
+
+    def test_planned_columns(self):
+        request = RequestFactory().get('/')
+        books = server_api.Book.read(request, plan(server_api.Book, 'title,author(name)'), ids=[1, 3])
+        self.assertEqual(columns(server_api.Book), [['author_id', 'id', 'title']])
+        self.assertEqual(columns(server_api.Author), [['id', 'name']])
+        self.assertEqual(to_json(books, request), [
+            {'id': 1, 'title': 'A Wizard of Earthsea', 'author': {'id': 1, 'name': 'Ursula'}},
+            {'id': 3, 'title': 'Solaris', 'author': {'id': 2, 'name': 'Stanislaw'}},
+        ])
+
+    def test_without_ids(self):
+        request = RequestFactory().get('/')
+        books = server_api.Book.read(request, plan(server_api.Book, 'pages'), condition={'author_id': {'$in': [2]}})
+        self.assertEqual(columns(server_api.Book), [['id', 'pages']])
+        self.assertEqual(to_json(books, request), [{'id': 3, 'pages': 204}, {'id': 4, 'pages': 295}])
+
+    def test_always_columns(self):
+        server_api.Book.always_columns = ('author_id', )
+        # columns are memoized on the field plan, so this one isn't used by other tests
+        server_api.Book.read(RequestFactory().get('/'), plan(server_api.Book, 'pages,title'), ids=[2])
+        self.assertEqual(columns(server_api.Book), [['author_id', 'id', 'pages', 'title']])
+
+    def test_off(self):
+        server_api.Book.use_projection = False
+        server_api.Book.read(RequestFactory().get('/'), plan(server_api.Book, 'title'), ids=[2])
+        self.assertEqual(columns(server_api.Book), [None])
+
+    def test_wider_read_refetches(self):
+        request = RequestFactory().get('/')
+        server_api.Book.read(request, plan(server_api.Book, 'title'), ids=[1, 2])
+        # the same request: the loader has rows 1 and 2 with id and title only
+        books = server_api.Book.read(request, plan(server_api.Book, 'title,pages'), ids=[1, 2, 3])
+        self.assertEqual([sorted(query['ids']) for query in server_api.Book.queries], [[1, 2], [1, 2, 3]])
+        self.assertEqual(columns(server_api.Book), [['id', 'title'], ['id', 'pages', 'title']])
+        self.assertEqual([book['pages'] for book in to_json(books, request)], [183, 387, 204])
+        # narrower and equal reads are served by the loader
+        server_api.Book.read(request, plan(server_api.Book, 'pages'), ids=[3, 1])
+        server_api.Book.read(request, plan(server_api.Book, 'title,pages'), ids=[2])
+        self.assertEqual(len(server_api.Book.queries), 2)
+        # another request starts over
+        server_api.Book.read(RequestFactory().get('/'), plan(server_api.Book, 'pages'), ids=[1])
+        self.assertEqual(columns(server_api.Book)[-1], ['id', 'pages'])
+
+    def test_nested_wider_read(self):
+        request = RequestFactory().get('/')
+        server_api.Book.read(request, plan(server_api.Book, 'title,author(name)'), ids=[1])
+        books = server_api.Book.read(request, plan(server_api.Book, 'author(name,bio)'), ids=[1])
+        self.assertEqual(columns(server_api.Author), [['id', 'name'], ['bio', 'id', 'name']])
+        self.assertEqual(to_json(books, request)[0]['author'], {'id': 1, 'name': 'Ursula', 'bio': 'Wrote about Earthsea'})
+        self.assertEqual(len(server_api.Book.queries), 1)  # the first read loaded author_id already
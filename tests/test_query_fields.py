@@ -0,0 +1,123 @@
+import json
+import time
+import unittest
+
+from django.test import RequestFactory
+
+import helpers
+import server_api
+from apy.client import fields
+from apy.client.models import BaseClientModel, QueryFieldsError, parse_query_fields
+
+
+class QfAuthor(BaseClientModel):
+    id = fields.IntegerField(is_default=True)
+    name = fields.StringField(is_default=True)
+    created = fields.DateTimeField()
+
+
+class QfBook(BaseClientModel):
+    id = fields.IntegerField(is_default=True)
+    title = fields.StringField(is_default=True)
+    author = fields.NestedField('QfAuthor')
+
+
+def keys(query_fields):
+    return [f.key for f in query_fields]
+
+
+class ParseQueryFieldsTest(unittest.TestCase):
+    def test_grammar(self):
+        query_fields = parse_query_fields('a,b(c,d/e),f.fmt')
+        self.assertEqual(keys(query_fields), ['a', 'b', 'f'])
+        self.assertEqual(keys(query_fields[1].sub_fields), ['c', 'd'])
+        self.assertEqual(keys(query_fields[1].sub_fields[1].sub_fields), ['e'])
+        self.assertEqual(query_fields[1].sub_fields.fields_string, 'c,d/e')
+        self.assertEqual(query_fields[2].format, 'fmt')
+
+    def test_model(self):
+        query_fields = parse_query_fields('title,author(name)', model=QfBook)
+        self.assertEqual(keys(query_fields), ['id', 'title', 'author'])
+        self.assertEqual(keys(query_fields[2].sub_fields), ['id', 'name'])
+
+    def test_invalid_field(self):
+        with self.assertRaisesRegex(QueryFieldsError, 'invalid field: missing'):
+            parse_query_fields('title,missing', model=QfBook)
+        self.assertEqual(keys(parse_query_fields('title,missing', model=QfBook, ignore_invalid_fields=True)),
+                         ['id', 'title'])
+
+    def test_syntax_errors(self):
+        cases = [
+            ('name.', 'expected a format after "name." at position 5'),
+            ('author()', 'expected fields inside "\\(\\)" at position 7'),
+            ('author/', 'expected a field name after "/" at position 7'),
+            ('author(name', 'unclosed "\\(" at position 6'),
+            ('title),name', 'unmatched "\\)" at position 5'),
+            ('(name)', 'expected a field name at position 0'),
+        ]
+        for fields_string, message in cases:
+            with self.assertRaisesRegex(QueryFieldsError, message):
+                parse_query_fields(fields_string, model=QfBook)
+
+    def test_syntax_errors_ignored(self):
+        self.assertEqual(keys(parse_query_fields('title,name.', model=QfBook, ignore_invalid_fields=True)),
+                         ['id', 'title'])
+        self.assertEqual(keys(parse_query_fields('title,author()', model=QfBook, ignore_invalid_fields=True)),
+                         ['id', 'title'])
+        self.assertEqual(keys(parse_query_fields('title),name', model=QfBook, ignore_invalid_fields=True)),
+                         ['id', 'title'])
+
+
+class FieldsParamTest(unittest.TestCase):
+    # a malformed fields= is a client error, not a server one
+
+    def get(self, fields):
+        server_api.reset()
+        http_response = server_api.Books.as_view()(RequestFactory().get('/books', {'fields': fields}))
+        return http_response.status_code, json.loads(http_response.content.decode('utf-8'))
+
+    def test_valid(self):
+        status, response = self.get('title,author(name)')
+        self.assertEqual(status, 200)
+        self.assertEqual(response['data'][0], {'id': 1, 'title': 'A Wizard of Earthsea', 'author': {'id': 1, 'name': 'Ursula'}})
+
+    def test_invalid(self):
+        for fields_string, message in (('title,author(', 'unclosed "("'), ('title,missing', 'invalid field: missing'),
+                                       ('title.fmt', 'invalid format "fmt"')):
+            status, response = self.get(fields_string)
+            self.assertEqual((status, response['error']), (400, 'invalid_param'), fields_string)
+            self.assertIn(message, ' '.join(response['error_messages']))
+
+
+@helpers.benchmark
+class ParseQueryFieldsBenchmark(unittest.TestCase):
+    # deeply nested strings like the ones dashboard clients send, parse time should grow linearly
+
+    def time_parse(self, fields_string, repeat=3):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse_query_fields(fields_string)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def assert_linear(self, make_string):
+        small, large = make_string(5000), make_string(20000)
+        self.assertGreater(len(small), 10000)
+        ratio = self.time_parse(large) / self.time_parse(small)
+        # 4x the input, a quadratic parser would take about 16x as long
+        self.assertLess(ratio, 8, 'parse time grew %.1fx for 4x the input' % ratio)
+
+    def test_slash_nesting(self):
+        self.assert_linear(lambda n: 'a/' * n + 'b')
+
+    def test_parentheses_nesting(self):
+        self.assert_linear(lambda n: 'a(' * n + 'b' + ')' * n)
+
+    def test_wide(self):
+        self.assert_linear(lambda n: ','.join('f%d(a,b.fmt)' % i for i in range(n)))
+
+
+if __name__ == '__main__':
+    unittest.main()
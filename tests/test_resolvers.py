@@ -0,0 +1,92 @@
+import concurrent.futures
+import json
+import threading
+import unittest
+
+from django.test import RequestFactory
+
+import server_api
+from apy.client.models import MODELS
+from apy.server import resolvers
+from apy.server.methods import response_to_json
+
+FIELDS = 'score,items(stamp,note,book(title,author)),name,rating,curator,owner(name),badge'
+
+
+class ResolveServerFieldsTest(unittest.TestCase):
+    def setUp(self):
+        server_api.reset()
+        server_api.LabelField.delay = server_api.Author.delay = server_api.Book.delay = 0.02
+
+    def tearDown(self):
+        server_api.LabelField.delay = server_api.Author.delay = server_api.Book.delay = 0
+
+    def read(self, concurrency, fields=FIELDS):
+        server_api.reset()
+        request = RequestFactory().get('/shelves')
+        request.apy_field_concurrency = concurrency
+        plan = MODELS['Shelf'].parse_query_fields(fields)
+        shelves = server_api.Shelf.read(request, plan)
+        return json.dumps(response_to_json({'data': shelves}, request)['data']), plan
+
+    def test_same_result(self):
+        sequential, _ = self.read(None)
+        self.assertEqual(server_api.LabelField.peak, 1)
+        for concurrency in (2, 3, 16):
+            self.assertEqual(self.read(concurrency)[0], sequential)
+        self.assertNotIn('gift', sequential)  # hidden by the overridden ShelfItem.read
+
+    def test_key_order(self):
+        for concurrency in (None, 4):
+            _, plan = self.read(concurrency)
+            self.assertEqual(server_api.Shelf.client_keys, [list(plan.keys)] * 3)
+            self.assertEqual(plan.keys[:3], ('id', 'score', 'items'))
+
+    def test_limit(self):
+        for concurrency in (2, 3):
+            self.read(concurrency)
+            self.assertEqual(server_api.LabelField.peak, concurrency)
+        self.read(1)
+        self.assertEqual(server_api.LabelField.peak, 1)
+
+    def test_error(self):
+        original = server_api.LabelField.to_client
+
+        def to_client(field, request, owner, query_field, objects):
+            if query_field.key == 'rating':
+                raise ValueError('rating failed')
+            original(field, request, owner, query_field, objects)
+
+        server_api.LabelField.to_client = to_client
+        try:
+            with self.assertRaisesRegex(ValueError, 'rating failed'):
+                server_api.Shelf.read(self.request_with(4), MODELS['Shelf'].parse_query_fields(FIELDS))
+        finally:
+            server_api.LabelField.to_client = original
+
+    def request_with(self, concurrency):
+        request = RequestFactory().get('/shelves')
+        request.apy_field_concurrency = concurrency
+        return request
+
+    def test_nested_on_worker(self):
+        # shelf items are read on a worker through ShelfItem.read, which resolves their book and stamp fields
+        # itself; with the only worker busy, waiting on the executor for them would never return
+        sequential, _ = self.read(None)
+        executor = resolvers._field_executor  # pylint: disable=W0212
+        resolvers._field_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)  # pylint: disable=W0212
+        result = []
+        try:
+            thread = threading.Thread(target=lambda: result.append(self.read(2)[0]))
+            thread.daemon = True
+            thread.start()
+            thread.join(10)
+            self.assertFalse(thread.is_alive(), 'nested fields waited on the executor')
+        finally:
+            resolvers._field_executor.shutdown(wait=False)  # pylint: disable=W0212
+            resolvers._field_executor = executor  # pylint: disable=W0212
+        self.assertEqual(result, [sequential])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import threading
+import unittest
+
+from django.test import RequestFactory
+
+import client_api
+import server_api
+from apy.client import methods
+from apy.server.cache import RESPONSE_CACHE
+
+
+class CachedBooks(methods.ClientObjectsMethod):
+    model = client_api.Book
+    response_cache_ttl = 60
+
+
+# the server side, made with type() so the name doesn't shadow the client class
+ServerCachedBooks = type('CachedBooks', (server_api.Books, ), {})
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        server_api.reset()
+        RESPONSE_CACHE.backend.clear()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        server_api.Book.delay = 0
+
+    def get(self, data=None):
+        http_response = ServerCachedBooks.as_view()(self.factory.get('/cached-books', data or {}))
+        self.assertEqual(http_response.status_code, 200)
+        return json.loads(http_response.content.decode('utf-8'))['data']
+
+    def call(self, view, method, path, body, **kwargs):
+        request = getattr(self.factory, method)(path, json.dumps(body), content_type='application/json')
+        self.assertEqual(view(request, **kwargs).status_code, 200)
+
+    def test_cached(self):
+        first = self.get({'fields': 'title'})
+        self.assertEqual(self.get({'fields': 'id,title'}), first)  # the same field plan
+        self.assertEqual(len(server_api.Book.queries), 1)
+        self.get({'fields': 'title,pages'})
+        self.assertEqual(len(server_api.Book.queries), 2)
+
+    def test_language_and_timezone(self):
+        self.get()
+        self.get({'language': 'fr'})
+        self.get({'language': 'fr', 'timezone': 'Europe/Paris'})
+        self.assertEqual(len(server_api.Book.queries), 3)
+        self.get({'language': 'fr'})
+        self.assertEqual(len(server_api.Book.queries), 3)
+
+    def test_stampede(self):
+        server_api.Book.delay = 0.1
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.get())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(server_api.Book.queries), 1)
+        self.assertEqual(results, [results[0]] * 8)
+
+    def test_write_invalidates(self):
+        self.get()
+        self.call(server_api.Books.as_view(), 'post', '/books', {'title': 'Eden', 'author_id': 2})
+        self.assertEqual(self.get()[-1]['title'], 'Eden')
+        self.assertEqual(len(server_api.Book.queries), 2)
+        self.get()
+        self.assertEqual(len(server_api.Book.queries), 2)
+
+    def test_nested_model_write_invalidates(self):
+        self.get({'fields': 'title,author(name)'})
+        self.get({'fields': 'title'})
+        request = self.factory.put('/authors/1')
+        author = server_api.Author.find(request, ids=[1])[0]
+        author.updated_data['name'] = 'Le Guin'
+        author.save(request)
+        self.assertEqual(self.get({'fields': 'title,author(name)'})[0]['author']['name'], 'Le Guin')
+        self.get({'fields': 'title'})  # Author is not in this response, still cached
+        self.assertEqual(len(server_api.Book.queries), 3)
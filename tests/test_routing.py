@@ -0,0 +1,97 @@
+import random
+import re
+import unittest
+
+import helpers
+from apy.server.routing import SegmentRouter
+
+
+class LinearRouter(object):
+    # what django does with one url() per pattern: the first regex that matches wins
+    def __init__(self):
+        self.routes = []
+
+    def add(self, pattern, view):
+        self.routes.append((re.compile('^%s$' % pattern), view))
+
+    def resolve(self, path):
+        for regex, view in self.routes:
+            match = regex.match(path)
+            if match is not None:
+                return view, match.groupdict()
+        return None
+
+
+def model_patterns(name):
+    # the url patterns of the objects, object and nested methods of a model
+    return [name, r'%s/(?P<%s_id>[^/]+)' % (name, name), r'%s/(?P<%s_id>[^/]+)/tags' % (name, name)]
+
+
+PATTERNS = model_patterns('books') + model_patterns('authors') + [
+    r'books/latest',  # literal after a param pattern it also matches
+    r'(?P<kind>[^/]+)/(?P<kind_id>[^/]+)/tags',
+    r'books/(?P<year>\d{4})/best',  # regex only patterns, before and after the ones they overlap
+    r'authors/(?P<author_id>[^/]+)/(?P<nested>[^/]+)',
+    r'files/(?P<path>.+)',
+    r'books/(?P<book_id>[^/]+)',  # same pattern twice
+    r'(?P<a>[^/]+)/(?P<b>[^/]+)/(?P<c>[^/]+)',
+    r'tags|labels',
+    r'authors/(?P<author_id>[^/]+)/books/(?P<book_id>[^/]+)',
+    r'',
+]
+
+SEGMENTS = ['books', 'authors', 'tags', 'labels', 'files', 'latest', 'best', '1999', '12', 'x', '', 'a b', 'é']
+
+
+def make_routers(patterns):
+    routers = SegmentRouter(), LinearRouter()
+    for ix, pattern in enumerate(patterns):
+        for router in routers:
+            router.add(pattern, 'view %d' % ix)
+    return routers
+
+
+class SegmentRouterTest(unittest.TestCase):
+    def assert_same(self, patterns, paths):
+        router, linear = make_routers(patterns)
+        for path in paths:
+            self.assertEqual(router.resolve(path), linear.resolve(path), repr(path))
+
+    def test_paths(self):
+        rng = random.Random(7)
+        paths = ['', 'books', 'books/', 'books/1', 'books/1/tags', 'books/latest', 'books/1999/best', 'files/a/b/c',
+                 'authors/2/books/3', 'authors/2/tags', 'x/y/tags', 'tags', 'labels', 'books//tags', '/books']
+        paths += ['/'.join(rng.choice(SEGMENTS) for _ in range(rng.randint(1, 5))) for _ in range(3000)]
+        self.assert_same(PATTERNS, paths)
+
+    def test_pattern_orders(self):
+        # whichever order the patterns are added in, the earliest matching one wins
+        rng = random.Random(11)
+        paths = ['/'.join(rng.choice(SEGMENTS) for _ in range(rng.randint(1, 4))) for _ in range(500)]
+        for _ in range(20):
+            patterns = list(PATTERNS)
+            rng.shuffle(patterns)
+            self.assert_same(patterns, paths)
+
+    def test_split_pattern(self):
+        self.assertEqual(SegmentRouter.split_pattern(r'books/(?P<book_id>[^/]+)/tags'),
+                         [('literal', 'books'), ('param', 'book_id'), ('literal', 'tags')])
+        self.assertIsNone(SegmentRouter.split_pattern(r'books/(?P<year>\d{4})'))
+        self.assertIsNone(SegmentRouter.split_pattern(r'tags|labels'))
+
+
+@helpers.benchmark
+class RouterBenchmark(unittest.TestCase):
+    def test_resolve(self):
+        patterns = [pattern for i in range(400) for pattern in model_patterns('model%d' % i)]
+        router, linear = make_routers(patterns)
+        paths = ['model%d' % i for i in (0, 200, 399)] + ['model399/17', 'model399/17/tags', 'missing/path']
+        timings = []
+        for path in paths:
+            timings.append(('segment router %s' % path, helpers.best_time(lambda: router.resolve(path), number=1000)))
+            timings.append(('linear regexes %s' % path, helpers.best_time(lambda: linear.resolve(path), number=1000)))
+        helpers.report('resolving 1000 paths with %d routes' % len(patterns), timings)
+
+
+if __name__ == '__main__':
+    unittest.main()
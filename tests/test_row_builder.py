@@ -0,0 +1,100 @@
+import json
+import unittest
+
+from django.test import RequestFactory
+
+import helpers
+import server_api
+from apy.client.models import MODELS
+from apy.server.methods import response_to_json
+from apy.server.models import ClientRow
+
+MODELS_UNDER_TEST = (server_api.Author, server_api.Book, server_api.Shelf, server_api.ShelfItem)
+FIELDS = 'score,items(stamp,note,book(title,pages,author)),name,rating,curator,owner(name,bio),badge'
+# (use_row_builder, unrestricted_read)
+MODES = ((False, False), (True, False), (False, True), (True, True))
+
+
+def set_mode(use_row_builder, unrestricted_read):
+    for model in MODELS_UNDER_TEST:
+        model.use_row_builder = use_row_builder
+        model.unrestricted_read = unrestricted_read
+
+
+def read(model, fields, rows=None):
+    server_api.reset()
+    if rows is not None:
+        model.rows = rows
+    request = RequestFactory().get('/')
+    objects = model.read(request, MODELS[model.__name__].parse_query_fields(fields))
+    return json.dumps(response_to_json({'data': objects}, request)['data'])
+
+
+class RowBuilderTest(unittest.TestCase):
+    def tearDown(self):
+        for model in MODELS_UNDER_TEST:
+            for attr in ('use_row_builder', 'unrestricted_read'):
+                if attr in model.__dict__:
+                    delattr(model, attr)
+
+    def test_same_result(self):
+        rows = {1: {'id': 1, 'title': 'Untitled', 'author_id': 2}}  # no pages, a default_to_none field
+        expected = {}
+        for mode in MODES:
+            set_mode(*mode)
+            result = read(server_api.Shelf, FIELDS), read(server_api.Book, 'title,pages,author(name)', rows)
+            expected.setdefault('result', result)
+            self.assertEqual(result, expected['result'], mode)
+        self.assertIn('"pages": null', expected['result'][1])
+
+    def test_permissions(self):
+        set_mode(True, False)
+        read(server_api.Book, 'title,author_id')
+        self.assertEqual(server_api.Book.client_keys, [['id', 'title', 'author_id']] * 4)
+        set_mode(True, True)
+        read(server_api.Book, 'title,author_id')
+        self.assertEqual(server_api.Book.client_keys, [])
+
+    def test_client_rows(self):
+        set_mode(True, True)
+        server_api.reset()
+        request = RequestFactory().get('/')
+        plan = MODELS['Shelf'].parse_query_fields('name,rating')
+        shelves = server_api.Shelf.db_find()
+        server_api.Shelf.populate_client_data(request, shelves, plan)
+        row = shelves[0].client_data
+        self.assertIsInstance(row, ClientRow)
+        self.assertEqual(list(row), ['id', 'name', 'rating'])
+        self.assertEqual((row['name'], row['rating']), ('Favourites', 'rating 1'))
+        client_shelf = server_api.Shelf.build_client_models(request, shelves)[0]
+        self.assertEqual(client_shelf.to_dict(), {'id': 1, 'name': 'Favourites', 'rating': 'rating 1'})
+
+    def test_missing_column(self):
+        for mode in ((True, False), (True, True)):
+            set_mode(*mode)
+            with self.assertRaisesRegex(KeyError, "'title' not in"):
+                read(server_api.Book, 'title', {1: {'id': 1, 'author_id': 1}})
+
+
+@helpers.benchmark
+class RowBuilderBenchmark(unittest.TestCase):
+    def tearDown(self):
+        RowBuilderTest.tearDown(self)
+
+    def test_benchmark(self):
+        rows = {i: {'id': i, 'title': 'Book %d' % i, 'author_id': 1 + i % 2, 'pages': i} for i in range(1, 1001)}
+        request = RequestFactory().get('/')
+        timings = []
+        for fields in ('title,pages,author_id', 'title,pages,author(name)'):
+            plan = MODELS['Book'].parse_query_fields(fields)
+            for mode in ((False, False), (True, False), (True, True)):
+                set_mode(*mode)
+
+                def run():
+                    server_api.reset()
+                    objects = [server_api.Book(dict(row)) for row in rows.values()]
+                    server_api.Book.to_client(request, objects, plan)
+
+                label = '%s, row builder %s, unrestricted read %s' % ((fields, ) + mode)
+                timings.append((label, helpers.best_time(run, repeat=7, number=5)))
+        helpers.report('to_client of 1000 books, 5 calls', timings)
@@ -0,0 +1,111 @@
+import datetime
+import json
+import unittest
+
+import pytz
+from django.test import RequestFactory
+
+import helpers
+import client_api
+from apy.client import fields
+from apy.client.models import BaseClientModel
+from apy.server import serializers
+from apy.server.methods import response_to_json
+
+JSON_SERIALIZERS = [cls for cls in (serializers.JsonSerializer, serializers.UJsonSerializer, serializers.OrJsonSerializer)
+                    if cls.is_available()]
+
+
+class Reading(BaseClientModel):
+    id = fields.IntegerField(is_default=True)
+    sensor = fields.StringField()
+    value = fields.FloatField()
+    total = fields.LongField()
+    taken = fields.DateTimeField()
+    valid = fields.BooleanField()
+    tags = fields.ArrayField()
+    counts = fields.ObjectField()
+    book = fields.NestedField('Book')
+
+
+def make_readings(count):
+    taken = datetime.datetime(2013, 3, 10, 6, 59, 59, tzinfo=pytz.utc)
+    author = client_api.Author(id=1, name='Ursula')
+    return [Reading(id=i, sensor='sensör "%d"\n /' % i, value=i / 3.0, total=2 ** 40 + i,
+                    taken=taken + datetime.timedelta(milliseconds=i), valid=i % 2 == 0, tags=['a', 'ü', None],
+                    counts={1: i, 2: None, 'x': [1.5, -2]},
+                    book=client_api.Book(id=i, title='Earthsea', author=author) if i % 3 else None)
+            for i in range(count)]
+
+
+def make_payloads():
+    # responses as return_response hands them to a serializer
+    request = RequestFactory().get('/readings')
+    return [
+        response_to_json({'ok': True, 'data': make_readings(20), 'pagination': {'next': 'http://testserver/readings?offset=20'}},
+                         request),
+        response_to_json({'ok': True, 'data': make_readings(1)[0]}, request),
+        response_to_json({'ok': True, 'data': []}, request),
+        {'ok': False, 'error': 'invalid_param', 'error_messages': ['fields: invalid field: x']},
+        {'ok': True, 'data': {1: 'int key', 'big': 2 ** 70, 'small': -2 ** 63, 'float': 1e-300, 'empty': {}}},
+    ]
+
+
+def as_text(output):
+    return output.decode('utf-8') if isinstance(output, bytes) else output
+
+
+class JsonConformanceTest(unittest.TestCase):
+    # every json backend writes what json.dumps does, as far as a json parser can tell, and reads it back
+
+    def test_dumps(self):
+        for payload in make_payloads():
+            expected = json.loads(json.dumps(payload))
+            for serializer in JSON_SERIALIZERS:
+                self.assertEqual(json.loads(as_text(serializer.dumps(payload))), expected, serializer.__name__)
+
+    def test_loads(self):
+        for payload in make_payloads():
+            text = json.dumps(payload)
+            expected = json.loads(text)
+            for serializer in JSON_SERIALIZERS:
+                self.assertEqual(serializer.loads(text), expected, serializer.__name__)
+                self.assertEqual(serializer.loads(text.encode('utf-8')), expected, serializer.__name__)
+
+    def test_default(self):
+        self.assertIs(serializers.SERIALIZERS['json'], max(JSON_SERIALIZERS, key=lambda cls: cls.priority))
+        self.assertIs(serializers.get_serializer(None, 'text/html, application/json;q=0.5'), serializers.SERIALIZERS['json'])
+
+    @unittest.skipUnless(serializers.OrJsonSerializer.is_available(), 'orjson is not installed')
+    def test_orjson_differences(self):
+        # documented on OrJsonSerializer
+        dumps = serializers.OrJsonSerializer.dumps
+        self.assertEqual(json.loads(as_text(dumps([float('nan'), float('inf')]))), [None, None])
+        self.assertEqual(json.loads(as_text(dumps(datetime.datetime(2013, 1, 1)))), '2013-01-01T00:00:00')
+
+
+@unittest.skipUnless(serializers.MsgpackSerializer.is_available(), 'msgpack is not installed')
+class MsgpackConformanceTest(unittest.TestCase):
+    def test_round_trip(self):
+        serializer = serializers.MsgpackSerializer
+        for payload in make_payloads():
+            if 'big' in payload.get('data', ()):
+                continue  # msgpack integers are at most 64 bits
+            self.assertEqual(serializer.loads(serializer.dumps(payload)), payload)
+        self.assertIs(serializers.get_serializer(None, 'application/x-msgpack'), serializer)
+
+
+@helpers.benchmark
+class SerializerBenchmark(unittest.TestCase):
+    def test_dumps(self):
+        request = RequestFactory().get('/readings')
+        payload = response_to_json({'ok': True, 'data': make_readings(1000)}, request)
+        timings = []
+        for serializer in JSON_SERIALIZERS + [serializers.MsgpackSerializer]:
+            if serializer.is_available():
+                timings.append(('%s.dumps' % serializer.__name__, helpers.best_time(lambda: serializer.dumps(payload))))
+        helpers.report('serializers, 1000 readings', timings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import calendar
+import datetime
+import unittest
+
+import pytz
+
+from apy import utils
+
+EASTERN = pytz.timezone('US/Eastern')
+KOLKATA = pytz.timezone('Asia/Kolkata')
+
+
+def reference_ms(value):
+    # whole seconds from the calendar, so the expected value doesn't depend on the local timezone
+    value = value.astimezone(pytz.utc)
+    return calendar.timegm(value.timetuple()) * 1000 + value.microsecond // 1000
+
+
+class DatetimeToMsTest(unittest.TestCase):
+    def assert_round_trip(self, value, ms):
+        self.assertEqual(utils.datetime_to_ms(value), ms)
+        self.assertEqual(utils.datetimes_to_ms([value, None]), [ms, None])
+        back = utils.ms_to_datetime(ms)
+        self.assertEqual(back, value)
+        self.assertEqual(back.tzinfo, pytz.utc)
+        self.assertEqual(utils.ms_to_datetimes([ms, None]), [back, None])
+
+    def test_utc(self):
+        value = datetime.datetime(2013, 6, 1, 12, 30, 15, 123000, tzinfo=pytz.utc)
+        self.assert_round_trip(value, reference_ms(value))
+        self.assert_round_trip(utils.EPOCH, 0)
+
+    def test_before_1970(self):
+        value = datetime.datetime(1969, 12, 31, 23, 59, 59, 999000, tzinfo=pytz.utc)
+        self.assert_round_trip(value, -1)
+        value = datetime.datetime(1901, 3, 4, 5, 6, 7, 8000, tzinfo=pytz.utc)
+        self.assert_round_trip(value, reference_ms(value))
+        self.assertLess(reference_ms(value), 0)
+
+    def test_non_utc_timezone(self):
+        value = KOLKATA.localize(datetime.datetime(2013, 6, 1, 18, 0, 0, 250000))
+        ms = reference_ms(value)
+        self.assertEqual(ms, reference_ms(datetime.datetime(2013, 6, 1, 12, 30, 0, 250000, tzinfo=pytz.utc)))
+        self.assert_round_trip(value, ms)
+        value = EASTERN.localize(datetime.datetime(1965, 7, 4, 9, 15))
+        self.assert_round_trip(value, reference_ms(value))
+
+    def test_dst_boundaries(self):
+        # the last instant before and the first after clocks go forward are a millisecond apart
+        before = EASTERN.localize(datetime.datetime(2013, 3, 10, 1, 59, 59, 999000))
+        after = EASTERN.localize(datetime.datetime(2013, 3, 10, 3, 0))
+        self.assertEqual(utils.datetime_to_ms(after) - utils.datetime_to_ms(before), 1)
+        # the repeated hour when clocks go back maps to two different instants
+        first = EASTERN.localize(datetime.datetime(2013, 11, 3, 1, 30), is_dst=True)
+        second = EASTERN.localize(datetime.datetime(2013, 11, 3, 1, 30), is_dst=False)
+        self.assertEqual(utils.datetime_to_ms(second) - utils.datetime_to_ms(first), 3600 * 1000)
+        for value in (before, after, first, second):
+            self.assert_round_trip(value, reference_ms(value))
+
+    def test_rounding(self):
+        # sub millisecond parts round half to even, as the float based conversion did
+        base = datetime.datetime(2013, 1, 1, tzinfo=pytz.utc)
+        ms = reference_ms(base)
+        self.assertEqual(utils.datetime_to_ms(base + datetime.timedelta(microseconds=499)), ms)
+        self.assertEqual(utils.datetime_to_ms(base + datetime.timedelta(microseconds=500)), ms)
+        self.assertEqual(utils.datetime_to_ms(base + datetime.timedelta(microseconds=1500)), ms + 2)
+        self.assertEqual(utils.datetime_to_ms(base - datetime.timedelta(microseconds=500)), ms)
+        self.assertEqual(utils.datetime_to_ms(base - datetime.timedelta(microseconds=501)), ms - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()